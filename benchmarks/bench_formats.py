@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""快照编码基准：格式与压缩方式
+
+在合成任务树（见 generators.py）上比较各种快照编码（TASKTREE_FORMAT ×
+TASKTREE_COMPRESS）的文件大小、保存耗时和加载耗时（可信快照，跳过逐节点校验）。
+每项取 --repeat 次中的最小值，相对值以 pretty/none（默认编码）为基准。
+
+用法:
+    python benchmarks/bench_formats.py [--nodes 100000] [--shapes balanced,long-desc] [--repeat 3]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tasktree.storage import Storage, FORMATS, COMPRESSIONS  # noqa: E402
+from generators import SHAPES, make_tree  # noqa: E402
+
+
+def best_of(repeat, func):
+    """运行 repeat 次，返回最短耗时（秒）"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_shape(shape, args):
+    """返回 [(格式, 压缩方式, 文件字节数, 保存耗时, 加载耗时)]"""
+    root = make_tree(shape, args.nodes, seed=args.seed)
+    rows = []
+    for file_format in FORMATS:
+        for compression in COMPRESSIONS:
+            storage = Storage(f"bench-{shape}", journal=False,
+                              file_format=file_format, compression=compression)
+            save = best_of(args.repeat, lambda: storage.save(root))
+            size = storage.disk_usage()
+            load = best_of(args.repeat, lambda: storage.load())
+            rows.append((file_format, compression, size, save, load))
+            storage.delete()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shapes", default="balanced,long-desc,cjk",
+                        help=f"逗号分隔的形状（可选: {','.join(SHAPES)}）")
+    parser.add_argument("--nodes", type=int, default=100000, help="每棵树的节点数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=3, help="每项的重复次数（取最小值）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["TASKTREE_DATA_DIR"] = data_dir
+        for shape in args.shapes.split(","):
+            rows = bench_shape(shape, args)
+            base_size, base_save, base_load = rows[0][2:]
+            print(f"== {shape} ({args.nodes} 个节点)")
+            print(f"{'格式':<10}{'压缩':<8}{'大小':>12}{'':>8}{'保存':>12}{'加载':>12}{'':>8}")
+            for file_format, compression, size, save, load in rows:
+                print(f"{file_format:<10}{compression:<8}{size / 1e6:>10.2f}MB"
+                      f"{size / base_size:>7.0%} "
+                      f"{save * 1000:>10.1f}ms{load * 1000:>10.1f}ms{load / base_load:>7.0%}")
+            print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""内存占用基准：加载后的任务树每个节点占用的字节数
+
+在合成任务树（见 generators.py）上保存快照后重新加载，用 tracemalloc 统计
+加载后仍然存活的内存，按分配位置分类：
+
+    节点       Task 对象和子任务列表（models.py）
+    字符串     JSON 解析产生的名称、描述和 ID
+    快照文本   为增量保存保留的快照文本（storage.py，见 README“增量保存”）
+    汇总       第一次计算的子树汇总（rollup.py，list/show 会用到）
+
+另外给出加载过程中的峰值。结果为每个节点的字节数。
+
+用法:
+    python benchmarks/bench_memory.py [--nodes 200000] [--shapes balanced,cjk]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tasktree.storage import Storage  # noqa: E402
+from generators import SHAPES, make_tree  # noqa: E402
+
+# 分配位置所在的文件 -> 类别
+CATEGORIES = {
+    "models.py": "节点",
+    "decoder.py": "字符串",
+    "serialization.py": "字符串",
+    "storage.py": "快照文本",
+    "rollup.py": "汇总",
+}
+COLUMNS = ("节点", "字符串", "快照文本", "汇总", "其他")
+
+
+def measure(storage, nodes):
+    """加载任务树并计算汇总，返回 ({类别: 每节点字节数}, 每节点峰值字节数)"""
+    gc.collect()
+    tracemalloc.start()
+    tree = storage.load_tree()
+    _, peak = tracemalloc.get_traced_memory()
+    tree.rollups()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    sizes = dict.fromkeys(COLUMNS, 0)
+    for stat in snapshot.statistics("filename"):
+        name = os.path.basename(stat.traceback[0].filename)
+        sizes[CATEGORIES.get(name, "其他")] += stat.size
+    del tree
+    return {key: value / nodes for key, value in sizes.items()}, peak / nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shapes", default="balanced,cjk",
+                        help=f"逗号分隔的形状（可选: {','.join(SHAPES)}）")
+    parser.add_argument("--nodes", type=int, default=200000, help="每棵树的节点数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.environ["TASKTREE_DATA_DIR"] = data_dir
+        for name in ("TASKTREE_JOURNAL", "TASKTREE_ROLLUPS", "TASKTREE_SHARD_NODES"):
+            os.environ.pop(name, None)
+        print(f"每个节点的字节数（{args.nodes} 个节点）")
+        print(f"{'形状':<12}" + "".join(f"{column:>10}" for column in COLUMNS)
+              + f"{'合计':>10}{'峰值':>10}")
+        for shape in args.shapes.split(","):
+            storage = Storage(f"bench-{shape}", journal=False)
+            storage.save(make_tree(shape, args.nodes, seed=args.seed))
+            sizes, peak = measure(storage, args.nodes)
+            storage.delete()
+            print(f"{shape:<12}" + "".join(f"{sizes[column]:>10.0f}" for column in COLUMNS)
+                  + f"{sum(sizes.values()):>10.0f}{peak:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""CLI 启动开销基准
+
+对每个命令多次运行 `python -X importtime main.py ...`，统计导入耗时
+（顶层模块累计耗时之和）和总耗时的中位数，并检查不应加载的重量级模块：
+
+- json/ndjson 输出不应导入 rich
+- 读写可信数据文件不应导入 pydantic（只有校验外部数据时才需要）
+- 设置了 TASKTREE_DATA_DIR 时不应导入 appdirs
+
+出现不应加载的模块，或导入耗时比基线（--baseline）慢超过 --tolerance 时
+以退出码 1 结束，可以直接用于 CI。
+
+用法:
+    python benchmarks/bench_startup.py [--runs 7] [--json]
+    python benchmarks/bench_startup.py --save startup.json
+    python benchmarks/bench_startup.py --baseline startup.json [--tolerance 0.25]
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+
+TASK = "bench"
+
+# (名称, 命令参数, 不应加载的模块)
+COMMANDS = [
+    ("show-json", ["show", TASK, "root.a", "--format", "json"], ["rich", "pydantic", "appdirs"]),
+    ("list-ndjson", ["list", TASK, "--format", "ndjson"], ["rich", "pydantic", "appdirs"]),
+    ("find-ndjson", ["find", TASK, "--status", "done", "--format", "ndjson"],
+     ["rich", "pydantic", "appdirs"]),
+    ("list-tasks-json", ["list-tasks", "--format", "json"], ["rich", "pydantic", "appdirs"]),
+    ("edit-json", ["edit", TASK, "root.a", "--progress", "50", "--format", "json"],
+     ["rich", "pydantic", "appdirs"]),
+    ("show", ["show", TASK, "root.a"], ["pydantic", "appdirs"]),
+    ("list", ["list", TASK, "--plain"], ["pydantic", "appdirs"]),
+]
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def parse_importtime(stderr: str):
+    """解析 -X importtime 输出，返回 (顶层模块累计耗时之和（微秒）, 导入的模块集合)"""
+    total = 0
+    modules = set()
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        _, cumulative, indent, name = match.groups()
+        modules.add(name)
+        if not indent:
+            total += int(cumulative)
+    return total, modules
+
+
+def run_cli(args, env):
+    """运行一次 CLI，返回 (导入耗时, 总耗时（微秒）, 导入的模块集合)"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", MAIN, *args], env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = int((time.perf_counter() - start) * 1e6)
+    if proc.returncode != 0:
+        raise RuntimeError(f"命令失败: {' '.join(args)}\n{proc.stderr[-2000:]}")
+    import_us, modules = parse_importtime(proc.stderr)
+    return import_us, wall, modules
+
+
+def setup(env):
+    """在临时数据目录中创建基准任务"""
+    for args in (["init", TASK],
+                 ["add", TASK, "root", "a", "--status", "done"],
+                 ["add", TASK, "root.a", "b"],
+                 ["add", TASK, "root", "c", "--status", "in-progress"]):
+        subprocess.run([sys.executable, MAIN, *args], env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+
+def loaded(modules, name):
+    return any(module == name or module.startswith(name + ".") for module in modules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7, help="每个命令的运行次数")
+    parser.add_argument("--json", action="store_true", help="输出 JSON 结果")
+    parser.add_argument("--save", help="把结果写入文件（作为之后的基线）")
+    parser.add_argument("--baseline", help="与基线文件比较")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="允许的导入耗时回退比例（默认 0.25）")
+    args = parser.parse_args()
+
+    failures = []
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, TASKTREE_DATA_DIR=data_dir, TASKTREE_NO_DAEMON="1",
+                   PYTHONDONTWRITEBYTECODE="1")
+        setup(env)
+        # 预热字节码缓存和文件系统缓存
+        run_cli(COMMANDS[0][1], env)
+
+        for name, cli_args, forbidden in COMMANDS:
+            imports, walls, modules = [], [], set()
+            for _ in range(args.runs):
+                import_us, wall, run_modules = run_cli(cli_args, env)
+                imports.append(import_us)
+                walls.append(wall)
+                modules |= run_modules
+            heavy = sorted(module for module in forbidden if loaded(modules, module))
+            results[name] = {
+                "import_us": int(statistics.median(imports)),
+                "wall_us": int(statistics.median(walls)),
+                "modules": len(modules),
+                "forbidden_loaded": heavy,
+            }
+            if heavy:
+                failures.append(f"{name}: 加载了不应加载的模块 {', '.join(heavy)}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["commands"]
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            result["baseline_import_us"] = base["import_us"]
+            limit = base["import_us"] * (1 + args.tolerance)
+            if result["import_us"] > limit:
+                failures.append(f"{name}: 导入耗时 {result['import_us'] / 1000:.1f} ms，"
+                                f"基线 {base['import_us'] / 1000:.1f} ms")
+
+    report = {"python": sys.version.split()[0], "runs": args.runs, "commands": results}
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'命令':<18}{'导入 (ms)':>12}{'总耗时 (ms)':>14}{'基线 (ms)':>12}{'模块数':>8}")
+        for name, result in results.items():
+            base = result.get("baseline_import_us")
+            base_text = f"{base / 1000:.1f}" if base is not None else "-"
+            print(f"{name:<18}{result['import_us'] / 1000:>12.1f}{result['wall_us'] / 1000:>14.1f}"
+                  f"{base_text:>12}{result['modules']:>8}")
+
+    for failure in failures:
+        print(f"失败: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""TaskTree 性能基准套件
+
+在合成任务树（见 generators.py）上测量主要操作的耗时：
+
+    to_dict / from_dict / from_dict_validated   Task 与字典互转（后者走 pydantic 校验）
+    save / load / load_validated               Storage 写入快照、读取可信/外部修改过的快照
+    show_path                                  加载任务树并查看一个节点（单条 show 命令的情形）
+    list_plain                                 加载任务树并生成不带描述的全部行（list 命令的情形）
+    edit_save                                  修改已加载任务树中的一个深层节点并保存（不含加载，
+                                               未修改的子树复用加载时的文本，对照 save）
+    lookup_first                               新建 TaskTree 后第一次按路径查找（单条 CLI 命令的情形）
+    lookup                                     同一 TaskTree 上的连续路径查找（每次）
+    lookup_id                                  同一 TaskTree 上按 "#ID" 的连续查找（每次，ID 索引已建立）
+    add_wide                                   在子节点最多的节点下添加任务（每次）
+    render                                     get_tree_structure(show_detail=True) 生成全部行
+    list_tasks_cold / list_tasks_warm          --files 个任务文件上的 Storage.list_tasks（无清单/有清单）
+
+--shard-nodes N 以分片布局保存（TASKTREE_SHARD_NODES），用于比较两种格式的
+save/load/show_path；--blob-bytes N 把不少于 N 字节的描述外置（TASKTREE_BLOB_BYTES），
+用于在 long-desc 上比较 load/list_plain。每项取 --repeat 次中的最小值。结果可以保存为 JSON（--output），并与之前
+保存的基线比较（--baseline），任一项比基线慢超过 --tolerance 时以退出码 1 结束。
+
+用法:
+    python benchmarks/bench_suite.py --nodes 100000 --output base.json
+    python benchmarks/bench_suite.py --nodes 100000 --baseline base.json
+    python benchmarks/bench_suite.py --shapes wide,balanced --nodes 1000000 --repeat 1 --json
+    python benchmarks/bench_suite.py --shapes balanced --nodes 1000000 --shard-nodes 10000
+    python benchmarks/bench_suite.py --shapes long-desc --files 0 --blob-bytes 256
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tasktree.models import Task  # noqa: E402
+from tasktree.storage import Storage  # noqa: E402
+from tasktree.tree import TaskTree  # noqa: E402
+from generators import SHAPES, make_tree, sample_paths, widest_parent  # noqa: E402
+
+# 深链的路径长度和渲染输出都与深度成平方关系，查找只抽取这个深度以内的节点
+DEEP_LOOKUP_DEPTH = 1000
+
+
+def best_of(repeat, func, setup=None):
+    """运行 repeat 次，返回最短耗时（秒）。setup 的结果作为 func 的参数，不计入耗时"""
+    best = None
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(arg) if setup is not None else func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_shape(shape, args):
+    """测量一种形状的树，返回 {指标: 耗时（秒，lookup/lookup_id/add_wide 为每次的耗时）}"""
+    results = {}
+    nodes = args.deep_nodes if shape == "deep" else args.nodes
+    root = make_tree(shape, nodes, seed=args.seed, branching=args.branching)
+    data = root.to_dict()
+
+    results["to_dict"] = best_of(args.repeat, root.to_dict)
+    results["from_dict"] = best_of(args.repeat, lambda: Task.from_dict(data, validate=False))
+    if not args.skip_validated:
+        results["from_dict_validated"] = best_of(args.repeat, lambda: Task.from_dict(data))
+    del data
+
+    max_depth = DEEP_LOOKUP_DEPTH if shape == "deep" else None
+    paths = sample_paths(root, args.lookups, seed=args.seed, max_depth=max_depth)
+
+    storage = Storage(f"bench-{shape}", journal=False)
+    results["save"] = best_of(args.repeat, lambda: storage.save(root))
+    results["load"] = best_of(args.repeat, lambda: storage.load())
+    if not args.skip_validated:
+        results["load_validated"] = best_of(args.repeat, lambda: storage.load(validate=True))
+    # 取最深的抽样路径，分片布局下需要经过最多的分片
+    show_path = max(paths, key=lambda path: path.count("."))
+    results["show_path"] = best_of(
+        args.repeat, lambda: storage.load_tree().get_task_info(show_path))
+    if shape != "deep":
+        results["list_plain"] = best_of(
+            args.repeat, lambda: sum(1 for _ in storage.load_tree().get_tree_structure(False)))
+
+    def edit_save(tree):
+        tree.edit_task(show_path, progress=50)
+        storage.save_tree(tree)
+    results["edit_save"] = best_of(args.repeat, edit_save, setup=storage.load_tree)
+    storage.delete()
+
+    def lookup_first(tree_and_path):
+        tree, path = tree_and_path
+        tree.find_task_by_path(path)
+
+    # 每次都用新的 TaskTree（子任务索引和路径缓存为空）
+    counter = iter(range(len(paths) * args.repeat))
+    results["lookup_first"] = best_of(
+        args.repeat * 5, lookup_first,
+        setup=lambda: (TaskTree(root), paths[next(counter) % len(paths)]))
+
+    def lookups():
+        tree = TaskTree(root)
+        for path in paths:
+            tree.find_task_by_path(path)
+    results["lookup"] = best_of(args.repeat, lookups) / len(paths)
+
+    id_tree = TaskTree(root)
+    id_paths = ["#" + id_tree.find_task_by_path(path)[0].id for path in paths]
+    id_tree.build_indexes()
+
+    def id_lookups():
+        for path in id_paths:
+            id_tree.find_task_by_path(path)
+    results["lookup_id"] = best_of(args.repeat, id_lookups) / len(id_paths)
+
+    parent_path = widest_parent(root)
+    tree = TaskTree(root)
+    tree.find_task_by_path(parent_path)
+    rounds = iter(range(args.repeat))
+
+    def adds():
+        round_index = next(rounds)
+        for index in range(args.adds):
+            tree.add_task(parent_path, f"bench-add-{round_index}-{index}")
+    results["add_wide"] = best_of(args.repeat, adds) / args.adds
+
+    if shape != "deep":
+        results["render"] = best_of(
+            args.repeat, lambda: sum(1 for _ in TaskTree(root).get_tree_structure(True)))
+    return results
+
+
+def bench_list_tasks(args):
+    """测量多个任务文件上的 list_tasks"""
+    for index in range(args.files):
+        root = make_tree("balanced", args.file_nodes, seed=index)
+        root.name = f"bench-file-{index}"
+        Storage(root.name, journal=False).save(root)
+
+    storage = Storage("bench-file-0", journal=False)
+    return {
+        # reindex 先删除清单再列出，相当于没有清单时的 list_tasks
+        "list_tasks_cold": best_of(args.repeat, storage.reindex),
+        "list_tasks_warm": best_of(args.repeat, storage.list_tasks),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """与基线比较，返回回退项列表"""
+    regressions = []
+    for key, value in results.items():
+        base = baseline.get(key)
+        if base is None or not base:
+            continue
+        ratio = value / base
+        if ratio > 1 + tolerance:
+            regressions.append((key, value, base, ratio))
+    return regressions
+
+
+def format_time(seconds):
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shapes", default=",".join(SHAPES),
+                        help=f"逗号分隔的形状（默认全部: {','.join(SHAPES)}）")
+    parser.add_argument("--nodes", type=int, default=100000, help="每棵树的节点数")
+    # 带缩进的快照文件大小与深度成平方关系（深度 2 万时约数 GB），deep 单独设置
+    parser.add_argument("--deep-nodes", type=int, default=2000, help="deep 形状的节点数")
+    parser.add_argument("--branching", type=int, default=10, help="平衡树的分支数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--repeat", type=int, default=3, help="每项的重复次数（取最小值）")
+    parser.add_argument("--lookups", type=int, default=1000, help="路径查找的次数")
+    parser.add_argument("--adds", type=int, default=1000, help="add_wide 添加的任务数")
+    parser.add_argument("--files", type=int, default=200, help="list_tasks 的任务文件数（0 为不测）")
+    parser.add_argument("--file-nodes", type=int, default=1000, help="list_tasks 每个文件的节点数")
+    parser.add_argument("--skip-validated", action="store_true", help="不测走 pydantic 校验的路径")
+    parser.add_argument("--shard-nodes", type=int, default=0,
+                        help="按分片布局保存，超过这么多节点的子树单独存放（默认 0，单文件）")
+    parser.add_argument("--blob-bytes", type=int, default=0,
+                        help="把不少于这么多字节的描述存到单独的文件中（默认 0，全部内联）")
+    parser.add_argument("--json", action="store_true", help="向标准输出打印 JSON 结果")
+    parser.add_argument("--output", help="把结果写入 JSON 文件（可作为之后的基线）")
+    parser.add_argument("--baseline", help="与基线 JSON 文件比较")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="允许的回退比例（默认 0.2，即慢 20%% 以内不算回退）")
+    args = parser.parse_args()
+
+    shapes = [shape for shape in args.shapes.split(",") if shape]
+    for shape in shapes:
+        if shape not in SHAPES:
+            parser.error(f"未知的形状: {shape}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Storage 从环境变量读取数据目录，基准不应受用户配置影响
+        os.environ["TASKTREE_DATA_DIR"] = data_dir
+        for name in ("TASKTREE_JOURNAL", "TASKTREE_ROLLUPS", "TASKTREE_SHARD_NODES",
+                     "TASKTREE_BLOB_BYTES"):
+            os.environ.pop(name, None)
+        if args.shard_nodes:
+            os.environ["TASKTREE_SHARD_NODES"] = str(args.shard_nodes)
+        if args.blob_bytes:
+            os.environ["TASKTREE_BLOB_BYTES"] = str(args.blob_bytes)
+
+        for shape in shapes:
+            for metric, value in bench_shape(shape, args).items():
+                results[f"{shape}/{metric}"] = value
+                if not args.json:
+                    print(f"{shape + '/' + metric:<32}{format_time(value):>12}", flush=True)
+
+        if args.files:
+            list_dir = os.path.join(data_dir, "list")
+            os.environ["TASKTREE_DATA_DIR"] = list_dir
+            for metric, value in bench_list_tasks(args).items():
+                results[f"files/{metric}"] = value
+                if not args.json:
+                    print(f"{'files/' + metric:<32}{format_time(value):>12}", flush=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "nodes": args.nodes,
+            "deep_nodes": args.deep_nodes,
+            "branching": args.branching,
+            "seed": args.seed,
+            "files": args.files,
+            "file_nodes": args.file_nodes,
+            "shard_nodes": args.shard_nodes,
+            "blob_bytes": args.blob_bytes,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    mismatched = [key for key in ("nodes", "deep_nodes", "branching", "seed", "files",
+                                   "file_nodes", "shard_nodes", "blob_bytes")
+                  if baseline["meta"].get(key) != report["meta"][key]]
+    if mismatched:
+        print(f"警告: 参数与基线不同 ({', '.join(mismatched)})，结果不可直接比较", file=sys.stderr)
+
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for key, value, base, ratio in regressions:
+        print(f"回退: {key} {format_time(value)}（基线 {format_time(base)}，{ratio:.2f}x）",
+              file=sys.stderr)
+    if not regressions:
+        print(f"与基线相比没有超过 {args.tolerance:.0%} 的回退", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""遍历实现基准：显式栈遍历 vs 原递归实现
+
+对比 Task.to_dict / Task.from_dict / TaskTree.get_tree_structure 与
+等价的递归写法在平衡树和深链上的耗时。递归写法在深链上会触发
+RecursionError，此时记为失败。
+
+用法:
+    python benchmarks/bench_traversal.py [--depth 100000] [--balanced-depth 7]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tasktree.models import Task, TaskStatus  # noqa: E402
+from tasktree.tree import TaskTree  # noqa: E402
+
+
+def recursive_to_dict(task):
+    return {
+        "name": task.name,
+        "description": task.description,
+        "status": task.status.value,
+        "progress": task.progress,
+        "children": [recursive_to_dict(child) for child in task.children],
+    }
+
+
+def recursive_from_dict(data):
+    return Task(
+        name=data["name"],
+        description=data.get("description", ""),
+        status=TaskStatus(data.get("status", "todo")),
+        progress=data.get("progress"),
+        children=[recursive_from_dict(child) for child in data.get("children", [])],
+    )
+
+
+def recursive_tree_lines(root):
+    lines = []
+
+    def build(task, prefix="", indent="", is_last=True):
+        lines.append(f"{prefix}{task.name} [{task.status.value}]")
+        child_indent = indent + ("    " if is_last else "│   ")
+        for i, child in enumerate(task.children):
+            last = i == len(task.children) - 1
+            build(child, child_indent + ("└── " if last else "├── "), child_indent, last)
+
+    build(root)
+    return lines
+
+
+def make_chain(depth):
+    root = Task(name="root")
+    current = root
+    for i in range(depth):
+        child = Task(name=f"n{i}")
+        current.children.append(child)
+        current = child
+    return root
+
+
+def make_balanced(depth, width=4):
+    def build(level, name):
+        children = [build(level + 1, f"{name}.{i}") for i in range(width)] if level < depth else []
+        return Task(name=name, children=children)
+    return build(0, "root")
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    try:
+        func(*args)
+    except RecursionError:
+        return None
+    return time.perf_counter() - start
+
+
+def report(label, recursive, iterative):
+    def fmt(value):
+        return "RecursionError" if value is None else f"{value * 1000:10.1f} ms"
+    print(f"  {label:<24} recursive: {fmt(recursive):>16}   iterative: {fmt(iterative):>16}")
+
+
+def run(name, root, render=True):
+    data = root.to_dict()
+    print(f"{name}:")
+    report("to_dict", timed(recursive_to_dict, root), timed(root.to_dict))
+    report("from_dict", timed(recursive_from_dict, data), timed(Task.from_dict, data))
+    if render:
+        tree = TaskTree(root)
+        report("get_tree_structure", timed(recursive_tree_lines, root),
+               timed(lambda: list(tree.get_tree_structure())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=100000, help="深链的深度")
+    parser.add_argument("--balanced-depth", type=int, default=7, help="平衡四叉树的深度")
+    args = parser.parse_args()
+
+    run(f"balanced (width 4, depth {args.balanced_depth})", make_balanced(args.balanced_depth))
+    # 渲染深链的输出大小与深度成平方关系，这里不测
+    run(f"chain (depth {args.depth})", make_chain(args.depth), render=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""基准用的合成任务树
+
+所有生成器都不使用递归，可以生成数百万节点的树。同一组参数和种子
+总是生成完全相同的树，便于不同版本之间比较。
+
+形状:
+    wide:      根节点下直接挂所有节点
+    deep:      单链
+    balanced:  按层填满的 branching 叉树
+    long-desc: balanced，每个节点带长描述
+    cjk:       balanced，名称和描述为中文
+"""
+
+import random
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional
+
+from tasktree.models import Task, TaskStatus
+
+SHAPES = ("wide", "deep", "balanced", "long-desc", "cjk")
+
+_STATUSES = tuple(TaskStatus)
+_STATUS_WEIGHTS = (4, 2, 3, 1)
+_CJK = "任务模块接口测试部署文档设计评审数据迁移前端后端性能优化监控告警发布回归验收"
+_WORDS = ("implement", "review", "refactor", "deploy", "migrate", "benchmark",
+          "document", "test", "schema", "cache", "index", "render", "storage")
+
+
+class _Fields:
+    """
+    按种子生成节点的名称、描述、状态和进度
+
+    名称前缀和描述从预先生成的文本池中随机选取再拼接序号，每个节点都是
+    独立的字符串对象，生成数百万节点也只需数秒。
+    """
+
+    POOL_SIZE = 1024
+
+    def __init__(self, shape: str, seed: int, description_size: Optional[int]):
+        rng = random.Random(seed)
+        self._random = rng.random
+        self._cjk = shape == "cjk"
+        if description_size is None:
+            description_size = 2000 if shape == "long-desc" else 40
+        self._prefixes = [
+            "".join(rng.choice(_CJK) for _ in range(4)) if self._cjk else "task-"
+            for _ in range(self.POOL_SIZE)
+        ]
+        self._descriptions = [_make_text(rng, description_size, self._cjk)
+                              for _ in range(self.POOL_SIZE)]
+        total = sum(_STATUS_WEIGHTS)
+        self._thresholds = []
+        acc = 0
+        for status, weight in zip(_STATUSES, _STATUS_WEIGHTS):
+            acc += weight
+            self._thresholds.append((acc / total, status))
+        self._serial = 0
+
+    def _pick(self, pool: List[str]) -> str:
+        return pool[int(self._random() * len(pool))]
+
+    def name(self, index: int) -> str:
+        return self._pick(self._prefixes) + str(index)
+
+    def description(self) -> str:
+        self._serial += 1
+        text = self._pick(self._descriptions)
+        return f"{text} #{self._serial}" if text else ""
+
+    def task(self, index: int) -> Task:
+        draw = self._random()
+        for threshold, status in self._thresholds:
+            if draw < threshold:
+                break
+        progress = None
+        if status is TaskStatus.IN_PROGRESS:
+            progress = 1 + int(self._random() * 99)
+        elif status is TaskStatus.DONE and self._random() < 0.5:
+            progress = 100
+        return Task(name=self.name(index), description=self.description(),
+                    status=status, progress=progress)
+
+
+def _make_text(rng: random.Random, size: int, cjk: bool) -> str:
+    """生成约 size 个字符的文本"""
+    if not size:
+        return ""
+    if cjk:
+        return "".join(rng.choice(_CJK) for _ in range(size))
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def make_tree(shape: str, nodes: int, seed: int = 0, branching: int = 10,
+              description_size: Optional[int] = None) -> Task:
+    """
+    生成合成任务树
+
+    Args:
+        shape: 形状（见 SHAPES）
+        nodes: 节点总数（包含根节点）
+        seed: 随机种子
+        branching: balanced/long-desc/cjk 的分支数
+        description_size: 描述长度（字符数），默认 long-desc 为 2000，其余为 40
+
+    Returns:
+        Task: 根节点（名称为 "root"）
+    """
+    builders: Dict[str, Callable[[Task, int, _Fields], None]] = {
+        "wide": _fill_wide,
+        "deep": _fill_deep,
+    }
+    if shape not in SHAPES:
+        raise ValueError(f"未知的形状: {shape}（可选: {', '.join(SHAPES)}）")
+
+    fields = _Fields(shape, seed, description_size)
+    root = Task(name="root", description=fields.description())
+    fill = builders.get(shape)
+    if fill is not None:
+        fill(root, nodes - 1, fields)
+    else:
+        _fill_balanced(root, nodes - 1, fields, branching)
+    return root
+
+
+def _fill_wide(root: Task, count: int, fields: _Fields) -> None:
+    root.children.extend(fields.task(index) for index in range(count))
+
+
+def _fill_deep(root: Task, count: int, fields: _Fields) -> None:
+    current = root
+    for index in range(count):
+        child = fields.task(index)
+        current.children.append(child)
+        current = child
+
+
+def _fill_balanced(root: Task, count: int, fields: _Fields, branching: int) -> None:
+    queue = deque([root])
+    created = 0
+    while created < count:
+        parent = queue.popleft()
+        for index in range(min(branching, count - created)):
+            child = fields.task(index)
+            parent.children.append(child)
+            queue.append(child)
+        created += len(parent.children)
+
+
+def iter_paths(root: Task, max_depth: Optional[int] = None) -> Iterator[str]:
+    """
+    按先序生成每个节点的完整路径（根节点为 "root"）
+
+    路径总长度与深度成平方关系，深树应指定 max_depth（不展开更深的节点）。
+    """
+    # 栈中元素: (节点, 路径, 深度)
+    stack = [(root, "root", 0)]
+    while stack:
+        task, path, depth = stack.pop()
+        yield path
+        if max_depth is not None and depth >= max_depth:
+            continue
+        for child in reversed(task.children):
+            stack.append((child, f"{path}.{child.name}", depth + 1))
+
+
+def sample_paths(root: Task, count: int, seed: int = 0,
+                 max_depth: Optional[int] = None) -> List[str]:
+    """
+    随机抽取若干节点的路径（蓄水池抽样，只遍历一次）
+
+    Args:
+        root: 根节点
+        count: 抽取数量
+        seed: 随机种子
+        max_depth: 只抽取深度不超过该值的节点
+    """
+    rng = random.Random(seed)
+    sample: List[str] = []
+    for seen, path in enumerate(iter_paths(root, max_depth)):
+        if len(sample) < count:
+            sample.append(path)
+        else:
+            slot = rng.randint(0, seen)
+            if slot < count:
+                sample[slot] = path
+    return sample
+
+
+def widest_parent(root: Task) -> str:
+    """子节点最多的节点的路径（有多个时取先序中的第一个）"""
+    best_names: List[str] = []
+    best_count = -1
+    # 先序遍历中 names 保存当前节点路径上的名称
+    names: List[str] = []
+    stack = [(root, 0)]
+    while stack:
+        task, depth = stack.pop()
+        del names[depth:]
+        names.append(task.name)
+        if len(task.children) > best_count:
+            best_names, best_count = list(names), len(task.children)
+        for child in reversed(task.children):
+            if child.children:
+                stack.append((child, depth + 1))
+    return ".".join(best_names)
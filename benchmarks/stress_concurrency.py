@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""并发写入压力测试
+
+多个 worker 线程各自反复启动 `tasktree add` 进程，向同一个任务并发添加
+互不相同的任务（一半直接挂在根节点下，一半挂在共享的 shared 节点下）。
+结束后检查：
+
+- 数据文件可以正常加载（没有截断或损坏）
+- 每个返回成功的 add 都在最终的任务树中（没有丢失的更新）
+
+--kill 会在运行中随机 SIGKILL 一部分 CLI 进程，模拟写入中途崩溃；
+被杀死的操作结果不确定，只要求任务树仍然可以加载。
+
+各进程的 storage.conflict 阶段次数（通过 TASKTREE_TRACE 收集）即检测到
+冲突并在最新任务树上重新执行的次数。发现问题时以退出码 1 结束。
+
+用法:
+    python benchmarks/stress_concurrency.py [--workers 8] [--ops 25] [--journal] [--backend sqlite] [--kill 0.1]
+"""
+
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "main.py")
+sys.path.insert(0, ROOT)
+
+TASK = "stress"
+
+
+def run_worker(worker, args, env, results, running, lock):
+    """顺序执行一个 worker 的全部 add，记录每个操作是否成功"""
+    for op in range(args.ops):
+        name = f"w{worker}-{op}"
+        parent = "root.shared" if op % 2 else "root"
+        proc = subprocess.Popen([sys.executable, MAIN, "add", TASK, parent, name, "-F", "json"],
+                                env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with lock:
+            running.add(proc)
+        out, err = proc.communicate()
+        with lock:
+            running.discard(proc)
+        if proc.returncode == 0:
+            status = "ok"
+        elif proc.returncode < 0:
+            status = "killed"
+        else:
+            status = "error"
+        results.append((f"{parent}.{name}", status, err.decode("utf-8", "replace").strip()))
+
+
+def killer(args, running, lock, done):
+    """随机杀死正在运行的 CLI 进程"""
+    rng = random.Random(args.seed)
+    while not done.is_set():
+        time.sleep(0.02)
+        with lock:
+            victims = [proc for proc in running if rng.random() < args.kill]
+        for proc in victims:
+            try:
+                proc.send_signal(signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8, help="并发 worker 数")
+    parser.add_argument("--ops", type=int, default=25, help="每个 worker 的 add 次数")
+    parser.add_argument("--journal", action="store_true", help="使用日志模式（TASKTREE_JOURNAL=1）")
+    parser.add_argument("--backend", default="json", choices=("json", "sqlite"), help="存储后端")
+    parser.add_argument("--kill", type=float, default=0.0,
+                        help="每 20ms 杀死每个运行中进程的概率（默认 0，不杀）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        trace_file = os.path.join(data_dir, "trace.jsonl")
+        env = dict(os.environ, TASKTREE_DATA_DIR=data_dir, TASKTREE_NO_DAEMON="1",
+                   TASKTREE_BACKEND=args.backend, TASKTREE_JOURNAL="1" if args.journal else "0",
+                   TASKTREE_TRACE=trace_file)
+        for setup in (["init", TASK], ["add", TASK, "root", "shared"]):
+            subprocess.run([sys.executable, MAIN, *setup], env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+
+        results = []
+        running = set()
+        lock = threading.Lock()
+        done = threading.Event()
+        threads = [threading.Thread(target=run_worker, args=(worker, args, env, results, running, lock))
+                   for worker in range(args.workers)]
+        kill_thread = None
+        if args.kill:
+            kill_thread = threading.Thread(target=killer, args=(args, running, lock, done))
+            kill_thread.start()
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        if kill_thread is not None:
+            kill_thread.join()
+
+        failures = []
+        os.environ.update(TASKTREE_DATA_DIR=data_dir, TASKTREE_BACKEND=args.backend)
+        os.environ.pop("TASKTREE_TRACE", None)
+        from tasktree.storage import open_storage
+        from tasktree.service import load_task_tree
+        try:
+            tree = load_task_tree(open_storage(TASK))
+        except Exception as e:
+            print(f"失败: 任务树无法加载: {e}", file=sys.stderr)
+            return 1
+
+        for path, status, err in results:
+            if status == "error":
+                failures.append(f"{path} 失败: {err.splitlines()[-1] if err else '?'}")
+            if status != "ok":
+                continue
+            try:
+                tree.find_task_by_path(path)
+            except Exception:
+                failures.append(f"丢失的更新: {path}")
+
+        conflicts = 0
+        if os.path.exists(trace_file):
+            with open(trace_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("span") == "storage.conflict":
+                        conflicts += 1
+
+    counts = {status: sum(1 for _, s, _ in results if s == status)
+              for status in ("ok", "error", "killed")}
+    mode = f"{args.backend}{' + journal' if args.journal else ''}"
+    print(f"{mode}: {args.workers} workers x {args.ops} ops，用时 {elapsed:.2f} s "
+          f"({len(results) / elapsed:.1f} ops/s)")
+    print(f"成功 {counts['ok']}，失败 {counts['error']}，被杀死 {counts['killed']}，"
+          f"冲突后重新执行 {conflicts}")
+    for failure in failures[:20]:
+        print(f"失败: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
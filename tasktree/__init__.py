@@ -3,6 +3,12 @@
 __version__ = "0.1.0"
 __author__ = "TaskTree Developers"
 
-from .cli import app
+__all__ = ["app"]
 
-__all__ = ["app"]
\ No newline at end of file
+
+def __getattr__(name):
+    # 按需导入 CLI：使用 tasktree.models 等子模块时不加载 typer
+    if name == "app":
+        from .cli import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,121 @@
+"""批量操作解析
+
+支持两种输入格式（可混用，每行一个操作）：
+
+1. JSON Lines：
+   {"op": "add", "parent_path": "root", "name": "设计", "status": "todo"}
+   {"op": "edit", "task_path": "root.设计", "progress": 50}
+   {"op": "delete", "task_path": "root.设计"}
+
+2. 简单操作脚本（与 CLI 参数写法一致）：
+   add root 设计 --description "界面设计" --status todo
+   edit root.设计 --progress 50
+   delete root.设计
+   move root.设计 root.阶段一 --name 界面设计
+   copy root.模板 root --name 新项目
+
+空行和以 '#' 开头的行会被忽略。
+"""
+
+import json
+import shlex
+from typing import Iterable, List
+
+
+# 脚本选项 -> (字段名, 类型)
+_ADD_OPTIONS = {
+    "--description": ("description", str), "-d": ("description", str),
+    "--status": ("status", str), "-s": ("status", str),
+    "--progress": ("progress", int), "-p": ("progress", int),
+}
+_EDIT_OPTIONS = dict(_ADD_OPTIONS, **{
+    "--name": ("name", str), "-n": ("name", str),
+})
+_MOVE_OPTIONS = {
+    "--name": ("name", str), "-n": ("name", str),
+}
+
+
+def parse_ops(lines: Iterable[str]) -> List[dict]:
+    """
+    解析批量操作
+
+    Args:
+        lines: 输入行
+
+    Returns:
+        List[dict]: 操作列表，可直接传给 TaskTree.apply_ops
+
+    Raises:
+        ValueError: 某一行无法解析
+    """
+    ops = []
+    for lineno, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            if line.startswith("{"):
+                op = json.loads(line)
+            else:
+                op = _parse_script_line(line)
+        except (ValueError, json.JSONDecodeError) as e:
+            raise ValueError(f"第 {lineno} 行解析失败: {e}")
+        ops.append(op)
+    return ops
+
+
+def _parse_script_line(line: str) -> dict:
+    """解析一行操作脚本"""
+    tokens = shlex.split(line)
+    kind, args = tokens[0], tokens[1:]
+
+    if kind == "add":
+        positional, options = _split_options(args, _ADD_OPTIONS)
+        if len(positional) != 2:
+            raise ValueError("用法: add <parent-path> <name> [options]")
+        return dict(op="add", parent_path=positional[0], name=positional[1], **options)
+
+    if kind == "edit":
+        positional, options = _split_options(args, _EDIT_OPTIONS)
+        if len(positional) != 1:
+            raise ValueError("用法: edit <task-path> [options]")
+        return dict(op="edit", task_path=positional[0], **options)
+
+    if kind == "delete":
+        positional, _ = _split_options(args, {})
+        if len(positional) != 1:
+            raise ValueError("用法: delete <task-path>")
+        return {"op": "delete", "task_path": positional[0]}
+
+    if kind in ("move", "copy"):
+        positional, options = _split_options(args, _MOVE_OPTIONS)
+        if len(positional) != 2:
+            raise ValueError(f"用法: {kind} <task-path> <new-parent-path> [--name <name>]")
+        return dict(op=kind, task_path=positional[0], new_parent_path=positional[1], **options)
+
+    raise ValueError(f"未知的操作类型: {kind!r}")
+
+
+def _split_options(args: List[str], spec: dict):
+    """拆分位置参数和选项"""
+    positional = []
+    options = {}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in spec:
+            if i + 1 >= len(args):
+                raise ValueError(f"选项 {arg} 缺少取值")
+            field, type_ = spec[arg]
+            try:
+                options[field] = type_(args[i + 1])
+            except ValueError:
+                raise ValueError(f"选项 {arg} 的取值无效: {args[i + 1]}")
+            i += 2
+        elif arg.startswith("-") and len(arg) > 1:
+            raise ValueError(f"未知选项: {arg}")
+        else:
+            positional.append(arg)
+            i += 1
+    return positional, options
@@ -0,0 +1,145 @@
+"""描述的外置存储
+
+任务描述常常是几 KB 的需求说明，而大多数命令（不带 --detail 的 list、
+按路径查找、add）只用到名称和状态。设置 TASKTREE_BLOB_BYTES=N 后，
+JSON 后端把 UTF-8 编码后不少于 N 字节的描述存到单独的文件中：
+
+    <任务>.json                  节点只保留 "description_blob": 哈希
+    <任务>.blobs/<哈希>.txt      描述原文（UTF-8），以内容的 SHA-256 命名
+
+- 加载时节点的描述是 BlobRef，第一次读取 Task.description 时才读取文件，
+  只看名称和状态的命令不会读取任何描述文件
+- 相同的描述只存一份；保存时未读取过的描述直接写回原来的引用，不读不写
+- 快照不再引用的描述文件在保存单文件快照后删除（与分片一样保留
+  SHARD_GC_GRACE 秒，供刚加载了旧快照的其他进程读取）。分片布局下的引用
+  分散在未加载的分片中，此时不清理，转回单文件格式（compact）时再清理
+
+增量保存时未修改的子树保持原来的写法，修改 TASKTREE_BLOB_BYTES 后用
+compact 命令重写整个快照即可完成转换。
+"""
+
+import os
+import re
+import hashlib
+from pathlib import Path
+from typing import Callable, Optional, Set
+
+from .models import Task
+from .exceptions import StorageError
+from . import trace
+
+
+# 占位记录中的键（JSON 字符串中的引号都经过转义，只有键会匹配）
+BLOB_KEY = '"description_blob"'
+
+_DIGEST = re.compile(r"[0-9a-f]{20}")
+_REFERENCE = re.compile(r'"description_blob": ?"([0-9a-f]{20})"')
+
+
+def blob_threshold() -> int:
+    """外置描述的字节数阈值（TASKTREE_BLOB_BYTES，0 表示不外置）"""
+    return int(os.getenv("TASKTREE_BLOB_BYTES", "0") or 0)
+
+
+def live_blobs(text: str) -> Set[str]:
+    """快照文本引用的描述文件的哈希"""
+    return set(_REFERENCE.findall(text))
+
+
+class BlobRef:
+    """尚未读取的外置描述"""
+
+    __slots__ = ("digest", "_store")
+
+    def __init__(self, digest: str, store: "BlobStore"):
+        self.digest = digest
+        self._store = store
+
+    def load(self) -> str:
+        """
+        读取描述原文
+
+        Raises:
+            StorageError: 描述文件不存在或无法读取
+        """
+        return self._store.read(self.digest)
+
+
+class BlobStore:
+    """一个任务的描述文件目录"""
+
+    def __init__(self, directory: Path, threshold: int = 0):
+        """
+        Args:
+            directory: 描述文件目录
+            threshold: 保存时外置描述的字节数阈值，0 表示只读取不外置
+        """
+        self.directory = directory
+        self.threshold = threshold
+        self.written = 0
+
+    def attach(self, task: Task, data: dict) -> None:
+        """Task.from_dict 的 on_node 回调：把引用替换为 BlobRef"""
+        digest = data.get("description_blob")
+        if digest is not None:
+            if not isinstance(digest, str) or not _DIGEST.fullmatch(digest):
+                raise ValueError(f"无效的描述引用: {digest!r}")
+            task.description = BlobRef(digest, self)
+
+    def on_node(self, before: Optional[Callable[[Task, dict], None]] = None):
+        """组合 on_node 回调（先调用 before）"""
+        if before is None:
+            return self.attach
+
+        def on_node(task: Task, data: dict) -> None:
+            before(task, data)
+            self.attach(task, data)
+        return on_node
+
+    def path(self, digest: str) -> Path:
+        return self.directory / f"{digest}.txt"
+
+    def read(self, digest: str) -> str:
+        path = self.path(digest)
+        with trace.span("storage.blob_load") as span:
+            try:
+                content = path.read_bytes()
+            except FileNotFoundError:
+                raise StorageError(f"描述文件不存在: {path}（任务可能刚被其他进程修改，请重试）")
+            span.set(bytes=len(content))
+        return content.decode('utf-8')
+
+    def reference(self, task: Task) -> Optional[str]:
+        """
+        编码快照时节点描述的写法（iter_task_json 的 blobs 回调）
+
+        Returns:
+            Optional[str]: 外置时为描述文件的哈希（文件不存在时先写入），
+                内联写出时为 None
+        """
+        value = task._description
+        if type(value) is BlobRef:
+            if self.threshold:
+                # 未读取过的描述没有变化
+                return value.digest
+            value = task.description
+        if not self.threshold or len(value) * 4 < self.threshold:
+            # UTF-8 每个字符最多 4 字节，肯定不到阈值
+            return None
+        content = value.encode('utf-8')
+        if len(content) < self.threshold:
+            return None
+        digest = hashlib.sha256(content).hexdigest()[:20]
+        path = self.path(digest)
+        if not path.exists():
+            from .storage import write_atomic
+            self.directory.mkdir(parents=True, exist_ok=True)
+            write_atomic(path, content)
+            self.written += 1
+        return digest
+
+
+def collect_garbage(directory: Path, live: Set[str]) -> int:
+    """删除快照不再引用的描述文件，返回删除的文件数"""
+    from .shards import collect_garbage as collect
+    return collect(directory, {f"{digest}.txt" for digest in live}, pattern="*.txt")
@@ -1,33 +1,160 @@
-"""TaskTree CLI 主程序 - V3 版本"""
+"""TaskTree CLI 主程序 - V3 版本
 
+启动路径只导入 typer 和命令实现：rich 在第一次输出美化文本时才导入，
+只输出 JSON 的命令（--format json/ndjson）不会加载它。
+"""
+
+import sys
+import json
 import typer
-from typing import Optional
-from rich.console import Console
-from rich.prompt import Confirm
-from rich.table import Table
+from enum import Enum
+from pathlib import Path
+from typing import Optional, Iterable, List
 from datetime import datetime
 
-from .storage import Storage
-from .tree import TaskTree
-from .models import TaskStatus
-from .exceptions import TaskNotFoundError, InvalidPathError, RootDeletionError
+from .storage import open_storage
+from .models import Task, TaskStatus
+from .batch import parse_ops
+from . import service
+from . import trace
+from .exceptions import (
+    TaskNotFoundError, InvalidPathError, RootDeletionError, BatchOperationError,
+    TreeNotInitializedError, DaemonError, MergeConflictError
+)
 
 
 app = typer.Typer(
     help="TaskTree - 树形任务管理 CLI 工具 (V3)",
     add_completion=False,
 )
-console = Console()
 
 
-def get_task_tree(storage: Storage) -> TaskTree:
-    """获取任务树实例"""
-    root_task = storage.load()
-    if root_task is None:
-        task_name = storage._task_name
-        console.print(f"[red]错误: 任务树 '{task_name}' 未初始化[/red]")
+class _LazyConsole:
+    """第一次使用时才创建 rich Console 的代理"""
+
+    def __init__(self):
+        self._console = None
+
+    def __getattr__(self, name):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console()
+        return getattr(self._console, name)
+
+
+console = _LazyConsole()
+
+# 状态 -> 显示样式
+STATUS_STYLES = {
+    "todo": "bright_black",
+    "in-progress": "yellow",
+    "done": "green",
+    "failed": "red",
+}
+
+# 每次写出的行数
+RENDER_CHUNK_ROWS = 1000
+
+
+class OutputFormat(str, Enum):
+    """输出格式"""
+    TEXT = "text"
+    JSON = "json"
+    NDJSON = "ndjson"
+
+
+class SnapshotFormat(str, Enum):
+    """快照格式"""
+    PRETTY = "pretty"
+    COMPACT = "compact"
+
+
+class Compression(str, Enum):
+    """快照的压缩方式"""
+    NONE = "none"
+    GZIP = "gzip"
+    LZMA = "lzma"
+
+
+# 全局选项（由 main 回调设置，命令自己的 --format 优先）
+state = {"format": OutputFormat.TEXT}
+
+
+def resolve_format(output_format: Optional[OutputFormat]) -> OutputFormat:
+    """确定命令使用的输出格式"""
+    return output_format or state["format"]
+
+
+def emit_record(fmt: OutputFormat, record) -> None:
+    """输出一条 JSON 记录（json 带缩进，ndjson 单行）"""
+    indent = 2 if fmt is OutputFormat.JSON else None
+    with trace.span("cli.render", rows=1):
+        sys.stdout.write(json.dumps(record, ensure_ascii=False, indent=indent) + "\n")
+
+
+def emit_records(fmt: OutputFormat, records: Iterable) -> None:
+    """
+    流式输出多条 JSON 记录
+
+    json 输出一个数组（每条记录一行），ndjson 每行一条记录，
+    都按块写出，不需要先收集全部记录。
+    """
+    with trace.span("cli.render") as span:
+        span.set(rows=_emit_records(fmt, records))
+
+
+def _emit_records(fmt: OutputFormat, records: Iterable) -> int:
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    write = sys.stdout.write
+    buffer = []
+    count = 0
+    if fmt is OutputFormat.JSON:
+        separator = "[\n"
+        for count, record in enumerate(records, 1):
+            buffer.append(separator + dumps(record))
+            separator = ",\n"
+            if len(buffer) == RENDER_CHUNK_ROWS:
+                write("".join(buffer))
+                buffer.clear()
+        buffer.append("[]\n" if separator == "[\n" else "\n]\n")
+    else:
+        for count, record in enumerate(records, 1):
+            buffer.append(dumps(record) + "\n")
+            if len(buffer) == RENDER_CHUNK_ROWS:
+                write("".join(buffer))
+                buffer.clear()
+    write("".join(buffer))
+    return count
+
+
+def fail(fmt: OutputFormat, message: str) -> None:
+    """
+    报告错误
+
+    文本格式下打印错误信息；json/ndjson 格式下输出 {"error": ...} 记录
+    并以退出码 1 结束，便于调用方解析。
+    """
+    if fmt is OutputFormat.TEXT:
+        console.print(f"[red]错误: {message}[/red]")
+        return
+    emit_record(fmt, {"error": message})
+    raise typer.Exit(code=1)
+
+
+def format_option():
+    """各命令共用的 --format 选项"""
+    return typer.Option(
+        None, "--format", "-F", help="输出格式: text | json | ndjson（默认使用全局 --format）"
+    )
+
+
+def run_command(task_name: str, command: str, fmt: OutputFormat = OutputFormat.TEXT, **kwargs):
+    """执行命令（守护进程运行时由守护进程执行）"""
+    try:
+        return service.execute(task_name, command, **kwargs)
+    except TreeNotInitializedError as e:
+        fail(fmt, str(e))
         raise typer.Exit(code=1)
-    return TaskTree(root_task)
 
 
 @app.command(help="初始化新的任务树")
@@ -39,7 +166,7 @@ def init(
 ):
     """初始化新的任务树"""
     try:
-        storage = Storage(task_name)
+        storage = open_storage(task_name)
         root_task = storage.initialize(description)
         
         console.print(f"[green]✓ 成功初始化任务树[/green]")
@@ -53,23 +180,34 @@ def init(
         console.print(f"[red]错误: 初始化失败: {e}[/red]")
 
 
+
 @app.command(help="列出所有任务")
-def list_tasks():
+def list_tasks(
+    output_format: Optional[OutputFormat] = format_option()
+):
     """列出所有任务"""
+    fmt = resolve_format(output_format)
     try:
         # 创建一个临时的 Storage 实例来访问存储目录
         # 由于 Storage 现在需要 task_name，我们创建一个虚拟的
-        storage = Storage("temp_for_listing")
+        storage = open_storage("temp_for_listing")
         tasks = storage.list_tasks()
         
+        if fmt is not OutputFormat.TEXT:
+            emit_records(fmt, tasks)
+            return
+        
         if not tasks:
             console.print("[yellow]没有找到任务[/yellow]")
             console.print(f"[cyan]使用 'tasktree init <task-name>' 创建新任务[/cyan]")
             return
         
+        from rich.table import Table
         table = Table(title="任务列表", show_header=True, header_style="bold magenta")
         table.add_column("任务名称", style="cyan")
         table.add_column("文件名", style="dim")
+        table.add_column("节点数", justify="right")
+        table.add_column("已完成", justify="right", style="green")
         table.add_column("最后修改", style="yellow")
         
         for task_info in tasks:
@@ -80,18 +218,23 @@ def list_tasks():
             table.add_row(
                 task_info["name"],
                 task_info["filename"],
+                str(task_info["nodes"]),
+                str(task_info["status_counts"].get("done", 0)),
                 time_str
             )
         
-        console.print(table)
+        with trace.span("cli.render"):
+            console.print(table)
+    except typer.Exit:
+        raise
     except Exception as e:
-        console.print(f"[red]错误: 列出任务失败: {e}[/red]")
+        fail(fmt, f"列出任务失败: {e}")
 
 
 @app.command(help="在指定父节点下添加新任务")
 def add(
     task_name: str = typer.Argument(..., help="任务名称"),
-    parent_path: str = typer.Argument(..., help="父任务路径（如 'root.subtask'）"),
+    parent_path: str = typer.Argument(..., help="父任务路径（如 'root.subtask' 或 '#任务ID'）"),
     name: str = typer.Argument(..., help="新任务名称"),
     description: Optional[str] = typer.Option(
         "", "--description", "-d", help="任务描述"
@@ -104,28 +247,36 @@ def add(
         help="完成进度 (0-100)",
         min=0,
         max=100
-    )
+    ),
+    output_format: Optional[OutputFormat] = format_option()
 ):
     """添加新任务"""
+    fmt = resolve_format(output_format)
     try:
-        storage = Storage(task_name)
-        task_tree = get_task_tree(storage)
+        new_task = run_command(
+            task_name, "add", fmt, parent_path=parent_path, name=name,
+            description=description, status=status.value, progress=progress
+        )
         
-        new_task = task_tree.add_task(parent_path, name, description, status, progress)
-        storage.save(task_tree.root)
+        if fmt is not OutputFormat.TEXT:
+            emit_record(fmt, new_task)
+            return
         
-        console.print(f"[green]✓ 成功添加任务: {new_task.name}[/green]")
+        console.print(f"[green]✓ 成功添加任务: {new_task['name']}[/green]")
         console.print(f"任务: {task_name}")
         console.print(f"路径: {parent_path}.{name}")
-        console.print(f"状态: {new_task.status.value}")
-        if new_task.progress is not None:
-            console.print(f"进度: {new_task.progress}%")
+        console.print(f"ID: {new_task['id']}")
+        console.print(f"状态: {new_task['status']}")
+        if new_task["progress"] is not None:
+            console.print(f"进度: {new_task['progress']}%")
     except TaskNotFoundError as e:
-        console.print(f"[red]错误: {e}[/red]")
+        fail(fmt, str(e))
     except ValueError as e:
-        console.print(f"[red]错误: {e}[/red]")
+        fail(fmt, str(e))
+    except typer.Exit:
+        raise
     except Exception as e:
-        console.print(f"[red]错误: 添加任务失败: {e}[/red]")
+        fail(fmt, f"添加任务失败: {e}")
 
 
 @app.command(help="显示任务树结构")
@@ -133,63 +284,315 @@ def list(
     task_name: str = typer.Argument(..., help="任务名称"),
     detail: bool = typer.Option(
         False, "--detail", "-d", help="显示详细信息（描述、进度）"
-    )
+    ),
+    depth: Optional[int] = typer.Option(
+        None, "--depth", "-L", help="最大显示深度（起始节点为 0）", min=0
+    ),
+    subtree: Optional[str] = typer.Option(
+        None, "--subtree", help="只显示指定路径下的子树"
+    ),
+    limit: Optional[int] = typer.Option(
+        None, "--limit", "-n", help="最多显示的行数", min=1
+    ),
+    offset: int = typer.Option(
+        0, "--offset", help="跳过前 N 行（与 --limit 配合分页）", min=0
+    ),
+    plain: bool = typer.Option(
+        False, "--plain", help="输出不着色的纯文本（输出不是终端时自动启用）"
+    ),
+    output_format: Optional[OutputFormat] = format_option()
 ):
     """显示任务树结构"""
+    fmt = resolve_format(output_format)
     try:
-        storage = Storage(task_name)
-        task_tree = get_task_tree(storage)
-        lines = task_tree.get_tree_structure(detail)
+        if fmt is not OutputFormat.TEXT:
+            # 按先序逐个输出节点记录（path、depth、status、progress 等）
+            nodes = run_command(task_name, "nodes", fmt, depth=depth, subtree=subtree,
+                                offset=offset, limit=limit)
+            emit_records(fmt, nodes)
+            return
+        
+        rows = run_command(task_name, "list", detail=detail, depth=depth, subtree=subtree,
+                           offset=offset, limit=limit)
+        
+        if plain or not console.is_terminal:
+            sys.stdout.write(f"任务树结构 ({task_name}):\n")
+            _write_plain_rows(rows)
+            return
         
         console.print(f"[bold cyan]任务树结构 ({task_name}):[/bold cyan]")
-        for line in lines:
-            # 根据状态着色
-            if "[todo]" in line:
-                console.print(f"[grey]{line}[/grey]")
-            elif "[in-progress]" in line:
-                console.print(f"[yellow]{line}[/yellow]")
-            elif "[done]" in line:
-                console.print(f"[green]{line}[/green]")
-            elif "[failed]" in line:
-                console.print(f"[red]{line}[/red]")
-            else:
-                console.print(line)
+        count = _print_rows(rows)
+        if limit is not None and count == limit:
+            console.print(f"[dim]已显示 {count} 行，使用 --offset {offset + count} 查看后续[/dim]")
+    except (TaskNotFoundError, InvalidPathError) as e:
+        fail(fmt, str(e))
+    except typer.Exit:
+        raise
+    except Exception as e:
+        fail(fmt, f"显示任务树失败: {e}")
+
+
+def _print_rows(rows) -> int:
+    """按状态着色输出 (状态, 行) 序列，返回输出的行数"""
+    with trace.span("cli.render") as span:
+        count = _print_styled_rows(rows)
+        span.set(rows=count)
+    return count
+
+
+def _print_styled_rows(rows) -> int:
+    from rich.text import Text
+    # 行文本作为纯文本追加，不解析 rich 标记（行中的 [todo] 等不会被当作标签）
+    text = Text()
+    count = 0
+    for status, line in rows:
+        text.append(line, style=STATUS_STYLES.get(status))
+        text.append("\n")
+        count += 1
+        if count % RENDER_CHUNK_ROWS == 0:
+            console.print(text, end="")
+            text = Text()
+    if text:
+        console.print(text, end="")
+    return count
+
+
+def _write_plain_rows(rows) -> None:
+    """把 (状态, 行) 序列按块写到标准输出"""
+    with trace.span("cli.render") as span:
+        write = sys.stdout.write
+        buffer = []
+        count = 0
+        for count, (_, line) in enumerate(rows, 1):
+            buffer.append(line)
+            if len(buffer) == RENDER_CHUNK_ROWS:
+                buffer.append("")
+                write("\n".join(buffer))
+                buffer.clear()
+        if buffer:
+            buffer.append("")
+            write("\n".join(buffer))
+        span.set(rows=count)
+
+
+@app.command(help="查找满足条件的任务")
+def find(
+    task_name: str = typer.Argument(..., help="任务名称"),
+    status: Optional[List[TaskStatus]] = typer.Option(
+        None, "--status", "-s", help="任务状态（可重复指定，满足其一即可）"
+    ),
+    min_progress: Optional[int] = typer.Option(
+        None, "--min-progress", help="最小进度（包含）", min=0, max=100
+    ),
+    max_progress: Optional[int] = typer.Option(
+        None, "--max-progress", help="最大进度（包含）", min=0, max=100
+    ),
+    name: Optional[str] = typer.Option(
+        None, "--name", help="名称包含的文本（不区分大小写）"
+    ),
+    description: Optional[str] = typer.Option(
+        None, "--desc", help="描述包含的文本（不区分大小写）"
+    ),
+    pattern: Optional[str] = typer.Option(
+        None, "--regex", "-e", help="正则表达式，在名称或描述中搜索"
+    ),
+    min_depth: Optional[int] = typer.Option(
+        None, "--min-depth", help="最小深度（起始节点为 0）", min=0
+    ),
+    max_depth: Optional[int] = typer.Option(
+        None, "--max-depth", help="最大深度", min=0
+    ),
+    subtree: Optional[str] = typer.Option(
+        None, "--subtree", help="只在指定路径下的子树中查找"
+    ),
+    limit: Optional[int] = typer.Option(
+        None, "--limit", "-n", help="最多输出的结果数", min=1
+    ),
+    output_format: Optional[OutputFormat] = format_option()
+):
+    """查找满足条件的任务"""
+    fmt = resolve_format(output_format)
+    try:
+        records = run_command(
+            task_name, "find", fmt,
+            statuses=[s.value for s in status] if status else None,
+            min_progress=min_progress, max_progress=max_progress, name=name,
+            description=description, pattern=pattern, min_depth=min_depth,
+            max_depth=max_depth, subtree=subtree, limit=limit
+        )
+        
+        if fmt is not OutputFormat.TEXT:
+            emit_records(fmt, records)
+            return
+        
+        # 每行输出一个匹配任务的路径
+        rows = ((record["status"], record["path"]) for record in records)
+        if not console.is_terminal:
+            _write_plain_rows(rows)
+            return
+        count = _print_rows(rows)
+        console.print(f"[dim]共找到 {count} 个任务[/dim]")
+    except (TaskNotFoundError, InvalidPathError) as e:
+        fail(fmt, str(e))
+    except ValueError as e:
+        fail(fmt, str(e))
+    except typer.Exit:
+        raise
+    except Exception as e:
+        fail(fmt, f"查找任务失败: {e}")
+
+
+@app.command(help="在所有任务中查找满足条件的任务（多进程并行）")
+def grep(
+    status: Optional[List[TaskStatus]] = typer.Option(
+        None, "--status", "-s", help="任务状态（可重复指定，满足其一即可）"
+    ),
+    min_progress: Optional[int] = typer.Option(
+        None, "--min-progress", help="最小进度（包含）", min=0, max=100
+    ),
+    max_progress: Optional[int] = typer.Option(
+        None, "--max-progress", help="最大进度（包含）", min=0, max=100
+    ),
+    name: Optional[str] = typer.Option(
+        None, "--name", help="名称包含的文本（不区分大小写）"
+    ),
+    description: Optional[str] = typer.Option(
+        None, "--desc", help="描述包含的文本（不区分大小写）"
+    ),
+    pattern: Optional[str] = typer.Option(
+        None, "--regex", "-e", help="正则表达式，在名称或描述中搜索"
+    ),
+    min_depth: Optional[int] = typer.Option(
+        None, "--min-depth", help="最小深度（根节点为 0）", min=0
+    ),
+    max_depth: Optional[int] = typer.Option(
+        None, "--max-depth", help="最大深度", min=0
+    ),
+    tasks: Optional[List[str]] = typer.Option(
+        None, "--task", "-t", help="只在指定的任务中查找（可重复指定，默认全部任务）"
+    ),
+    limit: Optional[int] = typer.Option(
+        None, "--limit", "-n", help="最多输出的结果数（达到后不再读取其余任务）", min=1
+    ),
+    workers: Optional[int] = typer.Option(
+        None, "--workers", "-j", help="工作进程数（默认 TASKTREE_WORKERS 或 CPU 数，最多 8）", min=1
+    ),
+    output_format: Optional[OutputFormat] = format_option()
+):
+    """在所有任务中查找"""
+    from . import scan
+
+    fmt = resolve_format(output_format)
+    criteria = dict(
+        statuses=[s.value for s in status] if status else None,
+        min_progress=min_progress, max_progress=max_progress, name=name,
+        description=description, pattern=pattern, min_depth=min_depth, max_depth=max_depth
+    )
+    try:
+        batches = scan.grep(criteria, tasks or None, workers, limit)
+        
+        if fmt is not OutputFormat.TEXT:
+            emit_records(fmt, (record for records in batches for record in records))
+            return
+        
+        # 每行输出 "任务名称: 路径"，每个任务完成后立即输出
+        count = 0
+        for records in batches:
+            for record in records:
+                if "error" in record:
+                    console.print(f"[red]错误: {record['task']}: {record['error']}[/red]")
+            count += _print_rows((record["status"], f"{record['task']}: {record['path']}")
+                                 for record in records if "error" not in record)
+        if console.is_terminal:
+            console.print(f"[dim]共找到 {count} 个任务[/dim]")
+    except ValueError as e:
+        fail(fmt, str(e))
+    except typer.Exit:
+        raise
     except Exception as e:
-        console.print(f"[red]错误: 显示任务树失败: {e}[/red]")
+        fail(fmt, f"查找任务失败: {e}")
+
+
+@app.command(help="统计所有任务的完成情况（多进程并行）")
+def report(
+    tasks: Optional[List[str]] = typer.Option(
+        None, "--task", "-t", help="只统计指定的任务（可重复指定，默认全部任务）"
+    ),
+    workers: Optional[int] = typer.Option(
+        None, "--workers", "-j", help="工作进程数（默认 TASKTREE_WORKERS 或 CPU 数，最多 8）", min=1
+    ),
+    output_format: Optional[OutputFormat] = format_option()
+):
+    """统计所有任务"""
+    from . import scan
+
+    fmt = resolve_format(output_format)
+    try:
+        records = scan.report(tasks or None, workers)
+        
+        if fmt is not OutputFormat.TEXT:
+            emit_records(fmt, records)
+            return
+        
+        # 每个任务统计完成后立即输出一行，最后输出合计
+        from .rollup import Rollup
+        total = Rollup.zero()
+        count = 0
+        for record in records:
+            if "error" in record:
+                console.print(f"[red]错误: {record['task']}: {record['error']}[/red]")
+                continue
+            counts = record["status_counts"]
+            progress = record["progress"]
+            console.print(
+                f"{record['task']}: {record['nodes']} 个节点  "
+                + " / ".join(f"{key} {value}" for key, value in counts.items())
+                + f"  进度 {str(progress) + '%' if progress is not None else '(无)'}",
+                markup=False, highlight=False
+            )
+            for key, value in counts.items():
+                total.add(Rollup.of_status(key, value, 0, 0))
+            count += 1
+        summary = total.summary()
+        done = summary["status_counts"]["done"]
+        console.print(f"[dim]共 {count} 个任务，{summary['nodes']} 个节点，"
+                      f"已完成 {done} 个"
+                      f"（{done * 100 // summary['nodes'] if summary['nodes'] else 0}%）[/dim]")
+    except typer.Exit:
+        raise
+    except Exception as e:
+        fail(fmt, f"统计任务失败: {e}")
 
 
 @app.command(help="显示任务详细信息")
 def show(
     task_name: str = typer.Argument(..., help="任务名称"),
-    task_path: str = typer.Argument(..., help="任务路径")
+    task_path: str = typer.Argument(..., help="任务路径（或 '#任务ID'）"),
+    output_format: Optional[OutputFormat] = format_option()
 ):
     """显示任务详细信息"""
+    fmt = resolve_format(output_format)
     try:
-        storage = Storage(task_name)
-        task_tree = get_task_tree(storage)
-        task_info = task_tree.get_task_info(task_path)
+        task_info = run_command(task_name, "show", fmt, task_path=task_path)
+        
+        if fmt is not OutputFormat.TEXT:
+            emit_record(fmt, task_info)
+            return
         
+        from rich.table import Table
+        from rich.text import Text
         table = Table(title=f"任务详情 ({task_name})", show_header=False, box=None)
         table.add_column("属性", style="cyan")
         table.add_column("值", style="white")
         
         table.add_row("路径", task_info["path"])
+        table.add_row("ID", task_info["id"])
         table.add_row("名称", task_info["name"])
         table.add_row("描述", task_info["description"] or "(无)")
         
         # 状态着色
         status = task_info["status"]
-        if status == "todo":
-            status_display = f"[grey]{status}[/grey]"
-        elif status == "in-progress":
-            status_display = f"[yellow]{status}[/yellow]"
-        elif status == "done":
-            status_display = f"[green]{status}[/green]"
-        elif status == "failed":
-            status_display = f"[red]{status}[/red]"
-        else:
-            status_display = status
-        table.add_row("状态", status_display)
+        table.add_row("状态", Text(status, style=STATUS_STYLES.get(status, "")))
         
         progress = task_info["progress"]
         if progress is not None:
@@ -200,17 +603,28 @@ def show(
         
         table.add_row("子任务数量", str(task_info["children_count"]))
         
-        console.print(table)
+        rollup = task_info.get("rollup")
+        if rollup is not None:
+            table.add_row("子孙任务数量", str(rollup["descendants"]))
+            table.add_row("状态统计", " / ".join(
+                f"{status} {count}" for status, count in rollup["status_counts"].items()))
+            rollup_progress = rollup["progress"]
+            table.add_row("汇总进度", f"{rollup_progress}%" if rollup_progress is not None else "(无)")
+        
+        with trace.span("cli.render"):
+            console.print(table)
     except (TaskNotFoundError, InvalidPathError) as e:
-        console.print(f"[red]错误: {e}[/red]")
+        fail(fmt, str(e))
+    except typer.Exit:
+        raise
     except Exception as e:
-        console.print(f"[red]错误: 显示任务失败: {e}[/red]")
+        fail(fmt, f"显示任务失败: {e}")
 
 
 @app.command(help="编辑任务属性")
 def edit(
     task_name: str = typer.Argument(..., help="任务名称"),
-    task_path: str = typer.Argument(..., help="任务路径"),
+    task_path: str = typer.Argument(..., help="任务路径（或 '#任务ID'）"),
     name: Optional[str] = typer.Option(
         None, "--name", "-n", help="新名称"
     ),
@@ -225,66 +639,370 @@ def edit(
         help="新进度 (0-100)",
         min=0,
         max=100
-    )
+    ),
+    output_format: Optional[OutputFormat] = format_option()
 ):
     """编辑任务属性"""
+    fmt = resolve_format(output_format)
     # 检查是否提供了至少一个修改项
     if all(v is None for v in [name, description, status, progress]):
+        if fmt is not OutputFormat.TEXT:
+            fail(fmt, "至少需要一个修改选项 (--name, --description, --status, --progress)")
         console.print("[yellow]警告: 至少需要一个修改选项 (--name, --description, --status, --progress)[/yellow]")
         return
     
     try:
-        storage = Storage(task_name)
-        task_tree = get_task_tree(storage)
-        task_obj = task_tree.edit_task(task_path, name, description, status, progress)
-        storage.save(task_tree.root)
+        task_info = run_command(
+            task_name, "edit", fmt, task_path=task_path, name=name, description=description,
+            status=status.value if status is not None else None, progress=progress
+        )
+        
+        if fmt is not OutputFormat.TEXT:
+            emit_record(fmt, task_info)
+            return
         
-        console.print(f"[green]✓ 成功更新任务: {task_obj.name}[/green]")
+        console.print(f"[green]✓ 成功更新任务: {task_info['name']}[/green]")
         console.print(f"任务: {task_name}")
         console.print(f"路径: {task_path}")
     except (TaskNotFoundError, InvalidPathError) as e:
-        console.print(f"[red]错误: {e}[/red]")
+        fail(fmt, str(e))
     except ValueError as e:
-        console.print(f"[red]错误: {e}[/red]")
+        fail(fmt, str(e))
+    except typer.Exit:
+        raise
     except Exception as e:
-        console.print(f"[red]错误: 编辑任务失败: {e}[/red]")
+        fail(fmt, f"编辑任务失败: {e}")
 
 
 @app.command(help="删除任务及其所有子任务")
 def delete(
     task_name: str = typer.Argument(..., help="任务名称"),
-    task_path: str = typer.Argument(..., help="任务路径"),
+    task_path: str = typer.Argument(..., help="任务路径（或 '#任务ID'）"),
     force: bool = typer.Option(
         False, "--force", "-f", help="直接删除，无需确认"
-    )
+    ),
+    output_format: Optional[OutputFormat] = format_option()
 ):
     """删除任务及其所有子任务"""
+    fmt = resolve_format(output_format)
     try:
-        storage = Storage(task_name)
-        task_tree = get_task_tree(storage)
-        
-        # 获取要删除的任务信息
-        task_info = task_tree.get_task_info(task_path)
-        
         # 确认删除
         if not force:
+            # 机器可读输出没有交互确认
+            if fmt is not OutputFormat.TEXT:
+                fail(fmt, "json/ndjson 输出格式下删除任务需要指定 --force")
+            # 获取要删除的任务信息
+            task_info = run_command(task_name, "show", task_path=task_path)
             console.print(f"[yellow]警告: 将删除任务 '{task_info['name']}' 及其 {task_info['children_count']} 个子任务[/yellow]")
+            from rich.prompt import Confirm
             if not Confirm.ask("确认删除？", default=False):
                 console.print("已取消删除")
                 return
         
         # 执行删除
-        task_tree.delete_task(task_path)
-        storage.save(task_tree.root)
+        task_info = run_command(task_name, "delete", fmt, task_path=task_path)
+        
+        if fmt is not OutputFormat.TEXT:
+            emit_record(fmt, task_info)
+            return
         
         console.print(f"[green]✓ 成功删除任务: {task_info['name']}[/green]")
         console.print(f"任务: {task_name}")
     except RootDeletionError as e:
-        console.print(f"[red]错误: {e}[/red]")
+        fail(fmt, str(e))
+    except (TaskNotFoundError, InvalidPathError) as e:
+        fail(fmt, str(e))
+    except typer.Exit:
+        raise
+    except Exception as e:
+        fail(fmt, f"删除任务失败: {e}")
+
+
+@app.command(help="把任务连同子树移动到另一个父任务下")
+def move(
+    task_name: str = typer.Argument(..., help="任务名称"),
+    task_paths: List[str] = typer.Argument(..., help="要移动的任务路径（可以有多个），最后一个是新的父任务路径"),
+    name: Optional[str] = typer.Option(
+        None, "--name", "-n", help="移动后的新名称（只能移动一个任务时使用）"
+    ),
+    output_format: Optional[OutputFormat] = format_option()
+):
+    """移动任务"""
+    _relocate(task_name, "move", task_paths, name, output_format)
+
+
+@app.command(help="把任务连同子树复制到另一个父任务下")
+def copy(
+    task_name: str = typer.Argument(..., help="任务名称"),
+    task_paths: List[str] = typer.Argument(..., help="要复制的任务路径（可以有多个），最后一个是新的父任务路径"),
+    name: Optional[str] = typer.Option(
+        None, "--name", "-n", help="副本的名称（只能复制一个任务时使用）"
+    ),
+    output_format: Optional[OutputFormat] = format_option()
+):
+    """复制任务"""
+    _relocate(task_name, "copy", task_paths, name, output_format)
+
+
+def _relocate(task_name: str, command: str, task_paths: List[str], name: Optional[str],
+              output_format: Optional[OutputFormat]) -> None:
+    """move/copy 的共同实现（多个任务在一次加载、一次保存中完成）"""
+    fmt = resolve_format(output_format)
+    action = "移动" if command == "move" else "复制"
+    try:
+        if len(task_paths) < 2:
+            fail(fmt, f"至少需要一个要{action}的任务路径和新的父任务路径")
+            raise typer.Exit(code=1)
+        infos = run_command(task_name, command, fmt, task_paths=task_paths[:-1],
+                            new_parent_path=task_paths[-1], name=name)
+        
+        if fmt is not OutputFormat.TEXT:
+            emit_records(fmt, infos)
+            return
+        
+        for info in infos:
+            console.print(f"[green]✓ 成功{action}任务: {info['name']}[/green]")
+            console.print(f"路径: {info['path']}")
+            console.print(f"ID: {info['id']}")
+        console.print(f"任务: {task_name}")
+    except BatchOperationError as e:
+        fail(fmt, f"{e}，已回滚全部操作，任务树未修改")
     except (TaskNotFoundError, InvalidPathError) as e:
+        fail(fmt, str(e))
+    except ValueError as e:
+        fail(fmt, str(e))
+    except typer.Exit:
+        raise
+    except Exception as e:
+        fail(fmt, f"{action}任务失败: {e}")
+
+
+@app.command(help="批量执行操作（一次加载、一次保存，失败则全部回滚）")
+def batch(
+    task_name: str = typer.Argument(..., help="任务名称"),
+    file: Optional[Path] = typer.Option(
+        None, "--file", "-f", help="操作文件（JSON Lines 或操作脚本），默认读取标准输入"
+    )
+):
+    """批量执行操作"""
+    try:
+        if file is not None:
+            with open(file, 'r', encoding='utf-8') as f:
+                ops = parse_ops(f)
+        else:
+            ops = parse_ops(sys.stdin)
+
+        results = run_command(task_name, "batch", ops=ops)
+
+        for result in results:
+            console.print(f"[green]✓[/green] [{result['index']}] {result['op']} {result['path']}")
+        console.print(f"[green]✓ 成功执行 {len(results)} 个操作[/green]")
+        console.print(f"任务: {task_name}")
+    except BatchOperationError as e:
+        for result in e.results:
+            console.print(f"[green]✓[/green] [{result['index']}] {result['op']} {result['path']}")
+        console.print(f"[red]✗ [{e.index}] {e.op}[/red]")
+        console.print(f"[red]错误: {e}[/red]")
+        console.print(f"[yellow]已回滚全部操作，任务树未修改[/yellow]")
+        raise typer.Exit(code=1)
+    except ValueError as e:
+        console.print(f"[red]错误: {e}[/red]")
+        raise typer.Exit(code=1)
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]错误: 批量执行失败: {e}[/red]")
+        raise typer.Exit(code=1)
+
+
+@app.command(name="export", help="把任务树导出为 JSON")
+def export_(
+    task_name: str = typer.Argument(..., help="任务名称"),
+    output: Optional[Path] = typer.Option(
+        None, "--output", "-o", help="输出文件（默认输出到标准输出）"
+    )
+):
+    """把任务树导出为 JSON"""
+    try:
+        root_task = open_storage(task_name).load()
+        if root_task is None:
+            console.print(f"[red]错误: 任务树 '{task_name}' 未初始化[/red]")
+            raise typer.Exit(code=1)
+        
+        from .serialization import iter_task_json
+        
+        # 逐段写出，不受嵌套深度限制（json.dumps 在几千层的链上会超出递归深度）
+        if output is None:
+            sys.stdout.writelines(iter_task_json(root_task))
+            sys.stdout.write("\n")
+            return
+        with open(output, 'w', encoding='utf-8') as f:
+            f.writelines(iter_task_json(root_task))
+        console.print(f"[green]✓ 已导出任务树: {task_name}[/green]")
+        console.print(f"输出文件: {output.absolute()}")
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]错误: 导出失败: {e}[/red]")
+
+
+@app.command(name="import", help="从 JSON 文件导入任务树")
+def import_(
+    task_name: str = typer.Argument(..., help="任务名称"),
+    file: Path = typer.Argument(..., help="JSON 文件（格式同 export 的输出）"),
+    force: bool = typer.Option(
+        False, "--force", "-f", help="覆盖已存在的任务树"
+    )
+):
+    """从 JSON 文件导入任务树"""
+    try:
+        storage = open_storage(task_name)
+        if storage.exists() and not force:
+            console.print(f"[red]错误: 任务 '{task_name}' 已存在[/red]")
+            console.print(f"[yellow]提示: 使用 --force 覆盖[/yellow]")
+            return
+        
+        from .serialization import loads_deep
+        
+        with open(file, 'r', encoding='utf-8') as f:
+            root_task = Task.from_dict(loads_deep(f.read()))
+        storage.save(root_task)
+        
+        console.print(f"[green]✓ 已导入任务树: {task_name}[/green]")
+        console.print(f"数据文件: {storage.data_file.absolute()}")
+    except (json.JSONDecodeError, KeyError, ValueError) as e:
+        console.print(f"[red]错误: 无效的任务数据: {e}[/red]")
+    except Exception as e:
+        console.print(f"[red]错误: 导入失败: {e}[/red]")
+
+
+@app.command(help="把日志合并进新的快照文件")
+def compact(
+    task_name: str = typer.Argument(..., help="任务名称")
+):
+    """把日志合并进新的快照文件"""
+    try:
+        folded = open_storage(task_name).compact()
+        console.print(f"[green]✓ 已压缩任务: {task_name}[/green]")
+        console.print(f"合并日志记录: {folded}")
+    except FileNotFoundError as e:
+        console.print(f"[red]错误: {e}[/red]")
+    except Exception as e:
+        console.print(f"[red]错误: 压缩失败: {e}[/red]")
+
+
+@app.command(help="按指定的格式和压缩方式重写任务快照")
+def migrate(
+    task_names: Optional[List[str]] = typer.Argument(None, help="任务名称（默认全部任务）"),
+    file_format: Optional[SnapshotFormat] = typer.Option(
+        None, "--file-format", help="快照格式（默认沿用现有文件的格式）"
+    ),
+    compression: Optional[Compression] = typer.Option(
+        None, "--compress", help="压缩方式（默认沿用现有文件的压缩方式）"
+    )
+):
+    """转换任务快照的格式"""
+    from .storage import Storage
+
+    if file_format is None and compression is None:
+        console.print("[red]错误: 至少指定 --file-format 或 --compress 之一[/red]")
+        raise typer.Exit(code=1)
+    try:
+        if not isinstance(open_storage("temp_for_listing"), Storage):
+            console.print("[red]错误: migrate 只适用于 JSON 存储后端[/red]")
+            raise typer.Exit(code=1)
+        if not task_names:
+            task_names = [task["name"] for task in open_storage("temp_for_listing").list_tasks()]
+        
+        for task_name in task_names:
+            storage = Storage(task_name, file_format=file_format and file_format.value,
+                              compression=compression and compression.value)
+            before = storage.disk_usage()
+            try:
+                storage.compact()
+            except Exception as e:
+                console.print(f"[red]错误: {task_name}: {e}[/red]")
+                continue
+            after = storage.disk_usage()
+            new_format, new_compression = storage.snapshot_format()
+            console.print(f"[green]✓ 已转换任务: {task_name}[/green] "
+                          f"({new_format}, {new_compression}) "
+                          f"{_format_size(before)} → {_format_size(after)}")
+    except typer.Exit:
+        raise
+    except Exception as e:
+        console.print(f"[red]错误: 转换失败: {e}[/red]")
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+@app.command(help="重建数据目录清单（list-tasks 使用的缓存）")
+def reindex():
+    """重建数据目录清单"""
+    try:
+        count = open_storage("temp_for_listing").reindex()
+        console.print(f"[green]✓ 已重建清单[/green]")
+        console.print(f"任务数量: {count}")
+    except Exception as e:
+        console.print(f"[red]错误: 重建清单失败: {e}[/red]")
+
+
+@app.command(help="启动守护进程，在内存中保持任务树以加速后续命令")
+def serve(
+    flush_interval: float = typer.Option(
+        1.0, "--flush-interval", help="后台写回文件的间隔（秒）"
+    ),
+    stop: bool = typer.Option(
+        False, "--stop", help="停止正在运行的守护进程"
+    )
+):
+    """启动守护进程"""
+    from . import daemon
+
+    if stop:
+        client = daemon.connect()
+        if client is None:
+            console.print("[yellow]守护进程未运行[/yellow]")
+            return
+        with client:
+            client.request("shutdown")
+        console.print("[green]✓ 已通知守护进程停止[/green]")
+        return
+
+    server = daemon.TaskTreeDaemon(flush_interval=flush_interval)
+    try:
+        console.print(f"[green]✓ 守护进程已启动[/green]")
+        console.print(f"套接字: {server.socket_path}")
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except DaemonError as e:
         console.print(f"[red]错误: {e}[/red]")
+        raise typer.Exit(code=1)
+    console.print("守护进程已停止")
+
+
+@app.command(help="交互式 shell：只加载一次任务树，连续执行多条命令")
+def shell(
+    task_name: str = typer.Argument(..., help="任务名称")
+):
+    """交互式 shell"""
+    from .shell import run_shell
+
+    try:
+        run_shell(task_name, typer.main.get_command(app))
+    except (TreeNotInitializedError, MergeConflictError) as e:
+        console.print(f"[red]错误: {e}[/red]")
+        raise typer.Exit(code=1)
     except Exception as e:
-        console.print(f"[red]错误: 删除任务失败: {e}[/red]")
+        console.print(f"[red]错误: shell 异常退出: {e}[/red]")
+        raise typer.Exit(code=1)
 
 
 @app.command(help="显示帮助信息")
@@ -299,18 +1017,34 @@ def help():
     console.print()
     console.print("命令列表:")
     
+    from rich.table import Table
     commands_table = Table(show_header=True, header_style="bold magenta")
     commands_table.add_column("命令", style="cyan")
     commands_table.add_column("说明", style="white")
     
     commands_table.add_row("init <task-name>", "初始化新的任务树")
     commands_table.add_row("add <task-name> <parent-path> <name>", "在指定父节点下添加新任务")
-    commands_table.add_row("list <task-name> [--detail]", "显示任务树结构")
+    commands_table.add_row("list <task-name> [--detail] [--depth N] [--subtree <path>]", "显示任务树结构")
     commands_table.add_row("show <task-name> <task-path>", "显示任务详细信息")
+    commands_table.add_row("find <task-name> [--status ...] [--name ...]", "查找满足条件的任务")
+    commands_table.add_row("grep [--status ...] [--name ...] [--limit N]", "在所有任务中并行查找")
+    commands_table.add_row("report [--task <name> ...]", "并行统计所有任务的完成情况")
     commands_table.add_row("edit <task-name> <task-path> [options]", "编辑任务属性")
     commands_table.add_row("delete <task-name> <task-path> [--force]", "删除任务及其所有子任务")
+    commands_table.add_row("move <task-name> <path>... <new-parent-path> [--name N]", "移动任务及其子树")
+    commands_table.add_row("copy <task-name> <path>... <new-parent-path> [--name N]", "复制任务及其子树")
+    commands_table.add_row("batch <task-name> [--file <file>]", "批量执行操作（一次加载、一次保存）")
+    commands_table.add_row("export <task-name> [--output <file>]", "把任务树导出为 JSON")
+    commands_table.add_row("import <task-name> <file> [--force]", "从 JSON 文件导入任务树")
+    commands_table.add_row("compact <task-name>", "把日志合并进新的快照文件")
+    commands_table.add_row("migrate [<task-name>...] [--file-format F] [--compress C]", "转换快照格式（紧凑格式、gzip/lzma 压缩）")
+    commands_table.add_row("reindex", "重建数据目录清单")
+    commands_table.add_row("serve [--stop]", "启动/停止守护进程")
+    commands_table.add_row("shell <task-name>", "交互式 shell（任务树常驻内存，路径 Tab 补全）")
     commands_table.add_row("list-tasks", "列出所有任务")
     commands_table.add_row("help", "显示帮助信息")
+    commands_table.add_row("--format json|ndjson <command> ...", "输出机器可读的 JSON / NDJSON（也可作为命令选项）")
+    commands_table.add_row("--profile <command> ...", "命令结束时输出各阶段耗时（另有 --trace-file、--cprofile）")
     
     console.print(commands_table)
     console.print()
@@ -327,9 +1061,27 @@ def help():
 def main(
     version: bool = typer.Option(
         False, "--version", "-v", help="显示版本信息"
+    ),
+    output_format: OutputFormat = typer.Option(
+        OutputFormat.TEXT, "--format", "-F",
+        help="输出格式: text | json | ndjson（作用于 list/show/list-tasks/add/edit/delete）"
+    ),
+    profile: bool = typer.Option(
+        False, "--profile", help="命令结束时向标准错误输出各阶段耗时（也可设置 TASKTREE_TRACE=1）"
+    ),
+    trace_file: Optional[Path] = typer.Option(
+        None, "--trace-file", help="把各阶段耗时作为 JSON 行追加到文件（也可设置 TASKTREE_TRACE=文件）"
+    ),
+    cprofile: Optional[Path] = typer.Option(
+        None, "--cprofile", help="用 cProfile 剖析命令并写入文件（也可设置 TASKTREE_CPROFILE）"
     )
 ):
     """TaskTree - 树形任务管理 CLI 工具 (V3)"""
+    state["format"] = output_format
+    if profile or trace_file or cprofile:
+        trace.enable(summary=profile,
+                     trace_file=str(trace_file) if trace_file else None,
+                     profile_file=str(cprofile) if cprofile else None)
     if version:
         console.print("TaskTree v0.3.0")
         raise typer.Exit()
@@ -0,0 +1,320 @@
+"""守护进程模式
+
+`tasktree serve` 在内存中保持已加载的 TaskTree（按任务名称缓存），
+通过本地 Unix 域套接字提供 add/edit/delete/show/list/batch 命令，
+并在后台定期把修改过的任务树写回 Storage 文件。
+
+协议：每个请求和响应都是一行 JSON（UTF-8，以换行结尾），同一连接上可以
+发送多个请求。
+
+    请求: {"cmd": "add", "task": "我的项目", "args": {"parent_path": "root", "name": "设计"}}
+    成功: {"ok": true, "result": ...}
+    失败: {"ok": false, "error": "TaskNotFoundError", "message": "..."}
+
+套接字默认位于数据目录下的 tasktree.sock，可用 TASKTREE_SOCKET 环境变量修改；
+设置 TASKTREE_NO_DAEMON=1 时 CLI 总是直接读写文件。
+"""
+
+import os
+import json
+import signal
+import socket
+import socketserver
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional, Dict
+
+from . import trace
+from .exceptions import (
+    TaskTreeError, TaskNotFoundError, InvalidPathError, RootDeletionError,
+    StorageError, TreeNotInitializedError, BatchOperationError, DaemonError,
+    MergeConflictError
+)
+
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# 可以跨进程还原的异常类型
+_ERROR_TYPES = {
+    cls.__name__: cls
+    for cls in (
+        TaskTreeError, TaskNotFoundError, InvalidPathError, RootDeletionError,
+        StorageError, TreeNotInitializedError, DaemonError,
+        ValueError, FileExistsError,
+    )
+}
+
+
+def get_socket_path() -> Path:
+    """获取守护进程套接字路径"""
+    env_path = os.getenv("TASKTREE_SOCKET")
+    if env_path:
+        return Path(env_path)
+
+    from .storage import get_data_dir
+    return get_data_dir() / "tasktree.sock"
+
+
+def _encode(message: dict) -> bytes:
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n"
+
+
+class DaemonClient:
+    """守护进程客户端"""
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self._file = sock.makefile('rwb')
+
+    def request(self, command: str, task_name: Optional[str] = None, **kwargs):
+        """
+        发送请求并等待结果
+
+        Raises:
+            守护进程端抛出的异常（按类型还原）
+        """
+        self._file.write(_encode({"cmd": command, "task": task_name, "args": kwargs}))
+        self._file.flush()
+
+        line = self._file.readline()
+        if not line:
+            raise DaemonError("守护进程连接已断开")
+
+        response = json.loads(line)
+        if response.get("ok"):
+            return response.get("result")
+        raise _error_from_response(response)
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def connect(socket_path: Optional[Path] = None) -> Optional[DaemonClient]:
+    """
+    连接守护进程
+
+    Returns:
+        Optional[DaemonClient]: 守护进程未运行时返回 None
+    """
+    if os.getenv("TASKTREE_NO_DAEMON") or not hasattr(socket, "AF_UNIX"):
+        return None
+
+    path = socket_path or get_socket_path()
+    if not path.exists():
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except OSError:
+        # 残留的套接字文件，守护进程已退出
+        sock.close()
+        return None
+    return DaemonClient(sock)
+
+
+def _error_response(e: Exception) -> dict:
+    response = {"ok": False, "error": type(e).__name__, "message": str(e)}
+    if isinstance(e, BatchOperationError):
+        response["data"] = {
+            "index": e.index, "op": e.op,
+            "cause": str(e.cause), "results": e.results,
+        }
+    return response
+
+
+def _error_from_response(response: dict) -> Exception:
+    error, message = response.get("error"), response.get("message", "")
+    if error == "BatchOperationError":
+        data = response["data"]
+        return BatchOperationError(data["index"], data["op"],
+                                   TaskTreeError(data["cause"]), data["results"])
+    cls = _ERROR_TYPES.get(error, DaemonError)
+    return cls(message)
+
+
+class _TreeEntry:
+    """守护进程中缓存的一棵任务树"""
+
+    def __init__(self, storage, tree):
+        self.storage = storage
+        self.tree = tree
+        self.dirty = False
+        self.lock = threading.Lock()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """处理单个客户端连接上的全部请求"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                request = {}
+                response = _error_response(DaemonError(f"无效的请求: {e}"))
+            else:
+                response = self.server.daemon.handle(request)
+            self.wfile.write(_encode(response))
+            self.wfile.flush()
+
+            if response.get("ok") and request.get("cmd") == "shutdown":
+                # 响应发出后再停止，shutdown() 需在 serve_forever 之外的线程调用
+                threading.Thread(target=self.server.daemon.shutdown).start()
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TaskTreeDaemon:
+    """任务树守护进程"""
+
+    def __init__(self, socket_path: Optional[Path] = None,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.socket_path = socket_path or get_socket_path()
+        self.flush_interval = flush_interval
+        self._entries: Dict[str, _TreeEntry] = {}
+        self._entries_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._server: Optional[_UnixServer] = None
+
+    def _get_entry(self, task_name: str) -> _TreeEntry:
+        """获取缓存的任务树，文件被外部修改且内存中无未保存修改时重新加载"""
+        from .storage import open_storage
+        from .service import load_task_tree
+
+        with self._entries_lock:
+            entry = self._entries.get(task_name)
+            if entry is not None:
+                with entry.lock:
+                    # 有未保存修改时保存时再合并（见 _save_entry）
+                    if entry.dirty or entry.storage.version() == entry.storage.loaded_version:
+                        return entry
+                del self._entries[task_name]
+
+            storage = open_storage(task_name)
+            tree = load_task_tree(storage)
+            tree.build_indexes()
+            entry = _TreeEntry(storage, tree)
+            self._entries[task_name] = entry
+            return entry
+
+    def handle(self, request: dict) -> dict:
+        """处理一个请求，返回响应"""
+        from .service import COMMANDS
+
+        command = request.get("cmd")
+        try:
+            if command == "ping":
+                return {"ok": True, "result": {"pid": os.getpid()}}
+            if command == "flush":
+                return {"ok": True, "result": self.flush()}
+            if command == "shutdown":
+                return {"ok": True, "result": None}
+            if command not in COMMANDS:
+                raise DaemonError(f"未知命令: {command!r}")
+
+            func, mutating = COMMANDS[command]
+            entry = self._get_entry(request.get("task"))
+            with entry.lock, trace.span(f"tree.{command}"):
+                result = func(entry.tree, **(request.get("args") or {}))
+                if isinstance(result, Iterator):
+                    # 流式结果在锁内取完，避免与后续修改交错
+                    result = list(result)
+                if mutating and entry.tree.dirty:
+                    entry.dirty = True
+            return {"ok": True, "result": result}
+        except Exception as e:
+            return _error_response(e)
+        finally:
+            # 常驻进程不会退出，每个请求后写出跟踪记录
+            trace.flush()
+
+    def flush(self) -> int:
+        """把所有有未保存修改的任务树写回文件，返回写入的数量（失败在守护进程的输出中报告）"""
+        from .cli import console
+
+        with self._entries_lock:
+            entries = list(self._entries.values())
+
+        flushed = 0
+        for entry in entries:
+            with entry.lock:
+                if not entry.dirty:
+                    continue
+                try:
+                    self._save_entry(entry)
+                except MergeConflictError as e:
+                    # 内存中的修改已放弃，之后使用重新加载的任务树
+                    entry.tree = e.tree
+                    entry.dirty = False
+                    console.print(f"[yellow]警告: {e}[/yellow]")
+                    continue
+                except Exception as e:
+                    console.print(f"[red]错误: 保存 '{entry.storage._task_name}' 失败: {e}[/red]")
+                    continue
+                entry.dirty = False
+                flushed += 1
+        return flushed
+
+    def _save_entry(self, entry: _TreeEntry) -> None:
+        """保存任务树（调用方持有 entry.lock，合并规则见 service.save_merged）"""
+        from .service import save_merged
+
+        entry.tree = save_merged(entry.storage, entry.tree)
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def serve_forever(self) -> None:
+        """
+        启动守护进程并阻塞直到关闭
+
+        Raises:
+            DaemonError: 已有守护进程在运行或当前平台不支持
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            raise DaemonError("当前平台不支持 Unix 域套接字")
+
+        client = connect(self.socket_path)
+        if client is not None:
+            client.close()
+            raise DaemonError(f"守护进程已在运行: {self.socket_path}")
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._server = _UnixServer(str(self.socket_path), _RequestHandler)
+        self._server.daemon = self
+        os.chmod(self.socket_path, 0o600)
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=self.shutdown).start())
+
+        flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        flusher.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._stopped.set()
+            self._server.server_close()
+            self.flush()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+    def shutdown(self) -> None:
+        """停止守护进程（未保存的修改会在退出前写回）"""
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
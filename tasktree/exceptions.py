@@ -27,4 +27,37 @@ class RootDeletionError(TaskTreeError):
 class StorageError(TaskTreeError):
     """存储异常"""
     def __init__(self, message: str = "存储错误"):
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+
+class BatchOperationError(TaskTreeError):
+    """批量操作异常（失败时已回滚全部操作）"""
+    def __init__(self, index: int, op: object, cause: Exception, results: list = None):
+        self.index = index
+        self.op = op
+        self.cause = cause
+        self.results = results or []
+        super().__init__(f"第 {index} 个操作失败: {cause}")
+
+
+class TreeNotInitializedError(TaskTreeError):
+    """任务树未初始化异常"""
+    def __init__(self, message: str = "任务树未初始化"):
+        super().__init__(message)
+
+
+class DaemonError(TaskTreeError):
+    """守护进程异常"""
+    def __init__(self, message: str = "守护进程错误"):
+        super().__init__(message)
+
+
+class MergeConflictError(TaskTreeError):
+    """保存常驻内存的任务树时无法合并其他进程的修改（已放弃内存中的修改）"""
+    def __init__(self, task_name: str, dropped: int, cause: Exception, tree: object = None):
+        self.task_name = task_name
+        self.dropped = dropped
+        self.cause = cause
+        # 重新加载的任务树，调用方之后应继续使用它
+        self.tree = tree
+        super().__init__(f"'{task_name}' 已被其他进程修改，放弃 {dropped} 个未保存的修改: {cause}")
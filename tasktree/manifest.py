@@ -0,0 +1,192 @@
+"""数据目录清单
+
+list-tasks 需要每个任务的名称和统计信息。逐个完整读取任务文件的代价
+与数据量成正比，任务多、任务树大时非常慢。清单文件（数据目录下的
+tasktree.manifest）缓存每个任务文件的摘要：
+
+    {
+      "version": 1,
+      "entries": {
+        "<文件名>": {
+          "name": 任务名称,
+          "fingerprint": 文件的 [mtime_ns, size] 列表,
+          "modified": 最后修改时间,
+          "size": 文件大小,
+          "nodes": 节点总数,
+          "status_counts": {状态: 节点数}
+        }
+      }
+    }
+
+存储后端保存/删除任务时更新对应条目；列出任务时只对每个文件执行 stat，
+指纹一致的条目直接使用，不一致或缺失的条目才重新读取文件。清单只是
+缓存，写入冲突或损坏时最多导致一次重新读取，不影响任务数据本身。
+"""
+
+import os
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .models import TaskStatus
+from .traversal import iter_preorder
+
+
+MANIFEST_FILENAME = "tasktree.manifest"
+MANIFEST_VERSION = 1
+
+
+def file_stamps(*paths: Path) -> list:
+    """文件的 [mtime_ns, size] 列表（文件不存在时为 None）"""
+    stamps = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            stamps.append([stat.st_mtime_ns, stat.st_size])
+        except FileNotFoundError:
+            stamps.append(None)
+    return stamps
+
+
+def count_statuses(statuses: Iterable[str]) -> dict:
+    """统计节点总数和各状态的节点数"""
+    counts = {status.value: 0 for status in TaskStatus}
+    nodes = 0
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+        nodes += 1
+    return {"nodes": nodes, "status_counts": counts}
+
+
+def summarize_task(root) -> dict:
+    """任务树的统计信息（节点总数和各状态的节点数）"""
+    return count_statuses(visit.task.status.value for visit in iter_preorder(root))
+
+
+class Manifest:
+    """数据目录清单"""
+
+    def __init__(self, data_dir: Path):
+        self._data_dir = data_dir
+
+    @property
+    def path(self) -> Path:
+        """清单文件路径"""
+        return self._data_dir / MANIFEST_FILENAME
+
+    def _read(self) -> Dict[str, dict]:
+        """读取清单条目（文件不存在或损坏时返回空清单）"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return {}
+        entries = data.get("entries")
+        return entries if isinstance(entries, dict) else {}
+
+    def _write(self, entries: Dict[str, dict]) -> None:
+        """写入清单（先写临时文件再替换，读者不会看到写了一半的清单）"""
+        self._data_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{MANIFEST_FILENAME}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": MANIFEST_VERSION, "entries": entries},
+                          f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # 清单只是缓存，写入失败时下次列出任务会重新读取文件
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    def put(self, filename: str, name: str, fingerprint: list, summary: dict) -> None:
+        """
+        更新一个任务文件的条目
+
+        Args:
+            filename: 任务文件名
+            name: 任务名称
+            fingerprint: 文件指纹（见 file_stamps），第一项为任务文件本身
+            summary: 统计信息（见 count_statuses）
+        """
+        entries = self._read()
+        entries[filename] = _make_entry(name, fingerprint, summary)
+        self._write(entries)
+
+    def discard(self, filename: str) -> None:
+        """删除一个任务文件的条目"""
+        entries = self._read()
+        if entries.pop(filename, None) is not None:
+            self._write(entries)
+
+    def list_entries(self, suffix: str, fingerprint: Callable[[Path], list],
+                     read_summary: Callable[[Path], Optional[tuple]]) -> List[dict]:
+        """
+        列出数据目录中指定扩展名的任务文件的条目
+
+        只对每个文件计算指纹，与清单一致的条目直接使用，其余文件重新读取。
+
+        Args:
+            suffix: 任务文件扩展名（如 ".json"）
+            fingerprint: 计算文件指纹的函数
+            read_summary: 读取文件的函数，返回 (任务名称, 统计信息)，
+                文件无效时返回 None
+
+        Returns:
+            List[dict]: 条目列表（去掉 fingerprint，附加 filename 和 path 字段）
+        """
+        entries = self._read()
+        changed = False
+        result = []
+        seen = set()
+
+        for file_path in self._data_dir.glob(f"*{suffix}"):
+            filename = file_path.name
+            seen.add(filename)
+            stamps = fingerprint(file_path)
+            entry = entries.get(filename)
+            if entry is None or entry.get("fingerprint") != stamps:
+                summary = read_summary(file_path)
+                if summary is None:
+                    # 跳过无效的任务文件
+                    if entries.pop(filename, None) is not None:
+                        changed = True
+                    continue
+                entry = _make_entry(summary[0], stamps, summary[1])
+                entries[filename] = entry
+                changed = True
+            info = {key: value for key, value in entry.items() if key != "fingerprint"}
+            info.update(filename=filename, path=str(file_path))
+            result.append(info)
+
+        # 清理已被删除的文件的条目
+        for filename in [name for name in entries if name.endswith(suffix) and name not in seen]:
+            del entries[filename]
+            changed = True
+
+        if changed:
+            self._write(entries)
+        return result
+
+    def clear(self) -> None:
+        """删除清单文件"""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _make_entry(name: str, fingerprint: list, summary: dict) -> dict:
+    stamps = [stamp for stamp in fingerprint if stamp is not None] or [[0, 0]]
+    return {
+        "name": name,
+        "fingerprint": fingerprint,
+        # 日志等附属文件的修改也算作任务的修改
+        "modified": max(stamp[0] for stamp in stamps) / 1e9,
+        "size": stamps[0][1],
+        "nodes": summary["nodes"],
+        "status_counts": summary["status_counts"],
+    }
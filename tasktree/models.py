@@ -1,8 +1,55 @@
-"""任务数据模型定义"""
+"""任务数据模型定义
 
+Task 是带 __slots__ 的普通 Python 对象（百万节点的任务树中省去每个节点的
+实例字典），构建时只做必要的检查。导入 pydantic 的开销
+占 CLI 启动时间的一半左右，因此只有校验外部数据（Task.from_dict 的
+validate=True）时才加载基于 pydantic 的 validation 模块。
+
+分片存储中子树保存在单独文件里的节点，children 是 LazyChildren：第一次
+访问时才读取分片文件（见 shards 模块）。
+
+每个任务有一个稳定的 ID（10 位小写 base32），创建时随机生成并写入数据文件，
+重命名和移动都不会改变它。旧数据文件中没有 ID 的节点在加载时由父节点 ID、
+位置和名称派生，同一个文件每次加载得到相同的 ID，下次保存时写入文件。
+
+外置存储的描述（见 blobs 模块）在加载时是 BlobRef，第一次读取
+Task.description 时才读取文件。
+"""
+
+import os
+import re
+import hashlib
 from enum import Enum
-from typing import Optional, List
-from pydantic import BaseModel, Field, validator
+from typing import Optional, List, Callable
+
+from .traversal import iter_preorder, iter_postorder
+from . import trace
+
+
+# Crockford base32（去掉易混淆的 i、l、o、u）
+_ID_ALPHABET = "0123456789abcdefghjkmnpqrstvwxyz"
+ID_LENGTH = 10
+# 外部导入的数据可以带有其他格式的 ID
+ID_PATTERN = re.compile(r"[0-9A-Za-z_-]{1,64}")
+
+
+def _encode_id(value: int) -> str:
+    chars = []
+    for _ in range(ID_LENGTH):
+        chars.append(_ID_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(chars)
+
+
+def new_task_id() -> str:
+    """生成随机的任务 ID"""
+    return _encode_id(int.from_bytes(os.urandom(7), "big"))
+
+
+def derived_task_id(parent_id: str, position: int, name: str) -> str:
+    """由父节点 ID、在父节点中的位置和名称派生的 ID（用于没有 ID 的旧数据）"""
+    digest = hashlib.blake2b(f"{parent_id}/{position}/{name}".encode('utf-8'), digest_size=7)
+    return _encode_id(int.from_bytes(digest.digest(), "big"))
 
 
 class TaskStatus(str, Enum):
@@ -13,41 +60,266 @@ class TaskStatus(str, Enum):
     FAILED = "failed"
 
 
-class Task(BaseModel):
+class Task:
     """任务节点模型"""
-    name: str = Field(..., description="任务名称")
-    description: str = Field("", description="任务描述")
-    status: TaskStatus = Field(TaskStatus.TODO, description="任务状态")
-    progress: Optional[int] = Field(None, description="完成进度 (0-100)")
-    children: List["Task"] = Field(default_factory=list, description="子任务列表")
-    
-    @validator('progress')
-    def validate_progress(cls, v):
-        if v is not None:
-            if not 0 <= v <= 100:
-                raise ValueError('进度必须在 0-100 之间')
-        return v
+    
+    # 实例字典约占每个节点 250 字节（见 benchmarks/bench_memory.py）
+    __slots__ = ("id", "name", "_description", "status", "progress", "children")
+    
+    def __init__(self, name: str, description: str = "",
+                 status: TaskStatus = TaskStatus.TODO, progress: Optional[int] = None,
+                 children: Optional[List["Task"]] = None, id: Optional[str] = None):
+        """
+        Args:
+            name: 任务名称
+            description: 任务描述
+            status: 任务状态
+            progress: 完成进度 (0-100)
+            children: 子任务列表
+            id: 任务 ID，None 时随机生成
+            
+        Raises:
+            ValueError: 状态无效、进度超出范围或 ID 格式无效
+        """
+        if progress is not None and not 0 <= progress <= 100:
+            raise ValueError('进度必须在 0-100 之间')
+        if id is None:
+            id = new_task_id()
+        elif not isinstance(id, str) or not ID_PATTERN.fullmatch(id):
+            raise ValueError(f"无效的任务 ID: {id!r}")
+        self.id = id
+        self.name = name
+        self.description = description
+        self.status = TaskStatus(status)
+        self.progress = progress
+        self.children = children if children is not None else []
+    
+    @property
+    def description(self) -> str:
+        """任务描述（外置的描述在第一次读取时加载）"""
+        value = self._description
+        if type(value) is not str:
+            value = self._description = value.load()
+        return value
+    
+    @description.setter
+    def description(self, value) -> None:
+        self._description = value
+    
+    def __repr__(self) -> str:
+        return (f"Task(name={self.name!r}, status={self.status.value!r}, "
+                f"progress={self.progress!r}, children={len(self.children)})")
     
     def to_dict(self):
         """转换为字典格式"""
-        return {
-            "name": self.name,
-            "description": self.description,
-            "status": self.status.value,
-            "progress": self.progress,
-            "children": [child.to_dict() for child in self.children]
-        }
+        with trace.span("task.to_dict") as span:
+            data = self._to_dict()
+            if span.active:
+                span.set(nodes=_count_nodes(self))
+        return data
+    
+    def _to_dict(self) -> dict:
+        # 先序遍历时，深度 d-1 上最近一个节点就是当前节点的父节点
+        dicts_by_depth = []
+        for task, _, depth, _, _ in iter_preorder(self):
+            data = {
+                "id": task.id,
+                "name": task.name,
+                "description": task.description,
+                "status": task.status.value,
+                "progress": task.progress,
+                "children": []
+            }
+            del dicts_by_depth[depth:]
+            if depth:
+                dicts_by_depth[-1]["children"].append(data)
+            dicts_by_depth.append(data)
+        return dicts_by_depth[0]
+    
+    def copy(self, id: Optional[str] = None) -> "Task":
+        """
+        复制整个子树（不经检查，直接复制已有节点的字段）
+        
+        Args:
+            id: 副本根节点的 ID，None 时随机生成。其余节点的 ID 由副本中的
+                父节点 ID、位置和名称派生，同一个 id 总是得到相同的副本
+        
+        Returns:
+            Task: 副本的根节点
+        """
+        with trace.span("task.copy") as span:
+            copies_by_depth = []
+            for task, _, depth, index, _ in iter_preorder(self):
+                del copies_by_depth[depth:]
+                if depth:
+                    parent = copies_by_depth[-1]
+                    task_id = derived_task_id(parent.id, index, task.name)
+                else:
+                    task_id = id if id is not None else new_task_id()
+                copy = object.__new__(Task)
+                copy.id = task_id
+                copy.name = task.name
+                copy._description = task._description
+                copy.status = task.status
+                copy.progress = task.progress
+                copy.children = []
+                if depth:
+                    parent.children.append(copy)
+                copies_by_depth.append(copy)
+            if span.active:
+                span.set(nodes=_count_nodes(copies_by_depth[0]))
+        return copies_by_depth[0]
+    
+    @classmethod
+    def from_dict(cls, data: dict, validate: bool = True,
+                  on_node: Optional[Callable[["Task", dict], None]] = None,
+                  root_id: Optional[str] = None) -> "Task":
+        """
+        从字典创建任务
+        
+        Args:
+            data: 任务数据
+            validate: 是否校验字段。对可信数据（如 Storage 自己写入且校验和
+                未变的文件）可以跳过校验，直接构建模型
+            on_node: 每构建一个节点调用一次 on_node(节点, 原始字典)，
+                按后序调用（子节点先于父节点）
+            root_id: 根节点没有 ID 时使用的 ID（分片文件的根节点即上层文件中的
+                分片节点），其余没有 ID 的节点由父节点派生
+        """
+        with trace.span("task.from_dict", validated=validate) as span:
+            task = cls._from_dict(data, validate, on_node, root_id)
+            if span.active:
+                span.set(nodes=_count_nodes(task))
+        return task
     
     @classmethod
-    def from_dict(cls, data: dict) -> "Task":
-        """从字典创建任务"""
-        children_data = data.get("children", [])
-        children = [cls.from_dict(child) for child in children_data]
+    def _from_dict(cls, data: dict, validate: bool,
+                   on_node: Optional[Callable[["Task", dict], None]],
+                   root_id: Optional[str]) -> "Task":
+        if validate:
+            from .validation import validate_node
         
-        return cls(
-            name=data["name"],
-            description=data.get("description", ""),
-            status=TaskStatus(data.get("status", "todo")),
-            progress=data.get("progress"),
-            children=children
-        )
\ No newline at end of file
+        # 后序遍历：构建节点时其子节点已全部构建完毕，暂存在 pending[depth + 1]
+        pending = {}
+        task = None
+        missing_ids = False
+        for node, _, depth, _, _ in iter_postorder(data, _dict_children):
+            children = pending.pop(depth + 1, [])
+            
+            fields = validate_node(node) if validate else node
+            task = cls._construct_trusted(fields, children)
+            if task.id is None:
+                missing_ids = True
+            if on_node is not None:
+                on_node(task, node)
+            pending.setdefault(depth, []).append(task)
+        if missing_ids:
+            _assign_missing_ids(task, root_id)
+        return task
+    
+    @classmethod
+    def _construct_trusted(cls, data: dict, children: List["Task"]) -> "Task":
+        """
+        不经检查直接构建任务
+        
+        跳过 __init__，直接填充各个字段
+        """
+        status = data.get("status", "todo")
+        task = object.__new__(cls)
+        task.id = data.get("id")
+        task.name = data["name"]
+        task._description = data.get("description", "")
+        task.status = _STATUS_BY_VALUE.get(status) or TaskStatus(status)
+        task.progress = data.get("progress")
+        task.children = children
+        return task
+
+
+class LazyChildren(list):
+    """
+    按需加载的子任务列表
+
+    创建时为空，第一次读写（len、迭代、下标、append 等）时调用
+    source.read_children(owner, info) 取得子任务，再调用 source.children_loaded(owner)
+    通知监听者（如 TaskTree 补齐新节点的汇总）。对调用方而言与普通列表没有区别。
+
+    Attributes:
+        owner: 这个列表所属的任务
+        info: 分片记录（文件名、校验和、子树汇总等，见 shards 模块）
+    """
+
+    __slots__ = ("owner", "info", "_source")
+
+    def __init__(self, owner: "Task", info: dict, source=None):
+        """
+        Args:
+            owner: 所属任务
+            info: 分片记录
+            source: 读取子任务的对象，None 表示已经加载
+        """
+        super().__init__()
+        self.owner = owner
+        self.info = info
+        self._source = source
+
+    @property
+    def loaded(self) -> bool:
+        """子任务是否已经加载"""
+        return self._source is None
+
+    def load(self) -> None:
+        """加载子任务（已加载时什么也不做）"""
+        source = self._source
+        if source is None:
+            return
+        list.extend(self, source.read_children(self.owner, self.info))
+        self._source = None
+        source.children_loaded(self.owner)
+
+
+def _loading(method):
+    def wrapper(self, *args, **kwargs):
+        if self._source is not None:
+            self.load()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in ("__len__", "__iter__", "__reversed__", "__getitem__", "__setitem__",
+              "__delitem__", "__contains__", "__eq__", "__ne__", "__lt__", "__le__",
+              "__gt__", "__ge__", "__add__", "__iadd__", "__mul__", "__imul__", "__repr__",
+              "append", "extend", "insert", "pop", "remove", "index", "count",
+              "sort", "reverse", "clear", "copy"):
+    setattr(LazyChildren, _name, _loading(getattr(list, _name)))
+del _name
+
+
+def loaded_children(task: Task) -> List[Task]:
+    """已加载的子任务（尚未加载的 LazyChildren 视为没有子任务，不触发加载）"""
+    children = task.children
+    if type(children) is LazyChildren and not children.loaded:
+        return ()
+    return children
+
+
+def _assign_missing_ids(root: Task, root_id: Optional[str]) -> None:
+    """为没有 ID 的节点派生 ID（先序，父节点的 ID 先确定）"""
+    if root.id is None:
+        root.id = root_id or derived_task_id("", 0, root.name)
+    for task, parent, _, index, _ in iter_preorder(root, loaded_children):
+        if task.id is None:
+            task.id = derived_task_id(parent.id, index, task.name)
+
+
+def _count_nodes(root: Task) -> int:
+    # 只统计已加载的节点，跟踪统计不应触发分片加载
+    return sum(1 for _ in iter_preorder(root, loaded_children))
+
+
+def _dict_children(data: dict) -> list:
+    return data.get("children") or []
+
+
+_STATUS_BY_VALUE = {status.value: status for status in TaskStatus}
@@ -0,0 +1,97 @@
+"""任务查询
+
+Query 描述一组查询条件（条件之间为“且”的关系），构造时编译为检查函数列表，
+遍历时对每个节点依次求值，只需一次遍历。TaskTree.query 在按状态过滤时
+借助子树汇总中的各状态节点数跳过不含匹配节点的子树。
+"""
+
+import re
+from typing import Callable, Iterable, List, Optional
+
+from .models import TaskStatus
+
+
+class Query:
+    """任务查询条件"""
+
+    def __init__(self, statuses: Optional[Iterable[str]] = None,
+                 min_progress: Optional[int] = None, max_progress: Optional[int] = None,
+                 name: Optional[str] = None, description: Optional[str] = None,
+                 pattern: Optional[str] = None,
+                 min_depth: Optional[int] = None, max_depth: Optional[int] = None):
+        """
+        Args:
+            statuses: 状态（满足其一即可）
+            min_progress: 最小进度（包含），未设置进度的任务不匹配
+            max_progress: 最大进度（包含），未设置进度的任务不匹配
+            name: 名称包含的子串（不区分大小写）
+            description: 描述包含的子串（不区分大小写）
+            pattern: 正则表达式，名称或描述中能搜索到即匹配
+            min_depth: 最小深度（起始节点为 0）
+            max_depth: 最大深度
+
+        Raises:
+            ValueError: 状态无效或正则表达式无效
+        """
+        self.statuses = (frozenset(TaskStatus(status) for status in statuses)
+                         if statuses else None)
+        self.min_progress = min_progress
+        self.max_progress = max_progress
+        self.name = name
+        self.description = description
+        self.pattern = pattern
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self._checks = self._compile()
+        # 只有按描述匹配时才需要读取描述（外置的描述读取时才加载）
+        self.uses_description = bool(description or pattern)
+
+    def _compile(self) -> List[Callable[[str, str, str, Optional[int], int], bool]]:
+        """把条件编译为检查函数列表，参数为 (名称, 描述, 状态值, 进度, 深度)"""
+        checks = []
+
+        if self.statuses is not None:
+            values = frozenset(status.value for status in self.statuses)
+            checks.append(lambda name, desc, status, progress, depth: status in values)
+
+        if self.min_depth is not None:
+            min_depth = self.min_depth
+            checks.append(lambda name, desc, status, progress, depth: depth >= min_depth)
+
+        if self.max_depth is not None:
+            max_depth = self.max_depth
+            checks.append(lambda name, desc, status, progress, depth: depth <= max_depth)
+
+        if self.min_progress is not None or self.max_progress is not None:
+            low = self.min_progress if self.min_progress is not None else 0
+            high = self.max_progress if self.max_progress is not None else 100
+            checks.append(lambda name, desc, status, progress, depth:
+                          progress is not None and low <= progress <= high)
+
+        if self.name:
+            name_part = self.name.casefold()
+            checks.append(lambda name, desc, status, progress, depth:
+                          name_part in name.casefold())
+
+        if self.description:
+            desc_part = self.description.casefold()
+            checks.append(lambda name, desc, status, progress, depth:
+                          desc_part in desc.casefold())
+
+        if self.pattern:
+            try:
+                search = re.compile(self.pattern).search
+            except re.error as e:
+                raise ValueError(f"无效的正则表达式 '{self.pattern}': {e}")
+            checks.append(lambda name, desc, status, progress, depth:
+                          search(name) is not None or search(desc) is not None)
+
+        return checks
+
+    def matches(self, name: str, description: str, status: str,
+                progress: Optional[int], depth: int) -> bool:
+        """节点是否满足全部条件（status 为状态值字符串）"""
+        for check in self._checks:
+            if not check(name, description, status, progress, depth):
+                return False
+        return True
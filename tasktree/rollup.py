@@ -0,0 +1,209 @@
+"""子树汇总统计
+
+TaskTree 为每个节点缓存其子树（包含节点自身）的汇总：
+
+    nodes:         节点数
+    counts:        各状态的节点数（按 TaskStatus 定义顺序）
+    leaves:        叶子节点数
+    progress_sum:  叶子节点进度之和
+
+汇总进度是叶子进度的平均值（每个叶子权重相同），叶子的进度取其 progress，
+未设置时 done 计为 100，其余计为 0。
+
+每个汇总持有父节点汇总的引用，增删改节点时只需把差值沿祖先链向上累加，
+代价与深度成正比。
+
+尚未加载的分片子树（LazyChildren）直接使用分片记录中保存的汇总，计算汇总
+不会触发分片加载。
+"""
+
+from typing import Dict, List, Optional
+
+from .models import Task, TaskStatus, LazyChildren, loaded_children
+from .traversal import iter_postorder, iter_preorder
+
+
+_STATUS_ORDER = tuple(TaskStatus)
+_STATUS_INDEX = {status: index for index, status in enumerate(_STATUS_ORDER)}
+
+
+def leaf_progress(status: TaskStatus, progress: Optional[int]) -> int:
+    """叶子节点计入汇总的进度"""
+    if progress is not None:
+        return progress
+    return 100 if status == TaskStatus.DONE else 0
+
+
+class Rollup:
+    """一个节点的子树汇总"""
+
+    __slots__ = ("up", "nodes", "counts", "leaves", "progress_sum")
+
+    def __init__(self, up: Optional["Rollup"], nodes: int, counts: List[int],
+                 leaves: int, progress_sum: int):
+        self.up = up
+        self.nodes = nodes
+        self.counts = counts
+        self.leaves = leaves
+        self.progress_sum = progress_sum
+
+    @classmethod
+    def zero(cls) -> "Rollup":
+        """全零的差值"""
+        return cls(None, 0, [0] * len(_STATUS_ORDER), 0, 0)
+
+    @classmethod
+    def of_status(cls, status: str, nodes: int, leaves: int, progress_sum: int) -> "Rollup":
+        """同一状态的一组节点的汇总"""
+        rollup = cls.zero()
+        rollup.counts[_STATUS_INDEX[TaskStatus(status)]] = nodes
+        rollup.nodes = nodes
+        rollup.leaves = leaves
+        rollup.progress_sum = progress_sum
+        return rollup
+
+    @classmethod
+    def change(cls, old_status: TaskStatus, old_progress: Optional[int],
+               new_status: TaskStatus, new_progress: Optional[int], is_leaf: bool) -> "Rollup":
+        """节点状态或进度改变产生的差值"""
+        delta = cls.zero()
+        delta.counts[_STATUS_INDEX[TaskStatus(old_status)]] -= 1
+        delta.counts[_STATUS_INDEX[TaskStatus(new_status)]] += 1
+        if is_leaf:
+            delta.progress_sum = (leaf_progress(new_status, new_progress)
+                                  - leaf_progress(old_status, old_progress))
+        return delta
+
+    @classmethod
+    def own(cls, task: Task) -> "Rollup":
+        """只包含节点自身的汇总（子节点的汇总由调用方累加）"""
+        counts = [0] * len(_STATUS_ORDER)
+        counts[_STATUS_INDEX[task.status]] = 1
+        if task.children:
+            return cls(None, 1, counts, 0, 0)
+        return cls(None, 1, counts, 1, leaf_progress(task.status, task.progress))
+
+    def add(self, other: "Rollup", sign: int = 1) -> None:
+        """累加（sign 为 -1 时扣除）另一个汇总"""
+        self.nodes += sign * other.nodes
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            counts[index] += sign * count
+        self.leaves += sign * other.leaves
+        self.progress_sum += sign * other.progress_sum
+
+    def propagate(self, delta: "Rollup", sign: int = 1) -> None:
+        """把差值累加到本节点及所有祖先节点"""
+        rollup = self
+        while rollup is not None:
+            rollup.add(delta, sign)
+            rollup = rollup.up
+
+    def count(self, status: TaskStatus) -> int:
+        """指定状态的节点数"""
+        return self.counts[_STATUS_INDEX[status]]
+
+    @property
+    def done(self) -> int:
+        """已完成的节点数"""
+        return self.count(TaskStatus.DONE)
+
+    @property
+    def progress(self) -> Optional[int]:
+        """汇总进度（0-100）"""
+        if not self.leaves:
+            return None
+        return round(self.progress_sum / self.leaves)
+
+    def summary(self) -> dict:
+        """节点数和各状态的节点数（格式同数据目录清单）"""
+        return {
+            "nodes": self.nodes,
+            "status_counts": {status.value: count
+                              for status, count in zip(_STATUS_ORDER, self.counts)},
+        }
+
+    def to_dict(self) -> dict:
+        """汇总信息（用于 get_task_info）"""
+        summary = self.summary()
+        return {
+            "descendants": self.nodes - 1,
+            "status_counts": summary["status_counts"],
+            "progress": self.progress,
+        }
+
+    def dump(self) -> list:
+        """序列化为列表（持久化到快照文件）"""
+        return [self.nodes, *self.counts, self.leaves, self.progress_sum]
+
+    @classmethod
+    def load(cls, values: list) -> "Rollup":
+        """从 dump 的结果恢复"""
+        count = len(_STATUS_ORDER)
+        if not isinstance(values, list) or len(values) != count + 3:
+            raise ValueError(f"无效的汇总数据: {values!r}")
+        return cls(None, values[0], list(values[1:1 + count]), values[-2], values[-1])
+
+
+def compute_rollups(root: Task, up: Optional[Rollup] = None) -> Dict[int, Rollup]:
+    """
+    计算子树中每个节点的汇总
+
+    Args:
+        root: 子树的根节点
+        up: 子树根节点的父节点汇总
+
+    Returns:
+        Dict[int, Rollup]: id(节点) -> 汇总
+    """
+    rollups: Dict[int, Rollup] = {}
+    for task, _, _, _, _ in iter_postorder(root, loaded_children):
+        children = task.children
+        if type(children) is LazyChildren and not children.loaded:
+            # 未加载的分片：使用分片记录中的子树汇总
+            rollups[id(task)] = Rollup.load(children.info["rollup"])
+            continue
+        rollup = Rollup.own(task)
+        for child in children:
+            child_rollup = rollups[id(child)]
+            child_rollup.up = rollup
+            rollup.add(child_rollup)
+        rollups[id(task)] = rollup
+    rollups[id(root)].up = up
+    return rollups
+
+
+def discard_rollups(rollups: Dict[int, Rollup], root: Task) -> None:
+    """删除子树中所有节点的汇总（不加载未加载的分片）"""
+    for task, _, _, _, _ in iter_preorder(root, loaded_children):
+        rollups.pop(id(task), None)
+
+
+class RollupLoader:
+    """
+    从快照中恢复持久化的汇总
+
+    作为 Task.from_dict 的 on_node 回调使用。任一节点缺少汇总数据时
+    放弃恢复（rollups 为 None），由 TaskTree 按需重新计算。
+    """
+
+    def __init__(self):
+        self._rollups: Optional[Dict[int, Rollup]] = {}
+
+    @property
+    def rollups(self) -> Optional[Dict[int, Rollup]]:
+        """恢复的汇总（不完整时为 None）"""
+        return self._rollups
+
+    def __call__(self, task: Task, data: dict) -> None:
+        if self._rollups is None:
+            return
+        values = data.get("rollup")
+        if values is None:
+            self._rollups = None
+            return
+        rollup = Rollup.load(values)
+        # 后序构建，子节点的汇总已经恢复
+        for child in task.children:
+            self._rollups[id(child)].up = rollup
+        self._rollups[id(task)] = rollup
@@ -0,0 +1,148 @@
+"""跨任务扫描
+
+grep 和 report 命令需要读取数据目录中的每个任务。任务文件彼此独立，
+逐个加载时 CPU 花在解析 JSON 和构建节点上，因此交给进程池并行处理：
+
+- 任务列表来自 Storage.list_tasks（数据目录清单）
+- 每个任务由一个工作进程加载并求值，结果按任务完成的顺序逐批产生，
+  不等待全部任务完成
+- 工作进程数由 --workers 或 TASKTREE_WORKERS 设置，默认为 CPU 数（最多 8）
+- 调用方停止迭代时（如 --limit 已满足）取消尚未开始的任务
+
+扫描读取的是文件中的数据，守护进程或交互式 shell 中尚未写回的修改不可见。
+"""
+
+import os
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from . import trace
+
+
+MAX_DEFAULT_WORKERS = 8
+
+
+def default_workers() -> int:
+    """默认的工作进程数（TASKTREE_WORKERS，未设置时为 CPU 数，最多 8）"""
+    value = os.getenv("TASKTREE_WORKERS")
+    if value:
+        return max(1, int(value))
+    return max(1, min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS))
+
+
+def task_names() -> List[str]:
+    """数据目录中所有任务的名称（按最后修改时间从新到旧）"""
+    from .storage import open_storage
+    return [task["name"] for task in open_storage("temp_for_listing").list_tasks()]
+
+
+def _grep_one(task_name: str, criteria: dict, limit: Optional[int]) -> List[dict]:
+    """在一个任务中查找（在工作进程中执行）"""
+    from .storage import open_storage
+    from . import service
+
+    tree = service.load_task_tree(open_storage(task_name))
+    records = []
+    for record in service.find(tree, limit=limit, **criteria):
+        record["task"] = task_name
+        records.append(record)
+    return records
+
+
+def _report_one(task_name: str) -> List[dict]:
+    """统计一个任务（在工作进程中执行）"""
+    from .storage import open_storage
+    from . import service
+
+    tree = service.load_task_tree(open_storage(task_name))
+    rollup = tree.get_task_info("root")["rollup"]
+    return [{
+        "task": task_name,
+        "nodes": rollup["descendants"] + 1,
+        "status_counts": rollup["status_counts"],
+        "progress": rollup["progress"],
+    }]
+
+
+def _run(func: Callable[..., List[dict]], jobs: List[tuple],
+         workers: int) -> Iterator[Tuple[str, List[dict]]]:
+    """
+    执行 func(*job)，按完成顺序产生 (任务名称, 结果记录)
+
+    某个任务失败时它的结果是一条 {"task": 任务名称, "error": 错误信息} 记录。
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            try:
+                yield job[0], func(*job)
+            except Exception as e:
+                yield job[0], [{"task": job[0], "error": str(e)}]
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(jobs)))
+    try:
+        futures = {pool.submit(func, *job): job[0] for job in jobs}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                yield name, future.result()
+            except Exception as e:
+                yield name, [{"task": name, "error": str(e)}]
+    finally:
+        # 提前停止迭代时不再启动排队中的任务，只等待正在执行的任务结束
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def grep(criteria: dict, names: Optional[List[str]] = None, workers: Optional[int] = None,
+         limit: Optional[int] = None) -> Iterator[List[dict]]:
+    """
+    在多个任务中查找满足条件的节点
+
+    Args:
+        criteria: 查询条件（service.find 的参数，如 statuses、name、pattern）
+        names: 要查找的任务名称，None 表示数据目录中的全部任务
+        workers: 工作进程数，None 时见 default_workers
+        limit: 最多产生的节点数
+
+    Returns:
+        Iterator[List[dict]]: 每个任务一批节点记录（附加 task 字段），按任务完成的顺序
+    """
+    from .query import Query
+
+    # 在启动工作进程之前检查条件（如无效的正则表达式）
+    Query(**criteria)
+    names = task_names() if names is None else names
+    workers = default_workers() if workers is None else workers
+    remaining = limit
+    with trace.span("scan.grep", tasks=len(names), workers=workers) as span:
+        matched = 0
+        for _, records in _run(_grep_one, [(name, criteria, limit) for name in names], workers):
+            if remaining is not None:
+                records = records[:remaining]
+                remaining -= sum(1 for record in records if "error" not in record)
+            matched += len(records)
+            if records:
+                yield records
+            if remaining is not None and remaining <= 0:
+                break
+        span.set(records=matched)
+
+
+def report(names: Optional[List[str]] = None, workers: Optional[int] = None) -> Iterator[dict]:
+    """
+    统计多个任务的各状态节点数和汇总进度
+
+    Args:
+        names: 要统计的任务名称，None 表示数据目录中的全部任务
+        workers: 工作进程数，None 时见 default_workers
+
+    Returns:
+        Iterator[dict]: 每个任务一条记录 {task, nodes, status_counts, progress}，
+            按任务完成的顺序
+    """
+    names = task_names() if names is None else names
+    workers = default_workers() if workers is None else workers
+    with trace.span("scan.report", tasks=len(names), workers=workers):
+        for _, records in _run(_report_one, [(name,) for name in names], workers):
+            yield from records
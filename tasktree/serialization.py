@@ -0,0 +1,394 @@
+"""任务树的 JSON 读写
+
+标准库 json 对嵌套结构的编码和解码都是递归实现的，任务树深度超过
+解释器递归上限（约 1000 层）时会抛出 RecursionError。这里提供不依赖递归的
+编码器和解码器：
+
+- iter_task_json: 直接从 Task 逐块生成 JSON 文本，输出与
+  json.dumps(task.to_dict(), ensure_ascii=False, indent=2) 完全一致
+  （传入 rollups 时每个节点额外带有 "rollup" 字段；传入 shards 时分片节点
+  写成带 "shard" 字段、children 为空的占位记录）
+- iter_compact_json: 不含空白、省略默认值字段的紧凑格式（TASKTREE_FORMAT=compact），
+  文件更小，解析更快
+- loads_deep: 用显式栈解析任意深度的 JSON，作为 json.loads 抛出
+  RecursionError 时的后备方案
+- FragmentCache: 上次加载或保存的 JSON 文本中各个未修改子树的片段，
+  保存时直接拼接，只重新编码修改过的节点所在的路径
+"""
+
+import json
+import re
+from json.decoder import scanstring
+from json.scanner import NUMBER_RE
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .models import Task, TaskStatus
+from .rollup import Rollup
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+_dumps_compact = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+def iter_task_json(root: Task, indent: int = 2,
+                   rollups: Optional[Dict[int, Rollup]] = None,
+                   shards: Optional[Dict[int, dict]] = None,
+                   fragments: Optional["FragmentCache"] = None,
+                   blobs: Optional[Callable[[Task], Optional[str]]] = None) -> Iterator[str]:
+    """
+    把任务树编码为带缩进的 JSON 文本（逐块生成）
+
+    Args:
+        root: 根任务
+        indent: 缩进空格数
+        rollups: 子树汇总（见 TaskTree.rollups），提供时写入每个节点的 "rollup" 字段
+        shards: id(任务) -> 分片记录。根节点以外的这些节点写成占位记录，
+            不展开其子任务（见 shards 模块）
+        fragments: 未修改子树的已编码片段，命中的子树直接输出片段而不再展开
+            （格式须与本次编码一致，见 FragmentCache.usable）
+        blobs: blobs(任务) 返回外置描述的哈希时写成 "description_blob" 字段
+            （见 blobs 模块），返回 None 时照常写出描述
+    """
+    def is_stub(task: Task) -> bool:
+        return shards is not None and id(task) in shards
+
+    if fragments is not None:
+        cached = fragments.fragment(root, 0)
+        if cached is not None:
+            yield cached
+            return
+
+    def open_node(task: Task, depth: int) -> str:
+        # 第 depth 层节点的花括号缩进 2*depth 级，字段再缩进一级
+        pad = " " * (indent * 2 * depth)
+        inner = pad + " " * indent
+        digest = blobs(task) if blobs is not None else None
+        if digest is None:
+            description = f'{inner}"description": {_dumps(task.description)},\n'
+        else:
+            description = f'{inner}"description_blob": "{digest}",\n'
+        head = (
+            "{\n"
+            f'{inner}"id": {_dumps(task.id)},\n'
+            f'{inner}"name": {_dumps(task.name)},\n'
+            + description +
+            f'{inner}"status": {_dumps(task.status.value)},\n'
+            f'{inner}"progress": {_dumps(task.progress)},\n'
+        )
+        if rollups is not None:
+            head += f'{inner}"rollup": {json.dumps(rollups[id(task)].dump())},\n'
+        if depth and is_stub(task):
+            head += f'{inner}"shard": {_dumps(shards[id(task)])},\n'
+            return head + f'{inner}"children": []\n' + pad + "}"
+        head += f'{inner}"children": '
+        if not task.children:
+            return head + "[]\n" + pad + "}"
+        return head + "[\n"
+
+    yield open_node(root, 0)
+    if not root.children:
+        return
+
+    # 栈中元素: [任务, 深度, 下一个待输出的子节点位置]
+    stack = [[root, 0, 0]]
+    while stack:
+        frame = stack[-1]
+        task, depth, next_index = frame
+        if next_index == len(task.children):
+            stack.pop()
+            pad = " " * (indent * 2 * depth)
+            yield "\n" + pad + " " * indent + "]\n" + pad + "}"
+            continue
+
+        frame[2] = next_index + 1
+        child = task.children[next_index]
+        separator = ",\n" if next_index else ""
+        if fragments is not None:
+            cached = fragments.fragment(child, depth + 1)
+            if cached is not None:
+                yield separator + " " * (indent * 2 * (depth + 1)) + cached
+                continue
+        yield separator + " " * (indent * 2 * (depth + 1)) + open_node(child, depth + 1)
+        if not is_stub(child) and child.children:
+            stack.append([child, depth + 1, 0])
+
+
+class FragmentCache:
+    """
+    已编码的任务树文本中未修改子树的片段
+
+    iter_task_json 的输出中，第 d 层节点从 "{" 开始，到单独一行、缩进
+    2*indent*d 的 "}" 结束（字符串中的换行都经过转义，更深的节点缩进更多），
+    因此在文本中用 str.find 就能找到每个子节点的范围，不必解析。
+
+    缓存只记录文本和已确定范围的节点 id(任务) -> (任务, 深度, 起点, 终点)，
+    开始时只有根节点。修改任务树之前由 TaskTree 调用 touch，把从根节点到
+    被修改节点的各级节点标记为已修改：先确定它们各个子节点的范围，再移除
+    它们自己的记录。保存时未修改的子树直接拼接原文本（深度变化时调整缩进），
+    编码代价与修改过的路径成正比，而与整棵树的大小无关。
+
+    Attributes:
+        rollups: 文本中的节点是否带有 "rollup" 字段
+    """
+
+    def __init__(self, text: Optional[str] = None, root: Optional[Task] = None,
+                 rollups: bool = False, indent: int = 2):
+        """
+        Args:
+            text: iter_task_json 输出的完整文本，None 表示没有可用的文本
+            root: 文本对应的根任务
+            rollups: 文本中的节点是否带有 "rollup" 字段
+            indent: 文本的缩进空格数
+        """
+        self.indent = indent
+        self.reset(text, root, rollups)
+
+    def reset(self, text: Optional[str], root: Optional[Task] = None,
+              rollups: bool = False) -> None:
+        """
+        以新写入的文本替换缓存（此后整棵树都视为未修改）
+
+        Args:
+            text: 新文本，None 时清空缓存
+            root: 文本对应的根任务
+            rollups: 文本中的节点是否带有 "rollup" 字段
+        """
+        self._text = text if root is not None else None
+        self.rollups = rollups
+        self._spans: Dict[int, Tuple[Task, int, int, int]] = {}
+        if self._text is not None:
+            self._spans[id(root)] = (root, 0, 0, len(text))
+
+    def usable(self, rollups: bool, indent: int = 2) -> bool:
+        """缓存的文本格式是否与本次编码相同"""
+        return self._text is not None and self.rollups == rollups and self.indent == indent
+
+    def fragment(self, task: Task, depth: int) -> Optional[str]:
+        """未修改的子树编码在第 depth 层时的文本，没有时返回 None"""
+        entry = self._spans.get(id(task))
+        if entry is None or entry[0] is not task:
+            return None
+        _, cached_depth, start, end = entry
+        text = self._text[start:end]
+        if cached_depth != depth:
+            # 移动过的子树：片段中每一行的缩进都随深度变化
+            shift = self.indent * 2 * abs(depth - cached_depth)
+            if depth > cached_depth:
+                text = text.replace("\n", "\n" + " " * shift)
+            else:
+                text = text.replace("\n" + " " * shift, "\n")
+        return text
+
+    def touch(self, lineage: List[Task]) -> None:
+        """
+        把从根节点开始的一串节点标记为已修改（在修改任务树之前调用）
+
+        Args:
+            lineage: 从根任务到被修改任务的各级任务
+        """
+        spans = self._spans
+        for task in lineage:
+            entry = spans.pop(id(task), None)
+            if entry is not None and entry[0] is task:
+                try:
+                    self._split(task, *entry[1:])
+                except ValueError:
+                    # 文本与任务树不一致（不应发生），放弃缓存
+                    self.reset(None)
+                    return
+
+    def _split(self, task: Task, depth: int, start: int, end: int) -> None:
+        """确定 task 的各个子节点在文本中的范围"""
+        children = task.children
+        if not children:
+            return
+        text = self._text
+        unit = self.indent * 2
+        pad = " " * (unit * depth)
+        inner = pad + " " * self.indent
+        child_pad = " " * (unit * (depth + 1))
+        key = "\n" + inner + '"children": [\n' + child_pad + "{"
+        position = text.find(key, start, end)
+        if position < 0:
+            raise ValueError("找不到子任务列表")
+        position += len(key) - 1
+        closing = "\n" + child_pad + "}"
+        # 最后一个子节点到父节点的结尾之间只有 "]" 和 "}" 两行，不必搜索
+        last_end = end - len("\n" + inner + "]\n" + pad + "}")
+        spans = self._spans
+        last = len(children) - 1
+        for index, child in enumerate(children):
+            if text[position] != "{":
+                raise ValueError("子任务的位置不一致")
+            if index == last:
+                child_end = last_end
+            else:
+                child_end = text.find(closing, position, last_end)
+                if child_end < 0:
+                    raise ValueError("找不到子任务的结尾")
+                child_end += len(closing)
+            spans[id(child)] = (child, depth + 1, position, child_end)
+            position = child_end + 2 + len(child_pad)
+        if text[last_end - 1] != "}":
+            raise ValueError("子任务的数量不一致")
+
+
+def iter_compact_json(root: Task, rollups: Optional[Dict[int, Rollup]] = None,
+                      shards: Optional[Dict[int, dict]] = None,
+                      blobs: Optional[Callable[[Task], Optional[str]]] = None) -> Iterator[str]:
+    """
+    把任务树编码为紧凑的 JSON 文本（逐块生成）
+
+    不含空白，省略取默认值的字段（空描述、todo 状态、null 进度、空的子任务列表），
+    Task.from_dict 读取时补上默认值。
+
+    Args:
+        root: 根任务
+        rollups: 子树汇总，提供时写入每个节点的 "rollup" 字段
+        shards: id(任务) -> 分片记录，根节点以外的这些节点写成占位记录
+        blobs: 外置描述的回调（见 iter_task_json）
+    """
+    todo = TaskStatus.TODO
+
+    def is_stub(task: Task) -> bool:
+        return shards is not None and id(task) in shards
+
+    def open_node(task: Task, depth: int) -> str:
+        head = '{"id":' + _dumps(task.id) + ',"name":' + _dumps(task.name)
+        digest = blobs(task) if blobs is not None else None
+        if digest is not None:
+            head += ',"description_blob":"' + digest + '"'
+        elif task.description:
+            head += ',"description":' + _dumps(task.description)
+        if task.status is not todo:
+            head += ',"status":"' + task.status.value + '"'
+        if task.progress is not None:
+            head += ',"progress":' + str(task.progress)
+        if rollups is not None:
+            head += ',"rollup":' + _dumps_compact(rollups[id(task)].dump())
+        if depth and is_stub(task):
+            return head + ',"shard":' + _dumps_compact(shards[id(task)]) + '}'
+        if not task.children:
+            return head + '}'
+        return head + ',"children":['
+
+    yield open_node(root, 0)
+    if not root.children:
+        return
+
+    # 栈中元素: [任务, 下一个待输出的子节点位置]
+    stack = [[root, 0]]
+    while stack:
+        frame = stack[-1]
+        task, next_index = frame
+        if next_index == len(task.children):
+            stack.pop()
+            yield "]}"
+            continue
+
+        frame[1] = next_index + 1
+        child = task.children[next_index]
+        head = open_node(child, len(stack))
+        yield "," + head if next_index else head
+        if not is_stub(child) and child.children:
+            stack.append([child, 0])
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_LITERALS = (("null", None), ("true", True), ("false", False))
+
+
+def loads_deep(text: str):
+    """
+    解析 JSON 文本（不受嵌套深度限制）
+
+    Raises:
+        json.JSONDecodeError: 文本不是合法的 JSON
+    """
+    skip = _WHITESPACE.match
+    # 栈中元素: [容器, 待赋值的键（数组为 None）]
+    stack = []
+    pos = skip(text, 0).end()
+
+    try:
+        while True:
+            # 读取一个值
+            char = text[pos]
+            if char == '{':
+                pos = skip(text, pos + 1).end()
+                if text[pos] == '}':
+                    value, pos = {}, pos + 1
+                else:
+                    key, pos = _read_key(text, pos)
+                    stack.append([{}, key])
+                    continue
+            elif char == '[':
+                pos = skip(text, pos + 1).end()
+                if text[pos] == ']':
+                    value, pos = [], pos + 1
+                else:
+                    stack.append([[], None])
+                    continue
+            elif char == '"':
+                value, pos = scanstring(text, pos + 1)
+            else:
+                value, pos = _read_scalar(text, pos)
+
+            # 把值放入所在容器，并关闭已经结束的容器
+            while True:
+                if not stack:
+                    end = skip(text, pos).end()
+                    if end != len(text):
+                        raise json.JSONDecodeError("Extra data", text, end)
+                    return value
+
+                frame = stack[-1]
+                container = frame[0]
+                if frame[1] is None:
+                    container.append(value)
+                else:
+                    container[frame[1]] = value
+
+                pos = skip(text, pos).end()
+                char = text[pos]
+                if char == ',':
+                    pos = skip(text, pos + 1).end()
+                    if frame[1] is not None:
+                        frame[1], pos = _read_key(text, pos)
+                    break
+                if char == ('}' if frame[1] is not None else ']'):
+                    stack.pop()
+                    value, pos = container, pos + 1
+                    continue
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+    except IndexError:
+        raise json.JSONDecodeError("Unexpected end of data", text, len(text))
+
+
+def _read_key(text: str, pos: int):
+    """读取对象的键和冒号，返回 (键, 值的起始位置)"""
+    if text[pos] != '"':
+        raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, pos)
+    key, pos = scanstring(text, pos + 1)
+    pos = _WHITESPACE.match(text, pos).end()
+    if text[pos] != ':':
+        raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+    return key, _WHITESPACE.match(text, pos + 1).end()
+
+
+def _read_scalar(text: str, pos: int):
+    """读取数字或字面量，返回 (值, 结束位置)"""
+    match = NUMBER_RE.match(text, pos)
+    if match is not None:
+        integer, frac, exp = match.groups()
+        if frac or exp:
+            return float(integer + (frac or '') + (exp or '')), match.end()
+        return int(integer), match.end()
+
+    for literal, value in _LITERALS:
+        if text.startswith(literal, pos):
+            return value, pos + len(literal)
+    raise json.JSONDecodeError("Expecting value", text, pos)
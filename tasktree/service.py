@@ -0,0 +1,226 @@
+"""命令执行层
+
+CLI 和守护进程共用的命令实现。每个命令接收一个任务树（TaskTreeProtocol）和
+JSON 可序列化的参数，返回 JSON 可序列化的结果（或逐项生成结果的迭代器），
+因此同一个命令既可以在本进程内直接读写文件执行，也可以转发给守护进程执行。
+"""
+
+from itertools import islice
+from typing import Optional, Callable, Dict, Iterator, List, Tuple
+
+from .storage import open_storage
+from .tree import TaskTreeProtocol
+from .models import TaskStatus
+from .query import Query
+from .exceptions import TreeNotInitializedError, MergeConflictError
+from . import trace
+
+
+def load_task_tree(storage) -> TaskTreeProtocol:
+    """
+    加载任务树
+
+    Raises:
+        TreeNotInitializedError: 任务树未初始化
+    """
+    task_tree = storage.load_tree()
+    if task_tree is None:
+        raise TreeNotInitializedError(f"任务树 '{storage._task_name}' 未初始化")
+    return task_tree
+
+
+def save_merged(storage, tree: TaskTreeProtocol) -> TaskTreeProtocol:
+    """
+    保存常驻内存的任务树（守护进程、交互式 shell），调用方保证没有并发修改
+
+    文件在加载后被其他进程修改过时，在重新加载的任务树上重放尚未保存的修改
+    （TaskTree.journal）后再保存。无法重放时以磁盘上的数据为准，放弃内存中的修改。
+
+    Returns:
+        TaskTreeProtocol: 之后应继续使用的任务树（重新加载时是新的任务树）
+
+    Raises:
+        MergeConflictError: 无法重放，内存中的修改已放弃，之后应继续使用异常中的任务树
+    """
+    with storage.lock():
+        if storage.version() != storage.loaded_version:
+            fresh = load_task_tree(storage)
+            try:
+                fresh.apply_ops(tree.journal)
+            except Exception as e:
+                fresh.build_indexes()
+                raise MergeConflictError(storage._task_name, len(tree.journal), e, fresh)
+            fresh.build_indexes()
+            tree = fresh
+        storage.save_tree(tree)
+    return tree
+
+
+def _status(value: Optional[str]) -> Optional[TaskStatus]:
+    return TaskStatus(value) if value is not None else None
+
+
+def add(tree: TaskTreeProtocol, parent_path: str, name: str, description: str = "",
+        status: str = "todo", progress: Optional[int] = None) -> dict:
+    """添加任务，返回新任务信息"""
+    new_task = tree.add_task(parent_path, name, description or "",
+                             _status(status) or TaskStatus.TODO, progress)
+    return tree.get_task_info(f"{parent_path}.{new_task.name}")
+
+
+def edit(tree: TaskTreeProtocol, task_path: str, name: Optional[str] = None,
+         description: Optional[str] = None, status: Optional[str] = None,
+         progress: Optional[int] = None) -> dict:
+    """编辑任务，返回修改后的任务信息"""
+    task = tree.edit_task(task_path, name, description, _status(status), progress)
+    if name is not None:
+        task_path = _renamed(task_path, task.name)
+    return tree.get_task_info(task_path)
+
+
+def delete(tree: TaskTreeProtocol, task_path: str) -> dict:
+    """删除任务，返回被删除任务的信息"""
+    info = tree.get_task_info(task_path)
+    tree.delete_task(task_path)
+    return info
+
+
+def move(tree: TaskTreeProtocol, task_paths: List[str], new_parent_path: str,
+         name: Optional[str] = None) -> List[dict]:
+    """移动一个或多个任务（多个任务时任一失败则全部回滚），返回移动后的任务信息"""
+    return _relocate(tree, "move", task_paths, new_parent_path, name)
+
+
+def copy(tree: TaskTreeProtocol, task_paths: List[str], new_parent_path: str,
+         name: Optional[str] = None) -> List[dict]:
+    """复制一个或多个任务（多个任务时任一失败则全部回滚），返回副本的任务信息"""
+    return _relocate(tree, "copy", task_paths, new_parent_path, name)
+
+
+def _relocate(tree: TaskTreeProtocol, kind: str, task_paths: List[str], new_parent_path: str,
+              name: Optional[str]) -> List[dict]:
+    if name is not None and len(task_paths) != 1:
+        raise ValueError("指定新名称时只能移动或复制一个任务")
+    if len(task_paths) == 1:
+        method = tree.move_task if kind == "move" else tree.copy_task
+        task = method(task_paths[0], new_parent_path, name)
+        paths = [f"{new_parent_path}.{task.name}"]
+    else:
+        ops = [{"op": kind, "task_path": path, "new_parent_path": new_parent_path}
+               for path in task_paths]
+        paths = [result["path"] for result in tree.apply_ops(ops)]
+    return [tree.get_task_info(path) for path in paths]
+
+
+def show(tree: TaskTreeProtocol, task_path: str) -> dict:
+    """获取任务信息"""
+    return tree.get_task_info(task_path)
+
+
+def list_tree(tree: TaskTreeProtocol, detail: bool = False, depth: Optional[int] = None,
+              subtree: Optional[str] = None, offset: int = 0,
+              limit: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+    """按先序逐行生成任务树结构，每行为 (节点状态, 行文本)"""
+    rows = tree.iter_tree_rows(detail, depth, subtree)
+    return islice(rows, offset, None if limit is None else offset + limit)
+
+
+def nodes(tree: TaskTreeProtocol, depth: Optional[int] = None, subtree: Optional[str] = None,
+          offset: int = 0, limit: Optional[int] = None) -> Iterator[dict]:
+    """按先序逐个生成节点记录"""
+    records = tree.iter_nodes(depth, subtree)
+    return islice(records, offset, None if limit is None else offset + limit)
+
+
+def find(tree: TaskTreeProtocol, statuses: Optional[List[str]] = None,
+         min_progress: Optional[int] = None, max_progress: Optional[int] = None,
+         name: Optional[str] = None, description: Optional[str] = None,
+         pattern: Optional[str] = None, min_depth: Optional[int] = None,
+         max_depth: Optional[int] = None, subtree: Optional[str] = None,
+         limit: Optional[int] = None) -> Iterator[dict]:
+    """按先序逐个生成满足条件的节点记录"""
+    query = Query(statuses, min_progress, max_progress, name, description, pattern,
+                  min_depth, max_depth)
+    return islice(tree.query(query, subtree), limit)
+
+
+def batch(tree: TaskTreeProtocol, ops: list) -> list:
+    """批量执行操作"""
+    return tree.apply_ops(ops)
+
+
+def _renamed(task_path: str, new_name: str) -> str:
+    """计算重命名后的路径"""
+    parts = task_path.split('.')
+    if len(parts) == 1 and (parts[0].lower() == 'root' or parts[0].startswith('#')):
+        # 根任务和按 ID 定位的任务改名后路径不变
+        return task_path
+    return '.'.join(parts[:-1] + [new_name])
+
+
+# 交互式 shell 中常驻内存的任务树：任务名称 -> 会话（见 shell 模块）
+sessions: Dict[str, "object"] = {}
+
+
+# 命令名 -> (实现, 是否修改任务树)
+COMMANDS: Dict[str, Tuple[Callable, bool]] = {
+    "add": (add, True),
+    "edit": (edit, True),
+    "delete": (delete, True),
+    "move": (move, True),
+    "copy": (copy, True),
+    "show": (show, False),
+    "list": (list_tree, False),
+    "nodes": (nodes, False),
+    "find": (find, False),
+    "batch": (batch, True),
+}
+
+
+def execute(task_name: str, command: str, **kwargs):
+    """
+    执行命令
+
+    交互式 shell 中在已加载的任务树上执行；守护进程运行时转发给守护进程，
+    否则直接加载文件执行，
+    修改类命令执行成功且确实修改了任务树时保存一次。保存时若发现其他进程
+    已经写入，在最新的任务树上重新执行命令后再保存。只读命令（show、list、
+    nodes、find）不获取排他锁，也从不写入任何文件。
+
+    Args:
+        task_name: 任务名称
+        command: 命令名（见 COMMANDS）
+        **kwargs: 命令参数
+
+    Returns:
+        命令结果
+    """
+    session = sessions.get(task_name)
+    if session is not None:
+        return session.execute(command, **kwargs)
+
+    from . import daemon
+
+    client = daemon.connect()
+    if client is not None:
+        with client, trace.span("daemon.request", command=command):
+            return client.request(command, task_name, **kwargs)
+
+    func, mutating = COMMANDS[command]
+    storage = open_storage(task_name)
+    task_tree = load_task_tree(storage)
+    # 返回迭代器的命令在这里只创建迭代器，遍历耗时计入调用方的渲染阶段
+    with trace.span(f"tree.{command}"):
+        result = func(task_tree, **kwargs)
+    if mutating and task_tree.dirty:
+        # 执行命令时不持有锁，只在保存时持有排他锁
+        with storage.lock():
+            if storage.version() != storage.loaded_version:
+                # 其他进程在此期间写入过：在最新的任务树上重新执行本命令。
+                # 修改通常很小，重新执行比让所有进程排队等待整个读-改-写更快；
+                # 无法再应用时（如同名任务已被添加）照常抛出错误
+                with trace.span("storage.conflict"):
+                    task_tree = load_task_tree(storage)
+                    result = func(task_tree, **kwargs)
+            storage.save_tree(task_tree)
+    return result
@@ -0,0 +1,247 @@
+"""分片存储布局
+
+单个 JSON 文件保存整棵任务树时，即使只查看一个节点也要读取并解析整个文件。
+设置 TASKTREE_SHARD_NODES=N 后，JSON 后端把超过 N 个节点的子树拆到单独的
+分片文件中：
+
+    <任务>.json                 根分片：树的上层，分片子树只保留占位记录
+    <任务>.shards/<哈希>.json   分片：一棵完整的子树（格式同任务文件），
+                                其中更深的分片同样是占位记录
+
+占位记录是普通的节点字段加上 "shard" 字段（children 为空）:
+
+    {"file": 分片文件名, "sha256": 内容的 SHA-256, "rollup": 子树汇总,
+     "files": 子树中的全部分片文件名（包括自身）}
+
+- 加载时只读取根分片，分片节点的 children 是 LazyChildren，第一次访问
+  （例如 TaskTree.find_task_by_path 经过它）时才读取对应的文件
+- 子树汇总保存在占位记录中，统计子树和更新清单都不需要加载分片
+- 分片文件以内容的哈希命名，保存时只写入内容变化了的分片，从未加载的分片
+  既不重新编码也不重新写入。新分片先于根分片写入，根分片原子替换后才生效，
+  写入中途崩溃不会让任务文件引用不存在的分片
+- 根分片不再引用的分片文件在保存后删除。其他进程可能刚加载了旧的根分片，
+  因此只删除修改时间早于 SHARD_GC_GRACE 秒的文件
+
+已有的分片边界在之后的保存中保持不变，新分片在子树超过阈值时切分。未设置
+TASKTREE_SHARD_NODES（或为 0）时，保存会加载全部分片、写回单个文件并清理
+分片目录，两种格式之间可以随时切换（compact 命令即可完成转换）。
+"""
+
+import re
+import json
+import time
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .models import Task, LazyChildren, loaded_children
+from .rollup import Rollup
+from .serialization import iter_task_json
+from .traversal import iter_postorder, iter_preorder
+from .storage import write_atomic, _gc_paused, _parse_json
+from .exceptions import StorageError
+from . import trace
+
+
+# 不再被引用的分片文件至少保留的时间（秒）
+SHARD_GC_GRACE = 60.0
+
+_FILE_NAME = re.compile(r"[0-9a-f]{20}\.json")
+
+
+def _check_info(info) -> dict:
+    """检查占位记录中的分片信息（文件名只能是哈希，不能指向分片目录之外）"""
+    if (not isinstance(info, dict) or not isinstance(info.get("file"), str)
+            or not _FILE_NAME.fullmatch(info["file"])
+            or not isinstance(info.get("sha256"), str)
+            or not isinstance(info.get("files"), list)):
+        raise ValueError(f"无效的分片记录: {info!r}")
+    Rollup.load(info.get("rollup"))
+    return info
+
+
+class ShardSource:
+    """一个任务的分片目录，为 LazyChildren 读取分片文件"""
+
+    def __init__(self, directory: Path, lock: Optional[Callable] = None, blobs=None):
+        """
+        Args:
+            directory: 分片目录
+            lock: 读取分片时持有的锁（Storage.lock，以 shared=True 调用）
+            blobs: 分片中外置描述的 BlobStore（见 blobs 模块）
+        """
+        self.directory = directory
+        self._lock = lock
+        self._blobs = blobs
+        # 分片加载后的回调，参数为分片节点（TaskTree 用来补齐新节点的汇总）
+        self.listeners: List[Callable[[Task], None]] = []
+
+    def attach(self, task: Task, data: dict) -> None:
+        """Task.from_dict 的 on_node 回调：为占位记录挂上 LazyChildren"""
+        info = data.get("shard")
+        if info is not None:
+            task.children = LazyChildren(task, _check_info(info), self)
+        if self._blobs is not None:
+            self._blobs.attach(task, data)
+
+    def on_node(self, before: Optional[Callable[[Task, dict], None]] = None):
+        """
+        组合 on_node 回调
+
+        Args:
+            before: 先调用的回调（如 RollupLoader，它需要在挂上 LazyChildren
+                之前看到空的 children）
+        """
+        if before is None:
+            return self.attach
+
+        def on_node(task: Task, data: dict) -> None:
+            before(task, data)
+            self.attach(task, data)
+        return on_node
+
+    def read_children(self, owner: Task, info: dict) -> List[Task]:
+        """
+        读取分片文件，返回分片根节点（即 owner）的子任务
+
+        Raises:
+            StorageError: 分片文件不存在或无法解析
+        """
+        path = self.directory / info["file"]
+        with trace.span("storage.shard_load", file=info["file"]) as span:
+            try:
+                if self._lock is not None:
+                    with self._lock(shared=True):
+                        content = path.read_bytes()
+                else:
+                    content = path.read_bytes()
+            except FileNotFoundError:
+                raise StorageError(f"分片文件不存在: {path}（任务可能刚被其他进程修改，请重试）")
+            span.set(bytes=len(content))
+            # 内容与占位记录中的校验和不一致说明文件被外部修改过，逐节点校验
+            validate = hashlib.sha256(content).hexdigest() != info["sha256"]
+            try:
+                with _gc_paused():
+                    task = Task.from_dict(_parse_json(content), validate=validate,
+                                          on_node=self.attach, root_id=owner.id)
+            except (json.JSONDecodeError, UnicodeDecodeError, KeyError, ValueError) as e:
+                raise StorageError(f"无法读取分片文件 {path}: {e}")
+        return task.children
+
+    def children_loaded(self, owner: Task) -> None:
+        for listener in self.listeners:
+            listener(owner)
+
+
+def write_shards(root: Task, directory: Path, threshold: int, rollups: Dict[int, "Rollup"],
+                 persisted: Optional[Dict[int, "Rollup"]] = None,
+                 encode: Optional[Callable[[Task, Dict[int, dict]], bytes]] = None
+                 ) -> Tuple[bytes, Set[str]]:
+    """
+    按分片布局编码任务树，写入内容有变化的分片文件
+
+    只遍历已加载的节点。后序遍历中统计每个节点留在所在分片中的节点数，
+    已有的分片节点和超过阈值的子树写成单独的分片（更深的分片先写，
+    其占位记录再嵌入上层分片）。
+
+    Args:
+        root: 根任务
+        directory: 分片目录
+        threshold: 切分新分片的节点数阈值
+        rollups: 已加载节点和未加载分片节点的子树汇总（TaskTree.rollups）
+        persisted: 写入每个节点 "rollup" 字段的汇总（TASKTREE_ROLLUPS），None 时不写
+        encode: encode(分片根节点, 占位记录) 返回写入文件的内容（快照的格式和压缩方式），
+            None 时为带缩进的 JSON
+
+    Returns:
+        (根分片的内容, 仍被引用的分片文件名集合)
+    """
+    # id(分片节点) -> 占位记录中的分片信息
+    infos: Dict[int, dict] = {}
+    # 后序遍历时暂存子节点的统计: 深度 -> [留在所在分片中的节点数, 分片文件名]
+    pending: Dict[int, list] = {}
+    written = reused = 0
+    if encode is None:
+        def encode(task: Task, shards: Dict[int, dict]) -> bytes:
+            return "".join(iter_task_json(task, rollups=persisted, shards=shards)).encode('utf-8')
+
+    with trace.span("storage.shard_write") as span:
+        for task, _, depth, _, _ in iter_postorder(root, loaded_children):
+            size, files = pending.pop(depth + 1, None) or (0, [])
+            size += 1
+            children = task.children
+            info = None
+            if depth and type(children) is LazyChildren and not children.loaded:
+                # 未加载的分片没有变化
+                info = children.info
+            elif depth and (type(children) is LazyChildren or size > threshold):
+                content = encode(task, infos)
+                digest = hashlib.sha256(content).hexdigest()
+                name = digest[:20] + ".json"
+                path = directory / name
+                if path.exists():
+                    reused += 1
+                else:
+                    directory.mkdir(parents=True, exist_ok=True)
+                    write_atomic(path, content)
+                    written += 1
+                info = {"file": name, "sha256": digest, "rollup": rollups[id(task)].dump(),
+                        "files": [name, *files]}
+                if type(children) is not LazyChildren:
+                    # 记为分片节点，之后的保存保持这个边界
+                    lazy = LazyChildren(task, info)
+                    list.extend(lazy, children)
+                    task.children = lazy
+
+            if info is not None:
+                infos[id(task)] = info
+                size, files = 1, info["files"]
+            total = pending.setdefault(depth, [0, []])
+            total[0] += size
+            total[1].extend(files)
+
+        content = encode(root, infos)
+        span.set(shards=len(infos), written=written, reused=reused, bytes=len(content))
+    return content, set(pending[0][1])
+
+
+def collect_garbage(directory: Path, live: Set[str], grace: float = SHARD_GC_GRACE,
+                    pattern: str = "*.json") -> int:
+    """
+    删除不再被引用的分片文件（也用于描述文件目录，见 blobs 模块）
+
+    Args:
+        directory: 分片目录
+        live: 仍被引用的分片文件名
+        grace: 只删除修改时间早于这么多秒之前的文件
+        pattern: 目录中由这里管理的文件
+
+    Returns:
+        int: 删除的文件数
+    """
+    if not directory.is_dir():
+        return 0
+    cutoff = time.time() - grace
+    removed = 0
+    for path in directory.glob(pattern):
+        if path.name in live:
+            continue
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    if not live:
+        try:
+            directory.rmdir()
+        except OSError:
+            # 还有未过期的文件
+            pass
+    return removed
+
+
+def load_all(root: Task) -> None:
+    """加载子树中的全部分片"""
+    for _ in iter_preorder(root):
+        pass
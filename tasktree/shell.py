@@ -0,0 +1,270 @@
+"""交互式 shell
+
+`tasktree shell <任务名称>` 只加载一次任务树，之后的命令都在内存中执行：
+
+    tasktree(我的项目)> add root 设计 --status in-progress
+    tasktree(我的项目)> edit root.设计 --progress 50
+    tasktree(我的项目)> list --detail
+
+命令写法与 CLI 相同，只是省略任务名称（add/edit/delete/show/list/find/move/copy/batch）。
+路径可以用 Tab 补全，候选项来自内存中的任务树。
+
+修改先保存在内存中，最后一次修改后 TASKTREE_SHELL_SAVE_DELAY 秒（默认 2）
+无新的修改时写回文件，执行 save 或退出时立即写回。写回时若文件已被其他进程修改，
+与守护进程一样在最新的任务树上重放本次会话中尚未保存的修改
+（见 service.save_merged）。SQLite 后端的修改每条命令后立即提交。
+"""
+
+import os
+import cmd
+import sys
+import shlex
+import threading
+from collections.abc import Iterator
+from typing import List, Optional
+
+from . import service
+from . import trace
+from .utils import name_key
+from .exceptions import MergeConflictError
+
+
+DEFAULT_SAVE_DELAY = 2.0
+
+# 可在 shell 中执行的 CLI 命令（第一个参数都是任务名称）
+SHELL_COMMANDS = ("add", "edit", "delete", "show", "list", "find", "move", "copy", "batch")
+
+
+def save_delay() -> float:
+    """最后一次修改到写回文件之间的等待时间（秒），由 TASKTREE_SHELL_SAVE_DELAY 设置"""
+    return float(os.getenv("TASKTREE_SHELL_SAVE_DELAY", DEFAULT_SAVE_DELAY))
+
+
+class Session:
+    """shell 会话中常驻内存的任务树"""
+
+    def __init__(self, task_name: str, delay: Optional[float] = None):
+        """
+        Args:
+            task_name: 任务名称
+            delay: 防抖写回的等待时间（秒），None 时读取 TASKTREE_SHELL_SAVE_DELAY
+
+        Raises:
+            TreeNotInitializedError: 任务树未初始化
+        """
+        from .storage import open_storage
+
+        self.task_name = task_name
+        self.storage = open_storage(task_name)
+        self.tree = service.load_task_tree(self.storage)
+        self.tree.build_indexes()
+        self.delay = save_delay() if delay is None else delay
+        self.dirty = False
+        self.lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        # 修改在数据库事务中直接生效的后端不需要推迟提交
+        self._immediate = getattr(self.storage, "transactional", False)
+
+    def execute(self, command: str, **kwargs):
+        """在内存中的任务树上执行命令（service.execute 在会话中转到这里）"""
+        func, mutating = service.COMMANDS[command]
+        with self.lock:
+            self._refresh()
+            with trace.span(f"tree.{command}"):
+                result = func(self.tree, **kwargs)
+                if isinstance(result, Iterator):
+                    # 在锁内取完，避免与后台写回交错
+                    result = list(result)
+            if mutating and self.tree.dirty:
+                self.dirty = True
+                if self._immediate:
+                    self.save()
+                else:
+                    self._schedule()
+        return result
+
+    def _refresh(self) -> None:
+        """文件被其他进程修改且内存中没有未保存的修改时重新加载"""
+        if not self.dirty and self.storage.version() != self.storage.loaded_version:
+            self.tree = service.load_task_tree(self.storage)
+            self.tree.build_indexes()
+
+    def _schedule(self) -> None:
+        """重新开始防抖计时"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.delay, self._save_quietly)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _save_quietly(self) -> None:
+        try:
+            self.save()
+        except Exception as e:
+            print(f"\ntasktree: 保存 '{self.task_name}' 失败: {e}", file=sys.stderr)
+
+    def save(self) -> bool:
+        """
+        立即写回未保存的修改
+
+        Returns:
+            bool: 是否写入了文件
+
+        Raises:
+            MergeConflictError: 文件已被其他进程修改且无法合并，本次会话未保存的修改已放弃
+        """
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.dirty:
+                return False
+            try:
+                self.tree = service.save_merged(self.storage, self.tree)
+            except MergeConflictError as e:
+                # 修改已放弃，继续使用重新加载的任务树，由调用方报告
+                self.tree = e.tree
+                self.dirty = False
+                raise
+            self.dirty = False
+            return True
+
+    def complete_path(self, text: str) -> List[str]:
+        """补全任务路径（text 为已输入的部分路径）"""
+        parent_path, dot, prefix = text.rpartition('.')
+        if not dot:
+            return ["root."] if "root".startswith(prefix.lower()) else []
+        key = name_key(prefix)
+        with self.lock:
+            # 通过 iter_nodes 列出子任务：SQLite 后端 find_task_by_path 返回的任务不含子任务
+            try:
+                return [f"{parent_path}.{node['name']}"
+                        for node in self.tree.iter_nodes(max_depth=1, subtree=parent_path)
+                        if node["depth"] == 1 and name_key(node["name"]).startswith(key)]
+            except Exception:
+                return []
+
+
+class TaskTreeShell(cmd.Cmd):
+    """读取并执行命令的交互循环"""
+
+    def __init__(self, session: Session, command):
+        """
+        Args:
+            session: 会话
+            command: 执行 CLI 命令的 click 命令组（typer.main.get_command(app)）
+        """
+        super().__init__()
+        self.session = session
+        self.command = command
+        self.prompt = f"tasktree({session.task_name})> "
+        self.intro = (f"已加载任务 '{session.task_name}'。命令与 CLI 相同但省略任务名称，"
+                      f"Tab 补全路径，save 立即保存，exit 退出。")
+
+    def emptyline(self) -> bool:
+        return False
+
+    def default(self, line: str) -> bool:
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            print(f"错误: {e}")
+            return False
+        if not args:
+            return False
+        if args[0] not in SHELL_COMMANDS:
+            print(f"错误: 未知命令 '{args[0]}'（可用: {', '.join(SHELL_COMMANDS)}, save, exit）")
+            return False
+        self._run([args[0], self.session.task_name, *args[1:]])
+        return False
+
+    def _run(self, argv: List[str]) -> None:
+        import typer
+
+        try:
+            self.command.main(args=argv, prog_name="tasktree", standalone_mode=False)
+        except typer.Exit:
+            pass
+        except typer.Abort:
+            print()
+        except Exception as e:
+            # 参数错误等（click 的 ClickException）自带格式化输出
+            show = getattr(e, "show", None)
+            if show is not None:
+                show()
+            else:
+                print(f"错误: {e}")
+
+    def do_help(self, arg: str) -> bool:
+        """help [命令]: 显示命令帮助"""
+        if arg in SHELL_COMMANDS:
+            self._run([arg, "--help"])
+        else:
+            print(f"命令: {', '.join(SHELL_COMMANDS)}（写法同 CLI，省略任务名称）")
+            print("save: 立即保存    exit / quit / Ctrl-D: 保存并退出")
+        return False
+
+    def do_save(self, arg: str) -> bool:
+        """save: 立即把修改写回文件"""
+        try:
+            saved = self.session.save()
+        except Exception as e:
+            print(f"错误: 保存失败: {e}")
+            return False
+        print("已保存" if saved else "没有未保存的修改")
+        return False
+
+    def do_exit(self, arg: str) -> bool:
+        """exit: 保存并退出"""
+        return True
+
+    do_quit = do_exit
+
+    def do_EOF(self, arg: str) -> bool:
+        print()
+        return True
+
+    def completenames(self, text: str, *ignored) -> List[str]:
+        names = SHELL_COMMANDS + ("save", "exit", "quit", "help")
+        return [name + " " for name in names if name.startswith(text)]
+
+    def completedefault(self, text: str, line: str, begidx: int, endidx: int) -> List[str]:
+        if text.startswith("-"):
+            return []
+        return self.session.complete_path(text)
+
+
+def run_shell(task_name: str, command) -> None:
+    """
+    启动交互式 shell，退出时写回未保存的修改
+
+    Args:
+        task_name: 任务名称
+        command: 执行 CLI 命令的 click 命令组
+
+    Raises:
+        TreeNotInitializedError: 任务树未初始化
+    """
+    session = Session(task_name)
+    shell = TaskTreeShell(session, command)
+    try:
+        import readline
+        # 路径中的 '.'、'#'、'-' 都是补全内容的一部分
+        readline.set_completer_delims(" \t\n")
+    except ImportError:
+        pass
+
+    service.sessions[task_name] = session
+    try:
+        while True:
+            try:
+                shell.cmdloop()
+                break
+            except KeyboardInterrupt:
+                # Ctrl-C 只放弃当前输入行
+                print("^C")
+                shell.intro = None
+    finally:
+        del service.sessions[task_name]
+        if session.save():
+            print(f"已保存任务 '{task_name}'")
@@ -0,0 +1,825 @@
+"""SQLite 存储后端
+
+每个任务存储为一个 SQLite 数据库（<文件名>.db），每个任务节点一行，
+通过 (parent_id, name_key) 索引按路径逐层定位节点，因此 show/edit/add/delete
+只访问路径上的行，list 按树的先序流式读取行，不需要构建完整的 Task 模型。
+任务 ID 保存在 uid 列（唯一索引），"#ID" 路径直接按索引定位。
+
+设置 TASKTREE_BACKEND=sqlite 启用。
+"""
+
+import sqlite3
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Optional, List, Tuple, Iterator
+
+from .models import Task, TaskStatus, new_task_id, derived_task_id
+from .tree import format_tree_line, _parse_op, _require
+from .rollup import Rollup, leaf_progress
+from .query import Query
+from .storage import get_data_dir, lock_timeout
+from .manifest import Manifest, count_statuses, file_stamps
+from .utils import get_task_filename, name_key
+from .traversal import iter_preorder
+from . import trace
+from .exceptions import (
+    TaskNotFoundError, InvalidPathError, RootDeletionError, BatchOperationError
+)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    progress INTEGER,
+    uid TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_nodes_child_name ON nodes (parent_id, name_key);
+CREATE INDEX IF NOT EXISTS idx_nodes_child_order ON nodes (parent_id, position);
+"""
+
+_COLUMNS = "id, parent_id, name, description, status, progress, uid"
+
+# 按先序流式输出以 :start 为根、深度不超过 :max_depth（负数表示不限制）的子树：
+# 递归 CTE 的队列按 sort_key 取出，即深度优先。是否为最后一个子节点由
+# (parent_id, position) 索引上的相关子查询得出，只访问遍历到的行
+_WALK_SQL = """
+WITH RECURSIVE
+    walk (id, depth, is_last, sort_key, name, description, status, progress, uid) AS (
+        SELECT id, 0, 1, '', name, description, status, progress, uid
+        FROM nodes WHERE id = :start
+        UNION ALL
+        SELECT n.id, w.depth + 1,
+               n.position = (SELECT MAX(position) FROM nodes s WHERE s.parent_id = w.id),
+               w.sort_key || printf('%010d.', n.position),
+               n.name, n.description, n.status, n.progress, n.uid
+        FROM nodes n JOIN walk w ON n.parent_id = w.id
+        WHERE :max_depth < 0 OR w.depth < :max_depth
+        ORDER BY 4
+    )
+SELECT depth, is_last, name, description, status, progress, uid FROM walk
+"""
+
+
+def _row_rollups(rows: List[tuple]) -> List[Rollup]:
+    """_WALK_SQL 输出的先序行各自的子树汇总（一次遍历，子树结束时累加到父节点）"""
+    rollups: List[Rollup] = []
+    # 子树尚未结束的祖先：(深度, 汇总)
+    stack: List[Tuple[int, Rollup]] = []
+    for index, row in enumerate(rows):
+        depth, status, progress = row[0], row[4], row[5]
+        while stack and stack[-1][0] >= depth:
+            _, finished = stack.pop()
+            stack[-1][1].add(finished)
+        leaf = index + 1 == len(rows) or rows[index + 1][0] <= depth
+        rollup = Rollup.of_status(status, 1, int(leaf),
+                                  leaf_progress(TaskStatus(status), progress) if leaf else 0)
+        rollups.append(rollup)
+        stack.append((depth, rollup))
+    while len(stack) > 1:
+        _, finished = stack.pop()
+        stack[-1][1].add(finished)
+    return rollups
+
+
+def _summarize(conn: sqlite3.Connection) -> dict:
+    """数据库中任务树的统计信息"""
+    counts = dict(conn.execute("SELECT status, COUNT(*) FROM nodes GROUP BY status"))
+    summary = count_statuses(())
+    summary["status_counts"].update(counts)
+    summary["nodes"] = sum(counts.values())
+    return summary
+
+
+def _read_summary(file_path: Path) -> Optional[tuple]:
+    """读取任务数据库，返回 (任务名称, 统计信息)"""
+    try:
+        with closing(sqlite3.connect(str(file_path))) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'name'").fetchone()
+            return (row[0] if row else file_path.stem), _summarize(conn)
+    except sqlite3.DatabaseError:
+        # 无效的数据库文件不出现在任务列表中
+        return None
+
+
+def _file_fingerprint(file_path: Path) -> list:
+    return file_stamps(file_path)
+
+
+# 子树中各状态的节点数、叶子数和叶子进度之和（进度规则见 rollup 模块）
+_ROLLUP_SQL = """
+WITH RECURSIVE
+    subtree (id) AS (
+        SELECT :start
+        UNION ALL
+        SELECT n.id FROM nodes n JOIN subtree s ON n.parent_id = s.id
+    ),
+    flagged AS (
+        SELECT n.status, n.progress,
+               NOT EXISTS (SELECT 1 FROM nodes c WHERE c.parent_id = n.id) AS leaf
+        FROM nodes n JOIN subtree s ON n.id = s.id
+    )
+SELECT status, COUNT(*), SUM(leaf),
+       SUM(CASE WHEN leaf THEN COALESCE(progress, CASE status WHEN 'done' THEN 100 ELSE 0 END)
+           ELSE 0 END)
+FROM flagged GROUP BY status
+"""
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    """
+    打开数据库（自动提交模式，事务由调用方显式管理）
+
+    并发写入由 SQLite 自己的锁串行化：写事务以 BEGIN IMMEDIATE 开始，
+    其他写者最多等待 TASKTREE_LOCK_TIMEOUT 秒。
+    """
+    conn = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False,
+                           timeout=lock_timeout())
+    conn.executescript(_SCHEMA)
+    _migrate_uids(conn)
+    return conn
+
+
+def _migrate_uids(conn: sqlite3.Connection) -> None:
+    """为旧版数据库添加 uid 列并为已有节点生成 ID"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(nodes)")}
+    missing = "uid" not in columns or conn.execute(
+        "SELECT 1 FROM nodes WHERE uid IS NULL LIMIT 1").fetchone() is not None
+    if missing:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 等锁期间其他进程可能已经完成迁移
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(nodes)")}
+            if "uid" not in columns:
+                conn.execute("ALTER TABLE nodes ADD COLUMN uid TEXT")
+            rows = conn.execute("SELECT id FROM nodes WHERE uid IS NULL").fetchall()
+            conn.executemany("UPDATE nodes SET uid = ? WHERE id = ?",
+                             [(new_task_id(), row[0]) for row in rows])
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_nodes_uid ON nodes (uid)")
+
+
+def _node_rows(task: Task) -> List[tuple]:
+    """任务树对应的 nodes 表的行（按先序分配 id，父节点总是先于子节点）"""
+    rows = []
+    node_ids = {}
+    uids = set()
+    for visit in iter_preorder(task):
+        current = visit.task
+        node_id = len(rows) + 1
+        node_ids[id(current)] = node_id
+        parent_id = node_ids[id(visit.parent)] if visit.parent is not None else None
+        if current.id in uids:
+            # 外部编辑的文件中可能有重复的 ID（处理方式同 TaskTree 的 ID 索引）
+            current.id = derived_task_id(visit.parent.id, visit.index, current.name)
+        uids.add(current.id)
+        rows.append((node_id, parent_id, visit.index, current.name, name_key(current.name),
+                     current.description, current.status.value, current.progress, current.id))
+    return rows
+
+
+def _row_to_task(row: tuple) -> Task:
+    """把一行转换为不含子任务的 Task"""
+    _, _, name, description, status, progress, uid = row
+    return Task(name=name, description=description, status=TaskStatus(status),
+                progress=progress, children=[], id=uid)
+
+
+def _materialize(conn: sqlite3.Connection) -> Optional[Task]:
+    """把数据库中的全部节点构建为完整的 Task 树"""
+    rows = conn.execute(f"SELECT {_COLUMNS} FROM nodes ORDER BY parent_id, position").fetchall()
+    tasks = {row[0]: _row_to_task(row) for row in rows}
+
+    root = None
+    # 同一父节点的子节点已按 position 排好序
+    for row in rows:
+        if row[1] is None:
+            root = tasks[row[0]]
+        else:
+            tasks[row[1]].children.append(tasks[row[0]])
+    return root
+
+
+class SQLiteTaskTree:
+    """
+    直接在 SQLite 数据库上执行操作的任务树
+
+    支持 TaskTreeProtocol 中的操作。节点、汇总和 ID 索引都在数据库中，
+    因此没有内存中的任务树（root）和按节点缓存的汇总；find_task_by_path
+    返回的任务不含子任务。
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+        # 修改直接写入数据库事务，不需要日志（TaskTreeProtocol 的一部分，总是为空）
+        self.journal: List[dict] = []
+
+    @property
+    def dirty(self) -> bool:
+        """是否有尚未提交的修改"""
+        return self._conn.in_transaction
+
+    def build_indexes(self) -> None:
+        """数据库自带索引，无需预先计算"""
+
+    def get_rollup(self, task_path: str) -> Rollup:
+        """获取任务的子树汇总（在数据库中聚合）"""
+        row, _, _ = self._resolve(task_path)
+        return self._subtree_rollup(row[0])
+
+    def path_of(self, task: Task) -> str:
+        """
+        任务的完整路径（按 ID 定位后沿 parent_id 上溯）
+
+        Raises:
+            TaskNotFoundError: 任务不在这棵树中
+        """
+        row = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM nodes WHERE uid = ?", (task.id,)).fetchone()
+        if row is None:
+            raise TaskNotFoundError(f"任务 '{task.name}' 不在任务树中")
+        return self._path_of(row)
+
+    @contextmanager
+    def _writing(self):
+        """
+        在写事务中执行修改
+
+        没有进行中的事务时以 BEGIN IMMEDIATE 开始一个；出错时回滚由这里开始的
+        整个事务，不把写锁留给之后才会提交的调用方（守护进程、交互式 shell）。
+        """
+        started = not self._conn.in_transaction
+        if started:
+            self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            if started and self._conn.in_transaction:
+                self._conn.rollback()
+            raise
+
+    def commit(self) -> None:
+        """提交本次修改"""
+        if self._conn.in_transaction:
+            self._conn.commit()
+
+    def close(self) -> None:
+        """关闭数据库连接（未提交的修改会被丢弃）"""
+        self._conn.close()
+
+    def _resolve(self, path: str) -> Tuple[tuple, Optional[tuple], List[str]]:
+        """
+        根据路径逐层查询节点
+
+        Returns:
+            (row, parent_row, path_parts)
+        """
+        if not path:
+            raise InvalidPathError("路径不能为空")
+
+        if path[0] == '#':
+            task_id, _, rest = path[1:].partition('.')
+            if not task_id:
+                raise InvalidPathError("任务 ID 不能为空")
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM nodes WHERE uid = ?", (task_id,)).fetchone()
+            if row is None:
+                raise TaskNotFoundError(f"ID 为 '{task_id}' 的任务不存在")
+            parent = self._row(row[1]) if row[1] is not None else None
+            # 从该任务开始的相对路径
+            parts = [name_key(part) for part in rest.split('.')] if rest else []
+            found_path = ['#' + task_id]
+            for part in parts:
+                found_path.append(part)
+                parent, row = row, self._child(row, part, found_path)
+            return row, parent, found_path
+
+        path_parts = [name_key(part) for part in path.split('.')]
+        if path_parts[0] != 'root':
+            path_parts = ['root'] + path_parts
+
+        row = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM nodes WHERE parent_id IS NULL").fetchone()
+        parent = None
+        found_path = []
+        for part in path_parts:
+            found_path.append(part)
+            if part == 'root':
+                continue
+            parent, row = row, self._child(row, part, found_path)
+
+        return row, parent, path_parts
+
+    def _child(self, row: tuple, part: str, found_path: List[str]) -> tuple:
+        child = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM nodes WHERE parent_id = ? AND name_key = ?",
+            (row[0], name_key(part))).fetchone()
+        if child is None:
+            full_path = '.'.join(found_path)
+            raise TaskNotFoundError(f"任务 '{full_path}' 不存在")
+        return child
+
+    def _row(self, node_id: int) -> tuple:
+        return self._conn.execute(f"SELECT {_COLUMNS} FROM nodes WHERE id = ?", (node_id,)).fetchone()
+
+    def _path_of(self, row: tuple) -> str:
+        """节点的完整路径（沿 parent_id 逐层上溯）"""
+        names = []
+        while row[1] is not None:
+            names.append(row[2])
+            row = self._row(row[1])
+        names.append("root")
+        return ".".join(reversed(names))
+
+    def find_task_by_path(self, path: str) -> Tuple[Task, Optional[Task], List[str]]:
+        """根据路径查找任务（返回的 Task 不含子任务）"""
+        row, parent, path_parts = self._resolve(path)
+        return _row_to_task(row), _row_to_task(parent) if parent else None, path_parts
+
+    def _sibling_exists(self, parent_id: int, name: str, exclude_id: Optional[int] = None) -> bool:
+        row = self._conn.execute(
+            "SELECT id FROM nodes WHERE parent_id = ? AND name_key = ?",
+            (parent_id, name_key(name))).fetchone()
+        return row is not None and row[0] != exclude_id
+
+    def add_task(self, parent_path: str, name: str, description: str = "",
+                 status: TaskStatus = TaskStatus.TODO, progress: Optional[int] = None,
+                 task_id: Optional[str] = None) -> Task:
+        """添加新任务"""
+        parent, _, _ = self._resolve(parent_path)
+        if self._sibling_exists(parent[0], name):
+            raise ValueError(f"父任务下已存在名为 '{name}' 的任务")
+
+        # 借助模型校验字段
+        new_task = Task(name=name, description=description, status=status,
+                        progress=progress, children=[], id=task_id)
+        if task_id is not None and self._conn.execute(
+                "SELECT 1 FROM nodes WHERE uid = ?", (task_id,)).fetchone() is not None:
+            raise ValueError(f"ID 为 '{task_id}' 的任务已存在")
+
+        with self._writing():
+            position = self._conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM nodes WHERE parent_id = ?",
+                (parent[0],)).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO nodes (parent_id, position, name, name_key, description, status, progress, uid) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (parent[0], position, name, name_key(name), description,
+                 new_task.status.value, progress, new_task.id))
+        return new_task
+
+    def edit_task(self, task_path: str, name: Optional[str] = None,
+                  description: Optional[str] = None, status: Optional[TaskStatus] = None,
+                  progress: Optional[int] = None) -> Task:
+        """编辑任务属性"""
+        row, parent, _ = self._resolve(task_path)
+
+        changes = {}
+        if name is not None:
+            if parent is not None and self._sibling_exists(parent[0], name, exclude_id=row[0]):
+                raise ValueError(f"同层级已存在名为 '{name}' 的任务")
+            changes["name"] = name
+            changes["name_key"] = name_key(name)
+        if description is not None:
+            changes["description"] = description
+        if status is not None:
+            changes["status"] = TaskStatus(status).value
+        if progress is not None:
+            if not 0 <= progress <= 100:
+                raise ValueError('进度必须在 0-100 之间')
+            changes["progress"] = progress
+
+        if changes:
+            assignments = ", ".join(f"{column} = ?" for column in changes)
+            with self._writing():
+                self._conn.execute(f"UPDATE nodes SET {assignments} WHERE id = ?",
+                                   (*changes.values(), row[0]))
+
+        return _row_to_task(self._row(row[0]))
+
+    def move_task(self, task_path: str, new_parent_path: str,
+                  name: Optional[str] = None) -> Task:
+        """移动任务（只更新子树根节点所在的行）"""
+        row, parent, _ = self._resolve(task_path)
+        if parent is None:
+            raise ValueError("不能移动根任务")
+        new_parent, _, _ = self._resolve(new_parent_path)
+        # 沿新的父任务向上检查是否经过被移动的任务
+        ancestor = new_parent
+        while ancestor is not None:
+            if ancestor[0] == row[0]:
+                raise ValueError("不能把任务移动到它自己的子树中")
+            ancestor = self._row(ancestor[1]) if ancestor[1] is not None else None
+        name = name or row[2]
+        if self._sibling_exists(new_parent[0], name, exclude_id=row[0]):
+            raise ValueError(f"目标父任务下已存在名为 '{name}' 的任务")
+
+        with self._writing():
+            self._conn.execute(
+                "UPDATE nodes SET parent_id = ?, position = ("
+                "  SELECT COALESCE(MAX(position), -1) + 1 FROM nodes WHERE parent_id = ?"
+                "), name = ?, name_key = ? WHERE id = ?",
+                (new_parent[0], new_parent[0], name, name_key(name), row[0]))
+        return _row_to_task(self._row(row[0]))
+
+    def copy_task(self, task_path: str, new_parent_path: str, name: Optional[str] = None,
+                  task_id: Optional[str] = None) -> Task:
+        """复制任务及其子树（ID 规则同 Task.copy）"""
+        row, _, _ = self._resolve(task_path)
+        new_parent, _, _ = self._resolve(new_parent_path)
+        name = name or row[2]
+        if self._sibling_exists(new_parent[0], name):
+            raise ValueError(f"目标父任务下已存在名为 '{name}' 的任务")
+        copy = Task(name=name, children=[], id=task_id)
+        if task_id is not None and self._conn.execute(
+                "SELECT 1 FROM nodes WHERE uid = ?", (task_id,)).fetchone() is not None:
+            raise ValueError(f"ID 为 '{task_id}' 的任务已存在")
+
+        # 先读出整个子树，新的父任务在子树中时也不会复制到副本自身
+        rows = self._conn.execute(
+            "WITH RECURSIVE subtree (id) AS ("
+            "  SELECT ? UNION ALL"
+            "  SELECT n.id FROM nodes n JOIN subtree s ON n.parent_id = s.id"
+            f") SELECT {_COLUMNS}, position FROM nodes WHERE id IN subtree",
+            (row[0],)).fetchall()
+        children = {}
+        for child in sorted(rows, key=lambda r: r[-1]):
+            children.setdefault(child[1], []).append(child)
+
+        with self._writing():
+            position = self._conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM nodes WHERE parent_id = ?",
+                (new_parent[0],)).fetchone()[0]
+            # (原行, 新的父节点行 id, 位置, 名称, ID)
+            stack = [(row, new_parent[0], position, name, copy.id)]
+            while stack:
+                source, parent_id, index, node_name, uid = stack.pop()
+                node_id = self._conn.execute(
+                    "INSERT INTO nodes (parent_id, position, name, name_key, description, status, progress, uid) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (parent_id, index, node_name, name_key(node_name), source[3], source[4],
+                     source[5], uid)).lastrowid
+                for child_index, child in enumerate(children.get(source[0], ())):
+                    stack.append((child, node_id, child_index, child[2],
+                                  derived_task_id(uid, child_index, child[2])))
+        return _row_to_task(self._conn.execute(
+            f"SELECT {_COLUMNS} FROM nodes WHERE uid = ?", (copy.id,)).fetchone())
+
+    def delete_task(self, task_path: str) -> bool:
+        """删除任务及其所有子任务"""
+        row, parent, _ = self._resolve(task_path)
+        if parent is None:
+            raise RootDeletionError("不能删除根任务")
+
+        with self._writing():
+            self._conn.execute(
+                "WITH RECURSIVE subtree (id) AS ("
+                "  SELECT ? UNION ALL"
+                "  SELECT n.id FROM nodes n JOIN subtree s ON n.parent_id = s.id"
+                ") DELETE FROM nodes WHERE id IN subtree",
+                (row[0],))
+        return True
+
+    def apply_ops(self, ops) -> List[dict]:
+        """
+        批量应用操作（在同一个保存点内执行，失败时回滚到保存点；
+        事务由本次调用开始时回滚整个事务，见 _writing）
+        """
+        results = []
+        with self._writing():
+            self._conn.execute("SAVEPOINT apply_ops")
+            for index, op in enumerate(ops, start=1):
+                try:
+                    result = self._apply_op(op)
+                except Exception as e:
+                    self._conn.execute("ROLLBACK TO apply_ops")
+                    self._conn.execute("RELEASE apply_ops")
+                    raise BatchOperationError(index, op, e, results)
+                result["index"] = index
+                results.append(result)
+            self._conn.execute("RELEASE apply_ops")
+        return results
+
+    def _apply_op(self, op: dict) -> dict:
+        kind, status, progress = _parse_op(op)
+
+        if kind == "add":
+            parent_path = _require(op, "parent_path")
+            new_task = self.add_task(parent_path, _require(op, "name"),
+                                     op.get("description") or "",
+                                     status or TaskStatus.TODO, progress, op.get("id"))
+            return {"op": kind, "path": f"{parent_path}.{new_task.name}"}
+
+        if kind == "edit":
+            task_path = _require(op, "task_path")
+            self.edit_task(task_path, op.get("name"), op.get("description"), status, progress)
+            return {"op": kind, "path": task_path}
+
+        if kind == "delete":
+            task_path = _require(op, "task_path")
+            self.delete_task(task_path)
+            return {"op": kind, "path": task_path}
+
+        if kind in ("move", "copy"):
+            task_path = _require(op, "task_path")
+            new_parent_path = _require(op, "new_parent_path")
+            if kind == "move":
+                task = self.move_task(task_path, new_parent_path, op.get("name"))
+            else:
+                task = self.copy_task(task_path, new_parent_path, op.get("name"), op.get("id"))
+            return {"op": kind, "path": f"{new_parent_path}.{task.name}"}
+
+        raise ValueError(f"未知的操作类型: {kind!r}")
+
+    def get_task_info(self, task_path: str) -> dict:
+        """获取任务详细信息"""
+        row, _, _ = self._resolve(task_path)
+        children_count = self._conn.execute(
+            "SELECT COUNT(*) FROM nodes WHERE parent_id = ?", (row[0],)).fetchone()[0]
+        return {
+            "path": self._path_of(row) if task_path.startswith('#') else task_path,
+            "id": row[6],
+            "name": row[2],
+            "description": row[3],
+            "status": row[4],
+            "progress": row[5],
+            "children_count": children_count,
+            "rollup": self._subtree_rollup(row[0]).to_dict(),
+        }
+
+    def _subtree_rollup(self, node_id: int) -> Rollup:
+        """在数据库中聚合子树汇总（SQLite 后端不缓存汇总）"""
+        rollup = Rollup.zero()
+        for status, count, leaves, progress_sum in self._conn.execute(
+                _ROLLUP_SQL, {"start": node_id}):
+            rollup.add(Rollup.of_status(status, count, leaves, progress_sum))
+        return rollup
+
+    def _walk(self, max_depth: Optional[int], subtree: Optional[str]) -> sqlite3.Cursor:
+        """按先序遍历子树的游标"""
+        if subtree is None:
+            start = self._conn.execute("SELECT id FROM nodes WHERE parent_id IS NULL").fetchone()[0]
+        else:
+            start = self._resolve(subtree)[0][0]
+        params = {"start": start, "max_depth": -1 if max_depth is None else max_depth}
+        return self._conn.execute(_WALK_SQL, params)
+
+    def iter_nodes(self, max_depth: Optional[int] = None,
+                   subtree: Optional[str] = None) -> Iterator[dict]:
+        """按先序逐个生成节点记录（直接从数据库流式读取）"""
+        return self._iter_nodes(self._walk(max_depth, subtree), subtree or "root")
+
+    def _iter_nodes(self, cursor: sqlite3.Cursor, start_path: str) -> Iterator[dict]:
+        # paths[d] 是第 d 层当前节点的路径
+        paths: List[str] = []
+        for depth, _, name, description, status, progress, uid in cursor:
+            path = start_path if depth == 0 else f"{paths[depth - 1]}.{name}"
+            del paths[depth:]
+            paths.append(path)
+            yield {
+                "path": path,
+                "id": uid,
+                "name": name,
+                "depth": depth,
+                "status": status,
+                "progress": progress,
+                "description": description,
+            }
+
+    def query(self, query: Query, subtree: Optional[str] = None) -> Iterator[dict]:
+        """按先序逐个生成满足查询条件的节点记录（在数据库的流式遍历上逐行求值）"""
+        return self._query(query, self._walk(query.max_depth, subtree), subtree or "root")
+
+    def _query(self, query: Query, cursor: sqlite3.Cursor, start_path: str) -> Iterator[dict]:
+        matches = query.matches
+        for record in self._iter_nodes(cursor, start_path):
+            if matches(record["name"], record["description"], record["status"],
+                       record["progress"], record["depth"]):
+                yield record
+
+    def iter_tree_rows(self, show_detail: bool = False, max_depth: Optional[int] = None,
+                       subtree: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """
+        按先序逐行生成任务树的结构化表示（直接从数据库流式读取）
+
+        显示详细信息时每行带有整个子树的汇总（不受 max_depth 限制，与 JSON
+        后端一致），汇总要在输出子树的根之前得到，因此先读出整个子树再输出
+        """
+        if not show_detail:
+            return self._iter_rows(self._walk(max_depth, subtree), show_detail)
+        rows = self._walk(None, subtree).fetchall()
+        return self._iter_rows(rows, show_detail, _row_rollups(rows), max_depth)
+
+    def _iter_rows(self, cursor, show_detail: bool, rollups: Optional[List[Rollup]] = None,
+                   max_depth: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        # child_indents[d] 是第 d 层节点的子节点所用的缩进
+        child_indents: List[str] = []
+        for index, (depth, is_last, name, description, status, progress, _) in enumerate(cursor):
+            if max_depth is not None and depth > max_depth:
+                continue
+            if depth == 0:
+                prefix = ""
+                indent = "    "
+            else:
+                parent_indent = child_indents[depth - 1]
+                prefix = parent_indent + ("└── " if is_last else "├── ")
+                indent = parent_indent + ("    " if is_last else "│   ")
+            del child_indents[depth:]
+            child_indents.append(indent)
+            rollup = rollups[index] if rollups is not None else None
+            if rollup is not None and rollup.nodes == 1:
+                rollup = None
+            yield status, format_tree_line(prefix, name, status, progress, description,
+                                           show_detail, rollup)
+
+    def get_tree_structure(self, show_detail: bool = False, max_depth: Optional[int] = None,
+                           subtree: Optional[str] = None) -> Iterator[str]:
+        """按先序逐行生成任务树的结构化表示（参数同 iter_tree_rows）"""
+        rows = self.iter_tree_rows(show_detail, max_depth, subtree)
+        return (line for _, line in rows)
+
+
+class SQLiteStorage:
+    """SQLite 任务数据存储类"""
+
+    # 修改在数据库事务中直接生效，常驻内存的调用方（交互式 shell）不应推迟提交
+    transactional = True
+
+    def __init__(self, task_name: str):
+        """
+        初始化存储类
+
+        Args:
+            task_name: 任务名称（必填）
+
+        Raises:
+            ValueError: 如果 task_name 为 None
+        """
+        if task_name is None:
+            raise ValueError("task_name 不能为 None (V3 要求所有命令都指定任务名称)")
+        self._task_name = task_name
+        self._data_dir = get_data_dir()
+
+    @property
+    def data_dir(self) -> Path:
+        """数据目录"""
+        return self._data_dir
+
+    @property
+    def data_file(self) -> Path:
+        """数据库文件路径"""
+        return self._data_dir / Path(get_task_filename(self._task_name)).with_suffix(".db")
+
+    def fingerprint(self) -> tuple:
+        """数据库文件的 (mtime, size)"""
+        try:
+            stat = self.data_file.stat()
+        except FileNotFoundError:
+            return (None,)
+        return ((stat.st_mtime_ns, stat.st_size),)
+
+    def version(self) -> None:
+        """修改直接在数据库事务中进行，不需要乐观并发检查（总是 None）"""
+        return None
+
+    @property
+    def loaded_version(self) -> None:
+        """见 version"""
+        return None
+
+    @contextmanager
+    def lock(self, shared: bool = False):
+        """数据库事务已经保证了一致性，不需要额外的任务锁"""
+        yield
+
+    def exists(self) -> bool:
+        """检查任务数据库是否存在"""
+        return self.data_file.exists()
+
+    def load(self) -> Optional[Task]:
+        """加载完整的任务树"""
+        if not self.exists():
+            return None
+        with trace.span("storage.load"), closing(_connect(self.data_file)) as conn:
+            return _materialize(conn)
+
+    def save(self, task: Task, ops: Optional[List[dict]] = None) -> None:
+        """用给定的任务树替换数据库中的全部节点"""
+        self.data_file.parent.mkdir(parents=True, exist_ok=True)
+        rows = _node_rows(task)
+        with trace.span("storage.save", nodes=len(rows)), \
+                closing(_connect(self.data_file)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._replace_nodes(conn, rows)
+            conn.commit()
+            self._update_manifest(conn)
+
+    def _replace_nodes(self, conn: sqlite3.Connection, rows: List[tuple]) -> None:
+        """在调用方的写事务中用给定的行替换全部节点"""
+        conn.execute("DELETE FROM nodes")
+        conn.executemany(
+            "INSERT INTO nodes (id, parent_id, position, name, name_key, description, status, progress, uid) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('name', ?)",
+                     (self._task_name,))
+
+    def _manifest(self) -> Manifest:
+        return Manifest(self._data_dir)
+
+    def _update_manifest(self, conn: sqlite3.Connection) -> None:
+        """把数据库的统计信息写入数据目录清单"""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'name'").fetchone()
+        self._manifest().put(self.data_file.name, row[0] if row else self._task_name,
+                             _file_fingerprint(self.data_file), _summarize(conn))
+
+    def load_tree(self) -> Optional[SQLiteTaskTree]:
+        """打开任务树（不加载节点，操作直接在数据库上执行）"""
+        if not self.exists():
+            return None
+        with trace.span("storage.open"):
+            return SQLiteTaskTree(_connect(self.data_file))
+
+    def save_tree(self, tree: SQLiteTaskTree) -> None:
+        """
+        提交任务树上的修改
+
+        只提交修改，不重新统计整个数据库；文件指纹随之改变，
+        清单中的条目在下次列出任务时刷新。
+        """
+        with trace.span("storage.commit"):
+            tree.commit()
+
+    def delete(self) -> bool:
+        """删除任务数据库"""
+        self._manifest().discard(self.data_file.name)
+        if self.exists():
+            self.data_file.unlink()
+            return True
+        return False
+
+    def initialize(self, description: str = "") -> Task:
+        """
+        初始化新的任务树
+
+        检查和写入根节点在同一个写事务中进行，并发初始化同一个任务时只有一个成功。
+
+        Raises:
+            FileExistsError: 任务已存在
+        """
+        root_task = Task(
+            name=self._task_name,
+            description=description,
+            status="todo",
+            progress=None,
+            children=[]
+        )
+
+        self.data_file.parent.mkdir(parents=True, exist_ok=True)
+        with trace.span("storage.save", nodes=1), closing(_connect(self.data_file)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # 没有节点的数据库（如初始化中途退出留下的）视为不存在；
+            # 抛出异常时连接关闭，未提交的事务随之回滚
+            if conn.execute("SELECT 1 FROM nodes LIMIT 1").fetchone() is not None:
+                raise FileExistsError(f"任务 '{self._task_name}' 已存在")
+            self._replace_nodes(conn, _node_rows(root_task))
+            conn.commit()
+            self._update_manifest(conn)
+        return root_task
+
+    def compact(self) -> int:
+        """整理数据库文件（SQLite 后端没有日志，返回 0）"""
+        if not self.exists():
+            raise FileNotFoundError(f"任务 '{self._task_name}' 不存在")
+        with closing(_connect(self.data_file)) as conn:
+            conn.execute("VACUUM")
+        return 0
+
+    def list_tasks(self) -> list:
+        """列出所有任务数据库（使用数据目录清单，只重新读取修改过的数据库）"""
+        # 确保数据目录存在
+        self._data_dir.mkdir(parents=True, exist_ok=True)
+
+        tasks = self._manifest().list_entries(".db", _file_fingerprint, _read_summary)
+        return sorted(tasks, key=lambda x: x["modified"], reverse=True)
+
+    def reindex(self) -> int:
+        """
+        重建数据目录清单
+
+        Returns:
+            int: 清单中的任务数
+        """
+        self._manifest().clear()
+        return len(self.list_tasks())
@@ -1,43 +1,372 @@
-"""任务数据存储管理 - V3 版本"""
+"""任务数据存储管理 - V3 版本
+
+多个进程（例如并行的多个 agent）可以同时读写同一个任务：
+
+- 快照、校验和文件都先写临时文件再原子替换，写入中途崩溃不会留下截断的文件
+- 每个任务有一个咨询锁文件（<任务>.lock）：加载时持有共享锁，保存时持有排他锁，
+  读者总能看到一致的快照和日志
+- 命令执行期间不持有锁。保存前在排他锁内比较磁盘上的版本（校验和与文件指纹）
+  和加载时的版本，不一致说明其他进程已经写入，由调用方在最新的任务树上
+  重新执行修改（见 service.execute）
+
+设置 TASKTREE_SHARD_NODES 后大任务树按分片布局保存，见 shards 模块。
+
+快照的编码由 TASKTREE_FORMAT（pretty 带缩进，compact 为紧凑格式）和
+TASKTREE_COMPRESS（none、gzip、lzma）选择，未设置时沿用现有文件的编码。
+加载时按文件开头的魔数识别压缩方式，两种格式都能直接解析。
+"""
 
 import os
+import gc
 import json
+import time
+import shutil
+import hashlib
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
-import appdirs
+from typing import Callable, Optional, List, Tuple
 
 from .models import Task
+from .serialization import FragmentCache, iter_compact_json, iter_task_json, loads_deep
+from .blobs import BLOB_KEY, BlobStore, blob_threshold, live_blobs
+from .manifest import Manifest, file_stamps, summarize_task
+from . import trace
+from .rollup import RollupLoader, compute_rollups
 from .utils import get_task_filename
+from .exceptions import StorageError
+
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 flock，退化为不加锁
+    fcntl = None
+
+
+# 等待任务锁的默认超时（秒），可通过 TASKTREE_LOCK_TIMEOUT 调整
+DEFAULT_LOCK_TIMEOUT = 30.0
+
+# 日志模式下触发自动压缩的阈值（可通过环境变量调整）
+DEFAULT_JOURNAL_MAX_RECORDS = 1000
+DEFAULT_JOURNAL_MAX_BYTES = 4 * 1024 * 1024
+
+# 文件中含有分片占位记录的标志（JSON 字符串中的引号都经过转义，只有键会匹配）
+_SHARD_KEY = b'"shard"'
+
+# iter_task_json 输出的开头（旧版本写入的文件没有 ID，不能复用其中的片段）
+_SNAPSHOT_HEAD = b'{\n  "id": '
+
+# 快照格式和压缩方式（第一项为默认值）
+FORMATS = ("pretty", "compact")
+COMPRESSIONS = ("none", "gzip", "lzma")
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes", "on")
+
+
+def lock_timeout() -> float:
+    """等待任务锁的超时（秒）"""
+    return float(os.getenv("TASKTREE_LOCK_TIMEOUT", DEFAULT_LOCK_TIMEOUT))
+
+
+def _flock(fd: int, operation: int, timeout: float, path: Path) -> None:
+    """在超时内获取 flock（非阻塞重试，间隔逐渐加长）"""
+    deadline = time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        try:
+            fcntl.flock(fd, operation | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise StorageError(f"等待任务锁超时（{timeout:g} 秒）: {path}")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+
+def write_atomic(path: Path, content: bytes) -> None:
+    """
+    原子地写入文件
+
+    先写同目录下的临时文件并刷到磁盘，再替换目标文件。其他进程要么读到
+    旧内容要么读到新内容，写入中途崩溃只会留下临时文件。
+    """
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def _gc_paused():
+    """构建大量对象期间暂停循环垃圾回收（新对象都是存活的，回收只是白费时间）"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _compression_of(content: bytes) -> str:
+    """按魔数识别压缩方式"""
+    if content.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if content.startswith(_XZ_MAGIC):
+        return "lzma"
+    return "none"
+
+
+def _decompress(content: bytes) -> bytes:
+    """解压文件内容（未压缩时原样返回）"""
+    compression = _compression_of(content)
+    if compression == "none":
+        return content
+    with trace.span("storage.decompress", method=compression) as span:
+        if compression == "gzip":
+            import gzip
+            content = gzip.decompress(content)
+        else:
+            import lzma
+            content = lzma.decompress(content)
+        span.set(bytes=len(content))
+    return content
+
+
+def _compress(content: bytes, compression: str) -> bytes:
+    """按指定方式压缩（gzip 不写入时间戳，相同内容总是得到相同的字节）"""
+    if compression == "none":
+        return content
+    with trace.span("storage.compress", method=compression) as span:
+        if compression == "gzip":
+            import gzip
+            content = gzip.compress(content, compresslevel=6, mtime=0)
+        else:
+            import lzma
+            content = lzma.compress(content)
+        span.set(bytes=len(content))
+    return content
+
+
+def encode_snapshot(task: Task, file_format: str = "pretty", compression: str = "none",
+                    rollups: Optional[dict] = None, shards: Optional[dict] = None,
+                    fragments: Optional[FragmentCache] = None,
+                    blobs: Optional[BlobStore] = None) -> Tuple[str, bytes]:
+    """
+    按指定格式编码任务树
+
+    Args:
+        task: 根任务
+        file_format: pretty 或 compact
+        compression: none、gzip 或 lzma
+        rollups: 写入每个节点的子树汇总，None 时不写
+        shards: 分片节点的占位记录（见 iter_task_json）
+        fragments: pretty 格式下可复用的未修改子树片段
+        blobs: 外置描述的存储（见 blobs 模块），None 时描述全部内联
+
+    Returns:
+        (编码后的文本, 写入文件的内容)
+    """
+    reference = blobs.reference if blobs is not None and blobs.threshold else None
+    if file_format == "compact":
+        text = "".join(iter_compact_json(task, rollups=rollups, shards=shards, blobs=reference))
+    else:
+        text = "".join(iter_task_json(task, rollups=rollups, shards=shards, fragments=fragments,
+                                      blobs=reference))
+    return text, _compress(text.encode('utf-8'), compression)
+
+
+def _sniff_format(path: Path) -> Optional[Tuple[str, str]]:
+    """现有快照文件的 (格式, 压缩方式)，文件不存在时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(6)
+            compression = _compression_of(head)
+            if compression != "none":
+                f.seek(0)
+                if compression == "gzip":
+                    import gzip
+                    head = gzip.GzipFile(fileobj=f).read(2)
+                else:
+                    import lzma
+                    head = lzma.LZMAFile(f).read(2)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError):
+        # 损坏的文件：按默认编码重写
+        return None
+    return ("pretty" if head.startswith(b"{\n") else "compact"), compression
+
+
+def _choice(name: str, value: Optional[str], choices: Tuple[str, ...]) -> Optional[str]:
+    """检查参数或环境变量中的选项值（None 和空字符串表示未设置）"""
+    if value is None:
+        value = os.getenv(name)
+    if not value:
+        return None
+    value = value.lower()
+    if value not in choices:
+        raise StorageError(f"无效的 {name}: {value}（可选: {', '.join(choices)}）")
+    return value
+
+
+def _parse_json(content: bytes):
+    """解析 JSON 文件内容（自动解压，嵌套过深时改用不受深度限制的解析器）"""
+    return _parse_text(_decompress(content).decode('utf-8'))
+
+
+def _parse_text(text: str):
+    try:
+        return json.loads(text)
+    except RecursionError:
+        return loads_deep(text)
+
+
+def _read_journal_records(journal_file: Path) -> List[dict]:
+    """读取日志记录（忽略写入中断导致的不完整末行）"""
+    with open(journal_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    
+    records = []
+    lines = content.split("\n")
+    # 最后一段没有换行结尾，说明写入被中断
+    for line in lines[:-1]:
+        if line.strip():
+            records.append(json.loads(line))
+    return records
+
+
+def shard_threshold() -> int:
+    """分片阈值（TASKTREE_SHARD_NODES，超过这么多节点的子树单独存放，0 表示不分片）"""
+    return int(os.getenv("TASKTREE_SHARD_NODES", "0") or 0)
+
+
+def _file_fingerprint(task_file: Path) -> list:
+    """任务文件及其日志文件的指纹"""
+    return file_stamps(task_file, task_file.with_suffix(".journal"))
+
+
+def _read_summary(task_file: Path) -> Optional[tuple]:
+    """读取任务文件（存在日志时回放日志），返回 (任务名称, 统计信息)"""
+    try:
+        with open(task_file, 'rb') as f:
+            content = _decompress(f.read())
+        source = None
+        if _SHARD_KEY in content:
+            from .shards import ShardSource
+            source = ShardSource(task_file.with_suffix(".shards"))
+        with _gc_paused():
+            task = Task.from_dict(_parse_json(content), validate=False,
+                                  on_node=source.attach if source is not None else None)
+        journal_file = task_file.with_suffix(".journal")
+        if journal_file.exists():
+            from .tree import TaskTree
+            TaskTree(task).apply_ops(_read_journal_records(journal_file))
+        if source is not None:
+            # 分片节点使用占位记录中的汇总，不必加载分片
+            return task.name, compute_rollups(task)[id(task)].summary()
+    except Exception:
+        # 无效的任务文件不出现在任务列表中
+        return None
+    return task.name, summarize_task(task)
+
+
+def get_data_dir() -> Path:
+    """获取数据存储目录"""
+    # 1. 检查环境变量 TASKTREE_DATA_DIR
+    env_dir = os.getenv("TASKTREE_DATA_DIR")
+    if env_dir:
+        return Path(env_dir)
+    
+    # 2. 使用系统缓存目录（appdirs 只在这里用到，按需导入）
+    import appdirs
+    cache_dir = appdirs.user_cache_dir("tasktree")
+    return Path(cache_dir)
+
+
+def open_storage(task_name: str):
+    """
+    按 TASKTREE_BACKEND 环境变量创建存储后端
+
+    - json（默认）: 每个任务一个 JSON 文件，见 Storage
+    - sqlite: 每个任务一个 SQLite 数据库，见 SQLiteStorage
+    """
+    backend = os.getenv("TASKTREE_BACKEND", "json").lower()
+    if backend == "json":
+        return Storage(task_name)
+    if backend == "sqlite":
+        from .sqlite_storage import SQLiteStorage
+        return SQLiteStorage(task_name)
+    raise StorageError(f"未知的存储后端: {backend}（可选: json, sqlite）")
 
 
 class Storage:
     """任务数据存储类 - V3"""
     
-    def __init__(self, task_name: str):
+    # 修改先在内存中的任务树上进行，save_tree 时才写入（见 SQLiteStorage）
+    transactional = False
+    
+    def __init__(self, task_name: str, journal: Optional[bool] = None,
+                 file_format: Optional[str] = None, compression: Optional[str] = None):
         """
         初始化存储类 - V3版本
         
         Args:
             task_name: 任务名称（必填）
+            journal: 是否启用日志模式，默认读取 TASKTREE_JOURNAL 环境变量。
+                日志模式下修改以追加记录的方式写入快照旁的 .journal 文件，
+                日志超过阈值时再压缩为新的快照
+            file_format: 快照格式（pretty、compact），默认读取 TASKTREE_FORMAT，
+                都未设置时沿用现有文件的格式
+            compression: 快照的压缩方式（none、gzip、lzma），默认读取
+                TASKTREE_COMPRESS，都未设置时沿用现有文件的压缩方式
         
         Raises:
             ValueError: 如果 task_name 为 None
+            StorageError: 格式或压缩方式无效
         """
         if task_name is None:
             raise ValueError("task_name 不能为 None (V3 要求所有命令都指定任务名称)")
         self._task_name = task_name
         self._data_dir = self._get_data_dir()
+        self._journal_enabled = _env_flag("TASKTREE_JOURNAL") if journal is None else journal
+        self._journal_max_records = int(
+            os.getenv("TASKTREE_JOURNAL_MAX_RECORDS", DEFAULT_JOURNAL_MAX_RECORDS))
+        self._journal_max_bytes = int(
+            os.getenv("TASKTREE_JOURNAL_MAX_BYTES", DEFAULT_JOURNAL_MAX_BYTES))
+        # 当前日志中的记录数（加载或写入日志后才已知）
+        self._journal_records: Optional[int] = None
+        # 是否把子树汇总写入快照，加载可信快照时直接恢复而不必重新计算
+        self._persist_rollups = _env_flag("TASKTREE_ROLLUPS")
+        # 按分片布局保存时新分片的节点数阈值（0 为单文件格式）
+        self._shard_nodes = shard_threshold()
+        # 外置描述的字节数阈值（0 为全部内联）
+        self._blob_bytes = blob_threshold()
+        # 快照格式和压缩方式（None 为沿用现有文件）
+        self._format = _choice("TASKTREE_FORMAT", file_format, FORMATS)
+        self._compression = _choice("TASKTREE_COMPRESS", compression, COMPRESSIONS)
+        # 当前持有的任务锁：嵌套深度和是否为共享锁
+        self._lock_depth = 0
+        self._lock_shared = False
+        # 最近一次加载或保存时磁盘上的版本（见 version）
+        self._loaded_version: Optional[tuple] = None
     
     def _get_data_dir(self) -> Path:
         """获取数据存储目录"""
-        # 1. 检查环境变量 TASKTREE_DATA_DIR
-        env_dir = os.getenv("TASKTREE_DATA_DIR")
-        if env_dir:
-            return Path(env_dir)
-        
-        # 2. 使用系统缓存目录
-        cache_dir = appdirs.user_cache_dir("tasktree")
-        return Path(cache_dir)
+        return get_data_dir()
     
     def _get_task_file_path(self) -> Path:
         """获取任务文件的完整路径"""
@@ -54,28 +383,383 @@ class Storage:
         """数据文件路径"""
         return self._get_task_file_path()
     
-    def load(self) -> Optional[Task]:
-        """加载当前任务的数据"""
+    @property
+    def checksum_file(self) -> Path:
+        """校验和文件路径（记录 Storage 最近一次写入的快照内容的 SHA-256）"""
+        return self._get_task_file_path().with_suffix(".checksum")
+    
+    def _read_checksum(self) -> Optional[str]:
+        try:
+            return self.checksum_file.read_text(encoding='utf-8').strip()
+        except OSError:
+            return None
+    
+    def _write_checksum(self, digest: str) -> None:
+        try:
+            write_atomic(self.checksum_file, digest.encode('utf-8'))
+        except OSError:
+            # 没有校验和只会让下次加载走完整校验
+            pass
+    
+    @property
+    def shard_dir(self) -> Path:
+        """分片目录（与快照文件同名，扩展名为 .shards）"""
+        return self._get_task_file_path().with_suffix(".shards")
+    
+    @property
+    def blob_dir(self) -> Path:
+        """外置描述的目录（与快照文件同名，扩展名为 .blobs）"""
+        return self._get_task_file_path().with_suffix(".blobs")
+    
+    @property
+    def journal_file(self) -> Path:
+        """日志文件路径（与快照文件同名，扩展名为 .journal）"""
+        return self._get_task_file_path().with_suffix(".journal")
+    
+    def fingerprint(self) -> tuple:
+        """快照和日志文件的 (mtime, size)，用于判断文件是否被其他进程修改"""
+        return tuple(_file_fingerprint(self._get_task_file_path()))
+    
+    def version(self) -> tuple:
+        """
+        磁盘上任务数据的版本
+        
+        由快照校验和与快照、日志文件的指纹组成，任何写入（包括只追加日志）
+        都会改变它。在锁内读取才有意义。
+        """
+        return (self._read_checksum(), *self.fingerprint())
+    
+    @property
+    def loaded_version(self) -> Optional[tuple]:
+        """最近一次加载或保存时的版本，与 version() 不同说明其他进程写入过"""
+        return self._loaded_version
+    
+    @property
+    def lock_file(self) -> Path:
+        """任务锁文件路径（删除任务时保留，其他进程可能正在等待这个文件上的锁）"""
+        return self._get_task_file_path().with_suffix(".lock")
+    
+    @contextmanager
+    def lock(self, shared: bool = False):
+        """
+        持有任务的咨询锁（可重入）
+        
+        Args:
+            shared: 共享锁（只读）或排他锁（读-改-写）
+            
+        Raises:
+            StorageError: 等待超时（TASKTREE_LOCK_TIMEOUT），或持有共享锁时请求排他锁
+        """
+        if self._lock_depth:
+            if self._lock_shared and not shared:
+                raise StorageError("持有共享锁时不能再获取排他锁")
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        
+        if fcntl is None:
+            self._lock_depth, self._lock_shared = 1, shared
+            try:
+                yield
+            finally:
+                self._lock_depth = 0
+            return
+        
+        self._data_dir.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with trace.span("storage.lock", shared=shared):
+                _flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX,
+                       lock_timeout(), self.lock_file)
+            self._lock_depth, self._lock_shared = 1, shared
+            try:
+                yield
+            finally:
+                self._lock_depth = 0
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+    
+    def load(self, validate: Optional[bool] = None) -> Optional[Task]:
+        """
+        加载当前任务的数据（存在日志时在快照上回放日志）
+        
+        返回的任务树中的分片全部加载，调用方可以随意遍历。只需要部分节点时
+        用 load_tree，分片在访问时才加载。
+        
+        Args:
+            validate: 是否逐节点校验。默认仅当文件内容与 Storage 上次写入的
+                校验和不一致（被外部修改或导入）时才校验
+        """
+        tree = self._load(validate)
+        if tree is None:
+            return None
+        if tree.shards is not None:
+            from .shards import load_all
+            load_all(tree.root)
+        return tree.root
+    
+    def _load(self, validate: Optional[bool] = None):
+        """加载任务树（持有共享锁），快照中有可信的子树汇总时一并恢复"""
+        with self.lock(shared=True):
+            self._loaded_version = self.version()
+            return self._load_locked(validate)
+    
+    def _load_locked(self, validate: Optional[bool]):
+        from .tree import TaskTree
         task_file = self._get_task_file_path()
         if not task_file.exists():
             return None
             
-        try:
-            with open(task_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return Task.from_dict(data)
-        except (json.JSONDecodeError, KeyError, ValueError) as e:
-            raise ValueError(f"无法读取任务数据文件 {task_file}: {e}")
-    
-    def save(self, task: Task) -> None:
-        """保存任务数据"""
+        with trace.span("storage.load") as load_span:
+            try:
+                with trace.span("storage.read") as read_span:
+                    with open(task_file, 'rb') as f:
+                        content = f.read()
+                    read_span.set(bytes=len(content))
+                if validate is None:
+                    with trace.span("storage.checksum"):
+                        validate = hashlib.sha256(content).hexdigest() != self._read_checksum()
+                load_span.set(validated=validate)
+                content = _decompress(content)
+                # 被外部修改过的文件中的汇总不可信，由 TaskTree 按需重新计算
+                loader = None if validate else RollupLoader()
+                on_node = loader
+                source = None
+                blobs = BlobStore(self.blob_dir)
+                if _SHARD_KEY in content:
+                    from .shards import ShardSource
+                    # 分片中也可能有外置的描述
+                    source = ShardSource(self.shard_dir, self.lock, blobs)
+                    on_node = source.on_node(loader)
+                elif BLOB_KEY.encode() in content:
+                    on_node = blobs.on_node(loader)
+                with _gc_paused():
+                    with trace.span("storage.decode"):
+                        text = content.decode('utf-8')
+                        del content
+                        data = _parse_text(text)
+                    task = Task.from_dict(data, validate=validate, on_node=on_node)
+                    del data
+            except (json.JSONDecodeError, UnicodeDecodeError, KeyError, ValueError) as e:
+                raise ValueError(f"无法读取任务数据文件 {task_file}: {e}")
+            
+            tree = TaskTree(task, rollups=loader.rollups if loader is not None else None,
+                            shards=source)
+            if not validate and source is None and text.startswith(_SNAPSHOT_HEAD.decode()):
+                # 可信的单文件快照就是 iter_task_json 的输出，保存时复用其中未修改的子树
+                head = text[:text.find('"children": ')]
+                tree.fragments = FragmentCache(text, task, rollups='"rollup": ' in head)
+            with trace.span("storage.replay") as replay_span:
+                records = self._read_journal()
+                replay_span.set(records=len(records))
+                if records:
+                    try:
+                        tree.apply_ops(records)
+                    except Exception as e:
+                        raise ValueError(f"无法回放日志文件 {self.journal_file}: {e}")
+                    tree.journal.clear()
+        return tree
+    
+    def load_tree(self):
+        """
+        加载任务树
+
+        Returns:
+            Optional[TaskTree]: 任务不存在时返回 None
+        """
+        return self._load()
+    
+    def save_tree(self, tree) -> None:
+        """保存任务树（日志模式下只追加自上次保存以来的修改）"""
+        rollups = tree.rollups() if self._persist_rollups else tree.cached_rollups
+        self.save(tree.root, ops=tree.journal, rollups=rollups, fragments=tree.fragments)
+        tree.journal.clear()
+    
+    def _read_journal(self) -> List[dict]:
+        """读取日志记录（忽略写入中断导致的不完整末行）"""
+        journal_file = self.journal_file
+        if not journal_file.exists():
+            self._journal_records = 0
+            return []
+        
+        records = _read_journal_records(journal_file)
+        self._journal_records = len(records)
+        return records
+    
+    def save(self, task: Task, ops: Optional[List[dict]] = None,
+             rollups: Optional[dict] = None,
+             fragments: Optional[FragmentCache] = None) -> None:
+        """
+        保存任务数据
+        
+        Args:
+            task: 根任务
+            ops: 自上次加载以来的修改操作（TaskTree.journal）。日志模式下
+                若提供，则只把这些操作追加到日志文件，不重写快照
+            rollups: 任务树的子树汇总（TaskTree.rollups），用于更新清单，
+                设置 TASKTREE_ROLLUPS 时同时写入快照
+            fragments: 上次加载或保存的文本中未修改子树的片段（TaskTree.fragments），
+                写入快照时复用，写入后更新为新快照的文本
+        """
+        with self.lock(), trace.span("storage.save"):
+            if self._journal_enabled and ops is not None and self.exists():
+                if ops:
+                    self._append_journal(ops)
+                    if self._journal_needs_compaction():
+                        self._write_snapshot(task, rollups, fragments)
+            else:
+                self._write_snapshot(task, rollups, fragments)
+            self._loaded_version = self.version()
+    
+    def _write_snapshot(self, task: Task, rollups: Optional[dict] = None,
+                        fragments: Optional[FragmentCache] = None) -> None:
+        """
+        写入完整快照并清空日志
+        
+        设置了 TASKTREE_SHARD_NODES 时按分片布局写入（只写入有变化的分片），
+        否则写成单个文件（会加载全部分片），之后清理不再引用的分片文件。
+        单文件格式下未修改的子树直接复用 fragments 中的文本。
+        """
         task_file = self._get_task_file_path()
         
         # 确保目录存在
         task_file.parent.mkdir(parents=True, exist_ok=True)
         
-        with open(task_file, 'w', encoding='utf-8') as f:
-            json.dump(task.to_dict(), f, ensure_ascii=False, indent=2)
+        persisted = rollups if self._persist_rollups else None
+        file_format, compression = self.snapshot_format()
+        blobs = BlobStore(self.blob_dir, self._blob_bytes)
+        live = set()
+        if self._shard_nodes:
+            from .shards import write_shards
+            if rollups is None:
+                rollups = compute_rollups(task)
+            
+            def encode(node: Task, shards: dict) -> bytes:
+                return encode_snapshot(node, file_format, compression, persisted, shards,
+                                       blobs=blobs)[1]
+            
+            content, live = write_shards(task, self.shard_dir, self._shard_nodes,
+                                         rollups, persisted, encode)
+            if fragments is not None:
+                fragments.reset(None)
+        else:
+            with trace.span("storage.encode", format=file_format) as encode_span:
+                reuse = (file_format == "pretty" and fragments is not None
+                         and fragments.usable(persisted is not None))
+                text, content = encode_snapshot(task, file_format, compression, persisted,
+                                                fragments=fragments if reuse else None,
+                                                blobs=blobs)
+                encode_span.set(bytes=len(content), reused=reuse, blobs_written=blobs.written)
+            if fragments is not None:
+                if file_format == "pretty":
+                    fragments.reset(text, task, persisted is not None)
+                else:
+                    fragments.reset(None)
+        with trace.span("storage.write", bytes=len(content)):
+            write_atomic(task_file, content)
+        with trace.span("storage.checksum"):
+            self._write_checksum(hashlib.sha256(content).hexdigest())
+        
+        # 快照已包含全部修改
+        if self.journal_file.exists():
+            self.journal_file.unlink()
+        self._journal_records = 0
+        
+        if live or self.shard_dir.exists():
+            from .shards import collect_garbage
+            collect_garbage(self.shard_dir, live)
+        if not self._shard_nodes and self.blob_dir.exists():
+            # 分片布局下的引用分散在未加载的分片中，不清理描述文件
+            from .blobs import collect_garbage
+            collect_garbage(self.blob_dir, live_blobs(text))
+        
+        with trace.span("storage.manifest") as manifest_span:
+            summary = rollups[id(task)].summary() if rollups else summarize_task(task)
+            manifest_span.set(nodes=summary["nodes"])
+            self._manifest().put(task_file.name, task.name, _file_fingerprint(task_file), summary)
+    
+    def snapshot_format(self) -> Tuple[str, str]:
+        """
+        写入快照时使用的 (格式, 压缩方式)
+
+        未通过参数或环境变量指定的一项沿用现有快照文件的设置，没有文件时为
+        pretty 和 none。
+        """
+        file_format, compression = self._format, self._compression
+        if file_format is None or compression is None:
+            existing = _sniff_format(self._get_task_file_path()) or (FORMATS[0], COMPRESSIONS[0])
+            file_format = file_format or existing[0]
+            compression = compression or existing[1]
+        return file_format, compression
+    
+    def disk_usage(self) -> int:
+        """快照、日志、分片和外置描述文件占用的字节数"""
+        paths = [self._get_task_file_path(), self.journal_file]
+        if self.shard_dir.is_dir():
+            paths.extend(self.shard_dir.glob("*.json"))
+        if self.blob_dir.is_dir():
+            paths.extend(self.blob_dir.glob("*.txt"))
+        total = 0
+        for path in paths:
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+    
+    def _append_journal(self, ops: List[dict]) -> None:
+        """向日志文件追加操作记录"""
+        if self._journal_records is None:
+            self._read_journal()
+        
+        data = "".join(
+            json.dumps(op, ensure_ascii=False, separators=(',', ':')) + "\n" for op in ops
+        ).encode('utf-8')
+        with trace.span("storage.journal_append", records=len(ops), bytes=len(data)), \
+                open(self.journal_file, 'ab') as f:
+            # 丢弃上次写入中断留下的不完整末行
+            end = f.seek(0, os.SEEK_END)
+            if end > 0:
+                with open(self.journal_file, 'rb') as reader:
+                    reader.seek(end - 1)
+                    if reader.read(1) != b"\n":
+                        reader.seek(0)
+                        f.truncate(reader.read().rfind(b"\n") + 1)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_records += len(ops)
+    
+    def _journal_needs_compaction(self) -> bool:
+        """日志是否超过压缩阈值"""
+        if self._journal_records >= self._journal_max_records:
+            return True
+        return self.journal_file.stat().st_size >= self._journal_max_bytes
+    
+    def compact(self) -> int:
+        """
+        把日志合并进新的快照
+        
+        快照按当前的 TASKTREE_SHARD_NODES 和 TASKTREE_BLOB_BYTES 设置完整地
+        重新编码（不复用未修改子树的片段），也用于在单文件和分片格式之间转换。
+        
+        Returns:
+            int: 合并的日志记录数
+        """
+        with self.lock():
+            tree = self._load()
+            if tree is None:
+                raise FileNotFoundError(f"任务 '{self._task_name}' 不存在")
+            
+            folded = self._journal_records or 0
+            rollups = tree.rollups() if self._persist_rollups else tree.cached_rollups
+            self._write_snapshot(tree.root, rollups)
+            self._loaded_version = self.version()
+        return folded
     
     def exists(self) -> bool:
         """检查任务文件是否存在"""
@@ -85,16 +769,20 @@ class Storage:
     def delete(self) -> bool:
         """删除任务文件"""
         task_file = self._get_task_file_path()
-        if task_file.exists():
-            task_file.unlink()
-            return True
-        return False
+        with self.lock():
+            for path in (self.journal_file, self.checksum_file):
+                if path.exists():
+                    path.unlink()
+            shutil.rmtree(self.shard_dir, ignore_errors=True)
+            shutil.rmtree(self.blob_dir, ignore_errors=True)
+            self._manifest().discard(task_file.name)
+            if task_file.exists():
+                task_file.unlink()
+                return True
+            return False
     
     def initialize(self, description: str = "") -> Task:
         """初始化新的任务树"""
-        if self.exists():
-            raise FileExistsError(f"任务 '{self._task_name}' 已存在")
-        
         root_task = Task(
             name=self._task_name,
             description=description,
@@ -103,28 +791,34 @@ class Storage:
             children=[]
         )
         
-        self.save(root_task)
+        with self.lock():
+            if self.exists():
+                raise FileExistsError(f"任务 '{self._task_name}' 已存在")
+            self.save(root_task)
         return root_task
     
+    def _manifest(self) -> Manifest:
+        return Manifest(self._data_dir)
+    
     def list_tasks(self) -> list[dict]:
-        """列出所有任务文件"""
-        tasks = []
+        """
+        列出所有任务文件
         
+        使用数据目录清单，只重新读取清单记录之后被修改过的文件。
+        日志模式下追加日志会改变文件指纹，对应任务下次列出时重新读取。
+        """
         # 确保数据目录存在
         self._data_dir.mkdir(parents=True, exist_ok=True)
         
-        for file_path in self._data_dir.glob("*.json"):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    tasks.append({
-                        "name": data.get("name", file_path.stem),
-                        "filename": file_path.name,
-                        "path": str(file_path),
-                        "modified": file_path.stat().st_mtime
-                    })
-            except (json.JSONDecodeError, IOError):
-                # 跳过无效的 JSON 文件
-                continue
-        
-        return sorted(tasks, key=lambda x: x["modified"], reverse=True)
\ No newline at end of file
+        tasks = self._manifest().list_entries(".json", _file_fingerprint, _read_summary)
+        return sorted(tasks, key=lambda x: x["modified"], reverse=True)
+    
+    def reindex(self) -> int:
+        """
+        重建数据目录清单
+        
+        Returns:
+            int: 清单中的任务数
+        """
+        self._manifest().clear()
+        return len(self.list_tasks())
@@ -0,0 +1,247 @@
+"""阶段计时与性能剖析
+
+命令变慢时需要知道时间花在哪个阶段：读文件、解析 JSON、构建 Task、
+路径查找、序列化、写文件还是渲染输出。各阶段用 span 包裹：
+
+    with trace.span("storage.read") as s:
+        content = f.read()
+        s.set(bytes=len(content))
+
+未启用时 span 返回一个共享的空操作对象，开销只有一次函数调用。启用方式：
+
+- CLI 的 --profile：命令结束时向标准错误输出各阶段汇总
+- CLI 的 --trace-file PATH 或环境变量 TASKTREE_TRACE=PATH：把每个阶段
+  作为一行 JSON 追加到文件（TASKTREE_TRACE=1 等同于 --profile）
+- CLI 的 --cprofile PATH 或环境变量 TASKTREE_CPROFILE=PATH：用 cProfile
+  剖析整条命令，结果用 pstats 查看
+
+跟踪文件的每行记录:
+
+    {"run": 运行标识, "span": 阶段名, "depth": 嵌套深度, "start_ms": 开始时间,
+     "ms": 耗时, ...附加字段（bytes/nodes/rows 等）}
+
+每次运行另有一条 {"run": ..., "event": "run", "argv": 命令行, "pid": ..., "ms": 总耗时}。
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from typing import Dict, List, Optional
+
+
+class _NullSpan:
+    """未启用跟踪时的空操作 span"""
+    active = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **fields) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """一个正在计时的阶段"""
+    active = True
+
+    def __init__(self, tracer: "Tracer", name: str, fields: dict):
+        self._tracer = tracer
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        tracer = self._tracer
+        local = tracer._local
+        self._depth = getattr(local, "depth", 0)
+        local.depth = self._depth + 1
+        if self.name not in tracer._totals:
+            # 汇总按阶段首次开始的顺序排列，父阶段在子阶段之前
+            tracer._totals[self.name] = [0, 0.0, {}, self._depth]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        self._tracer._local.depth = self._depth
+        if exc_type is not None:
+            self.fields["error"] = exc_type.__name__
+        self._tracer._record(self, elapsed)
+        return False
+
+    def set(self, **fields) -> None:
+        """附加字段（如 bytes、nodes），数值字段在汇总中累加"""
+        self.fields.update(fields)
+
+
+class Tracer:
+    """收集各阶段的耗时"""
+
+    def __init__(self, summary: bool = False, trace_file: Optional[str] = None):
+        """
+        Args:
+            summary: 结束时是否向标准错误输出汇总
+            trace_file: 追加 JSON 记录的文件
+        """
+        self.summary = summary
+        self.trace_file = trace_file
+        self._start = time.perf_counter()
+        self._run_id = f"{os.getpid()}-{int(time.time() * 1000)}"
+        # 当前线程的嵌套深度（守护进程在多个线程中处理请求）
+        self._local = threading.local()
+        # 阶段名 -> [调用次数, 总耗时, {数值字段: 累计值}, 首次出现时的嵌套深度]
+        self._totals: Dict[str, list] = {}
+        self._records: List[dict] = []
+        self._profiler = None
+        self._profile_file: Optional[str] = None
+
+    def _record(self, span: _Span, elapsed: float) -> None:
+        total = self._totals[span.name]
+        total[0] += 1
+        total[1] += elapsed
+        for key, value in span.fields.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                total[2][key] = total[2].get(key, 0) + value
+
+        if self.trace_file:
+            record = {
+                "run": self._run_id,
+                "span": span.name,
+                "depth": span._depth,
+                "start_ms": round((span._start - self._start) * 1000, 3),
+                "ms": round(elapsed * 1000, 3),
+            }
+            record.update(span.fields)
+            self._records.append(record)
+
+    def start_profile(self, path: str) -> None:
+        """用 cProfile 剖析到 finish 为止的全部执行"""
+        import cProfile
+        self._profile_file = path
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def flush(self) -> None:
+        """把缓存的记录追加到跟踪文件（常驻进程在每个请求后调用）"""
+        if not self.trace_file or not self._records:
+            return
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in self._records)
+        self._records.clear()
+        try:
+            with open(self.trace_file, "a", encoding="utf-8") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"tasktree: 无法写入跟踪文件 {self.trace_file}: {e}", file=sys.stderr)
+
+    def finish(self) -> None:
+        """结束跟踪：写出剖析结果、跟踪记录和汇总"""
+        total = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self._profile_file)
+            print(f"tasktree: cProfile 结果已写入 {self._profile_file}"
+                  f"（python -m pstats {self._profile_file}）", file=sys.stderr)
+            self._profiler = None
+
+        if self.trace_file:
+            self._records.append({
+                "run": self._run_id, "event": "run", "argv": sys.argv[1:],
+                "pid": os.getpid(), "ms": round(total * 1000, 3),
+            })
+            self.flush()
+
+        if self.summary:
+            sys.stderr.write(self.format_summary(total))
+            sys.stderr.flush()
+
+    def format_summary(self, total: float) -> str:
+        """各阶段汇总表（按首次出现的顺序，按嵌套深度缩进）"""
+        lines = [f"{'阶段':<32}{'次数':>6}{'耗时 (ms)':>12}  附加"]
+        for name, (calls, elapsed, fields, depth) in self._totals.items():
+            extra = "  ".join(f"{key}={_format_number(value)}" for key, value in fields.items())
+            label = "  " * depth + name
+            lines.append(f"{label:<32}{calls:>6}{elapsed * 1000:>12.2f}  {extra}")
+        lines.append(f"{'总计':<32}{'':>6}{total * 1000:>12.2f}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_number(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def span(name: str, **fields):
+    """
+    计时一个阶段
+
+    Args:
+        name: 阶段名（如 "storage.read"）
+        **fields: 附加字段
+
+    Returns:
+        上下文管理器，进入后可调用 set(...) 追加字段；
+        未启用跟踪时 active 为 False，调用方可据此跳过只为跟踪计算的统计
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, fields)
+
+
+def enabled() -> bool:
+    """是否启用了跟踪"""
+    return _tracer is not None
+
+
+def enable(summary: bool = False, trace_file: Optional[str] = None,
+           profile_file: Optional[str] = None) -> Tracer:
+    """
+    启用跟踪（已启用时合并选项），进程退出时自动调用 finish
+
+    Args:
+        summary: 结束时向标准错误输出汇总
+        trace_file: 追加 JSON 记录的文件
+        profile_file: cProfile 结果文件
+    """
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(summary, trace_file)
+        atexit.register(_tracer.finish)
+    else:
+        _tracer.summary = _tracer.summary or summary
+        _tracer.trace_file = trace_file or _tracer.trace_file
+    if profile_file and _tracer._profiler is None:
+        _tracer.start_profile(profile_file)
+    return _tracer
+
+
+def flush() -> None:
+    """写出已缓存的跟踪记录"""
+    if _tracer is not None:
+        _tracer.flush()
+
+
+def _enable_from_env() -> None:
+    value = os.getenv("TASKTREE_TRACE", "")
+    profile_file = os.getenv("TASKTREE_CPROFILE") or None
+    if value.lower() in ("1", "true", "yes", "on", "stderr"):
+        enable(summary=True, profile_file=profile_file)
+    elif value and value.lower() not in ("0", "false", "no", "off"):
+        enable(trace_file=value, profile_file=profile_file)
+    elif profile_file:
+        enable(profile_file=profile_file)
+
+
+_enable_from_env()
@@ -0,0 +1,88 @@
+"""任务树遍历工具
+
+所有遍历都使用显式栈/队列实现，不依赖 Python 递归，因此任意深度的任务树
+都不会触发 RecursionError。遍历产生 Visit 记录：
+
+    task:   当前节点
+    parent: 父节点（根节点为 None）
+    depth:  深度（根节点为 0）
+    index:  在父节点 children 中的位置（根节点为 0）
+    is_last: 是否是父节点的最后一个子节点（根节点为 True）
+
+默认按 Task.children 取子节点，也可以传入 children 函数遍历其他树形结构
+（例如 Task.from_dict 遍历的原始字典）。
+"""
+
+from collections import deque
+from typing import Any, Callable, Iterator, NamedTuple, Optional, Sequence
+
+
+class Visit(NamedTuple):
+    """遍历到的一个节点"""
+    task: Any
+    parent: Optional[Any]
+    depth: int
+    index: int
+    is_last: bool
+
+
+# 绕过 NamedTuple 的 Python 层 __new__，构建速度快一倍以上
+_new_tuple = tuple.__new__
+
+
+def _visit(task, parent, depth: int, index: int, is_last: bool) -> Visit:
+    return _new_tuple(Visit, (task, parent, depth, index, is_last))
+
+
+def _task_children(task) -> Sequence:
+    return task.children
+
+
+def iter_preorder(root, children: Callable[[Any], Sequence] = _task_children,
+                  max_depth: Optional[int] = None) -> Iterator[Visit]:
+    """先序遍历（父节点先于子节点，兄弟节点按顺序）
+
+    max_depth 不为 None 时不展开深度达到 max_depth 的节点的子节点。
+    """
+    stack = [Visit(root, None, 0, 0, True)]
+    while stack:
+        visit = stack.pop()
+        yield visit
+        if max_depth is not None and visit.depth >= max_depth:
+            continue
+        kids = children(visit.task)
+        if kids:
+            depth = visit.depth + 1
+            last = len(kids) - 1
+            for index in range(last, -1, -1):
+                stack.append(_new_tuple(Visit, (kids[index], visit.task, depth, index, index == last)))
+
+
+def iter_postorder(root, children: Callable[[Any], Sequence] = _task_children) -> Iterator[Visit]:
+    """后序遍历（子节点先于父节点，兄弟节点按顺序）"""
+    # 栈中元素: (visit, 下一个待访问的子节点位置)
+    stack = [[Visit(root, None, 0, 0, True), 0]]
+    while stack:
+        frame = stack[-1]
+        visit, next_index = frame
+        kids = children(visit.task)
+        if next_index < len(kids):
+            frame[1] = next_index + 1
+            stack.append([_visit(kids[next_index], visit.task, visit.depth + 1, next_index,
+                                 next_index == len(kids) - 1), 0])
+        else:
+            stack.pop()
+            yield visit
+
+
+def iter_levelorder(root, children: Callable[[Any], Sequence] = _task_children) -> Iterator[Visit]:
+    """层序遍历（按深度逐层，同层按从左到右）"""
+    queue = deque([Visit(root, None, 0, 0, True)])
+    while queue:
+        visit = queue.popleft()
+        yield visit
+        kids = children(visit.task)
+        depth = visit.depth + 1
+        last = len(kids) - 1
+        for index, child in enumerate(kids):
+            queue.append(_new_tuple(Visit, (child, visit.task, depth, index, index == last)))
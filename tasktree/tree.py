@@ -1,25 +1,263 @@
 """任务树操作功能"""
 
-from typing import Optional, List, Tuple
-from .models import Task, TaskStatus
-from .exceptions import TaskNotFoundError, InvalidPathError, RootDeletionError
+from typing import Optional, List, Tuple, Iterable, Iterator, Callable, Dict, Protocol
+from .models import Task, TaskStatus, ID_PATTERN, derived_task_id
+from .utils import name_key
+from .traversal import iter_preorder
+from .rollup import Rollup, compute_rollups, discard_rollups, leaf_progress
+from .serialization import FragmentCache
+from .query import Query
+from . import trace
+from .exceptions import (
+    TaskNotFoundError, InvalidPathError, RootDeletionError, BatchOperationError
+)
+
+
+def _require(op: dict, key: str):
+    """读取操作中的必填字段"""
+    if op.get(key) is None:
+        raise ValueError(f"操作 '{op.get('op')}' 缺少字段 '{key}'")
+    return op[key]
+
+
+def _parse_op(op: dict) -> Tuple[str, Optional[TaskStatus], Optional[int]]:
+    """校验操作并取出 (操作类型, 状态, 进度)"""
+    if not isinstance(op, dict):
+        raise ValueError("操作必须是 JSON 对象")
+
+    progress = op.get("progress")
+    if progress is not None:
+        if not isinstance(progress, int) or not 0 <= progress <= 100:
+            raise ValueError("进度必须在 0-100 之间")
+    status = op.get("status")
+    if status is not None:
+        status = TaskStatus(status)
+    return op.get("op"), status, progress
+
+
+def _child_position(parent: Task, child: Task) -> int:
+    """子任务在父任务 children 中的位置（按对象身份比较）"""
+    for position, candidate in enumerate(parent.children):
+        if candidate is child:
+            return position
+    raise ValueError(f"'{child.name}' 不是 '{parent.name}' 的子任务")
+
+
+class TaskTreeProtocol(Protocol):
+    """
+    任务树的公共操作（TaskTree 与 SQLite 后端的 SQLiteTaskTree 都支持）
+
+    命令执行层（service）、守护进程和交互式 shell 只使用这些操作。
+    find_task_by_path 返回的任务在 SQLite 后端不含子任务，遍历子任务应使用
+    iter_nodes；内存中的任务树（root）和按节点缓存的汇总只有 TaskTree 提供。
+    """
+
+    # 成功执行的修改操作（格式同 apply_ops），SQLite 后端总是为空
+    journal: List[dict]
+
+    @property
+    def dirty(self) -> bool: ...
+
+    def build_indexes(self) -> None: ...
+
+    def get_rollup(self, task_path: str) -> Rollup: ...
+
+    def path_of(self, task: Task) -> str: ...
+
+    def find_task_by_path(self, path: str) -> Tuple[Task, Optional[Task], List[str]]: ...
+
+    def add_task(self, parent_path: str, name: str, description: str = "",
+                 status: TaskStatus = TaskStatus.TODO, progress: Optional[int] = None,
+                 task_id: Optional[str] = None) -> Task: ...
+
+    def edit_task(self, task_path: str, name: Optional[str] = None,
+                  description: Optional[str] = None, status: Optional[TaskStatus] = None,
+                  progress: Optional[int] = None) -> Task: ...
+
+    def move_task(self, task_path: str, new_parent_path: str,
+                  name: Optional[str] = None) -> Task: ...
+
+    def copy_task(self, task_path: str, new_parent_path: str, name: Optional[str] = None,
+                  task_id: Optional[str] = None) -> Task: ...
+
+    def delete_task(self, task_path: str) -> bool: ...
+
+    def apply_ops(self, ops: Iterable[dict]) -> List[dict]: ...
+
+    def get_task_info(self, task_path: str) -> dict: ...
+
+    def iter_tree_rows(self, show_detail: bool = False, max_depth: Optional[int] = None,
+                       subtree: Optional[str] = None) -> Iterator[Tuple[str, str]]: ...
+
+    def iter_nodes(self, max_depth: Optional[int] = None,
+                   subtree: Optional[str] = None) -> Iterator[dict]: ...
+
+    def query(self, query: Query, subtree: Optional[str] = None) -> Iterator[dict]: ...
+
+    def get_tree_structure(self, show_detail: bool = False, max_depth: Optional[int] = None,
+                           subtree: Optional[str] = None) -> Iterator[str]: ...
 
 
 class TaskTree:
     """任务树操作类"""
     
-    def __init__(self, root_task: Task):
+    def __init__(self, root_task: Task, path_cache: bool = True,
+                 rollups: Optional[Dict[int, Rollup]] = None, shards=None):
+        """
+        Args:
+            root_task: 根任务
+            path_cache: 是否缓存完整路径到任务的解析结果
+            rollups: 已有的子树汇总（如从快照恢复的），None 时首次使用再计算
+            shards: 按分片布局加载时的 ShardSource（见 shards 模块），
+                分片在访问时加载，加载后补齐其中节点的汇总
+        """
         self.root = root_task
+        # 修改日志：记录成功执行的修改操作（格式同 apply_ops），供日志存储模式追加写入
+        self.journal: List[dict] = []
+        # 子任务索引：id(父任务) -> (父任务, {名称键: 子任务})，按需为每个父任务构建。
+        # 同时持有父任务引用，保证 id 不会被回收复用
+        self._child_index: Dict[int, Tuple[Task, Dict[str, Task]]] = {}
+        # 路径缓存：规范化路径 -> (任务, 父任务)，重命名或删除时清空
+        self._path_cache: Optional[Dict[Tuple[str, ...], Tuple[Task, Optional[Task]]]] = (
+            {} if path_cache else None
+        )
+        # 子树汇总：id(任务) -> Rollup，首次使用时计算整棵树，之后随修改沿祖先链增量更新
+        self._rollups: Optional[Dict[int, Rollup]] = rollups
+        # ID 索引：任务 ID -> (任务, 父任务)，首次按 ID 查找时构建（会加载全部分片），
+        # 之后随增删增量维护
+        self._ids: Optional[Dict[str, Tuple[Task, Optional[Task]]]] = None
+        # 上次加载或保存的快照文本中未修改子树的片段（由 Storage 设置），
+        # 每次修改前把从根任务到被修改任务的路径标记为已修改
+        self.fragments: Optional[FragmentCache] = None
+        self.shards = shards
+        if shards is not None:
+            shards.listeners.append(self._shard_loaded)
+    
+    @property
+    def dirty(self) -> bool:
+        """是否有尚未保存的修改"""
+        return bool(self.journal)
+    
+    def rollups(self) -> Dict[int, Rollup]:
+        """所有节点的子树汇总（首次调用时计算）"""
+        if self._rollups is None:
+            with trace.span("tree.rollups"):
+                self._rollups = compute_rollups(self.root)
+        return self._rollups
+    
+    def _shard_loaded(self, task: Task) -> None:
+        """分片加载后计算其中节点的汇总，并以实际结果修正占位记录中的汇总"""
+        if self._rollups is None or id(task) not in self._rollups:
+            return
+        rollup = self._rollups[id(task)]
+        delta = Rollup.own(task)
+        for child in task.children:
+            subtree = compute_rollups(child, rollup)
+            self._rollups.update(subtree)
+            delta.add(subtree[id(child)])
+        delta.add(rollup, -1)
+        if delta.nodes or delta.leaves or delta.progress_sum or any(delta.counts):
+            rollup.propagate(delta)
+    
+    def build_indexes(self) -> None:
+        """
+        预先计算子树汇总和 ID 索引
+        
+        常驻进程加载任务树后调用，之后的状态查询可跳过无关子树，按 ID 查找不需要遍历
+        """
+        self.rollups()
+        self._id_index()
+    
+    def _id_index(self) -> Dict[str, Tuple[Task, Optional[Task]]]:
+        """获取 ID 索引（首次访问时构建）"""
+        if self._ids is None:
+            with trace.span("tree.id_index") as span:
+                ids: Dict[str, Tuple[Task, Optional[Task]]] = {}
+                for task, parent, _, index, _ in iter_preorder(self.root):
+                    if task.id in ids:
+                        # 外部编辑的文件中可能有重复的 ID，后出现的节点改用派生的 ID
+                        task.id = derived_task_id(parent.id, index, task.name)
+                        if self.fragments is not None:
+                            self.fragments.reset(None)
+                    ids[task.id] = (task, parent)
+                span.set(nodes=len(ids))
+            self._ids = ids
+        return self._ids
+    
+    def _index_ids(self, subtree: Task, parent: Task) -> None:
+        """把挂到 parent 下的子树加入 ID 索引"""
+        ids = self._ids
+        for task, task_parent, _, _, _ in iter_preorder(subtree):
+            ids[task.id] = (task, task_parent if task_parent is not None else parent)
+    
+    def _unindex_ids(self, subtree: Task) -> None:
+        """把摘除的子树移出 ID 索引"""
+        ids = self._ids
+        for task, _, _, _, _ in iter_preorder(subtree):
+            entry = ids.get(task.id)
+            if entry is not None and entry[0] is task:
+                del ids[task.id]
+    
+    def path_of(self, task: Task) -> str:
+        """
+        任务的完整路径（沿 ID 索引中的父节点上溯，代价与深度成正比）
+        
+        Raises:
+            TaskNotFoundError: 任务不在这棵树中
+        """
+        ids = self._id_index()
+        names = []
+        current: Optional[Task] = task
+        while current is not None:
+            entry = ids.get(current.id)
+            if entry is None or entry[0] is not current:
+                raise TaskNotFoundError(f"任务 '{task.name}' 不在任务树中")
+            names.append(current.name)
+            current = entry[1]
+        names[-1] = "root"
+        return ".".join(reversed(names))
+    
+    @property
+    def cached_rollups(self) -> Optional[Dict[int, Rollup]]:
+        """已计算的子树汇总（尚未计算时为 None，不会触发计算）"""
+        return self._rollups
+    
+    def get_rollup(self, task_path: str) -> Rollup:
+        """
+        获取任务的子树汇总
+        
+        Args:
+            task_path: 任务路径
+            
+        Returns:
+            Rollup: 子树汇总（节点数、各状态节点数、汇总进度）
+        """
+        task, _, _ = self.find_task_by_path(task_path)
+        return self.rollups()[id(task)]
+    
+    def _children_by_key(self, parent: Task) -> Dict[str, Task]:
+        """获取父任务的 {名称键: 子任务} 索引（首次访问时构建）"""
+        entry = self._child_index.get(id(parent))
+        if entry is None:
+            index: Dict[str, Task] = {}
+            for child in parent.children:
+                # 与逐个比较时一致：同名时取第一个
+                index.setdefault(name_key(child.name), child)
+            entry = (parent, index)
+            self._child_index[id(parent)] = entry
+        return entry[1]
     
     def find_task_by_path(self, path: str) -> Tuple[Task, Optional[Task], List[str]]:
         """
         根据路径查找任务
         
         Args:
-            path: 任务路径，如 "root.subtask1.subsubtask"
+            path: 任务路径，如 "root.subtask1.subsubtask"；以 "#" 开头时按 ID 定位，
+                如 "#k3j9x0m2pq" 或 "#k3j9x0m2pq.子任务"（从该任务开始的相对路径）
             
         Returns:
             (task, parent, path_parts): 找到的任务、父任务和路径列表
+                （按 ID 定位时路径列表以 "#ID" 开头）
             
         Raises:
             InvalidPathError: 路径无效
@@ -27,14 +265,22 @@ class TaskTree:
         """
         if not path:
             raise InvalidPathError("路径不能为空")
+        if path[0] == '#':
+            return self._find_by_id(path)
         
-        # 处理路径
-        path_parts = path.lower().split('.')
+        # 处理路径（不区分大小写）
+        path_parts = [name_key(part) for part in path.split('.')]
         
         # 根路径特殊处理
         if path_parts[0] != 'root':
             path_parts = ['root'] + path_parts
         
+        cache_key = tuple(path_parts)
+        if self._path_cache is not None:
+            cached = self._path_cache.get(cache_key)
+            if cached is not None:
+                return cached[0], cached[1], path_parts
+        
         # 查找任务
         current_task = self.root
         parent = None
@@ -45,22 +291,40 @@ class TaskTree:
             if part == 'root':
                 continue
             
-            found = False
-            for child in current_task.children:
-                if child.name.lower() == part.lower():
-                    parent = current_task
-                    current_task = child
-                    found = True
-                    break
-            
-            if not found:
+            child = self._children_by_key(current_task).get(part)
+            if child is None:
                 full_path = '.'.join(found_path)
                 raise TaskNotFoundError(f"任务 '{full_path}' 不存在")
+            parent = current_task
+            current_task = child
         
+        if self._path_cache is not None:
+            self._path_cache[cache_key] = (current_task, parent)
         return current_task, parent, path_parts
     
+    def _find_by_id(self, path: str) -> Tuple[Task, Optional[Task], List[str]]:
+        """按 "#ID[.相对路径]" 查找任务"""
+        task_id, _, rest = path[1:].partition('.')
+        if not task_id:
+            raise InvalidPathError("任务 ID 不能为空")
+        entry = self._id_index().get(task_id)
+        if entry is None:
+            raise TaskNotFoundError(f"ID 为 '{task_id}' 的任务不存在")
+        task, parent = entry
+        
+        # 路径列表以 "#ID" 开头，需要完整路径时用 path_of
+        path_parts = ['#' + task_id]
+        for part in rest.split('.') if rest else ():
+            path_parts.append(name_key(part))
+            child = self._children_by_key(task).get(path_parts[-1])
+            if child is None:
+                raise TaskNotFoundError(f"任务 '{'.'.join(path_parts)}' 不存在")
+            parent, task = task, child
+        return task, parent, path_parts
+    
     def add_task(self, parent_path: str, name: str, description: str = "", 
-                 status: TaskStatus = TaskStatus.TODO, progress: Optional[int] = None) -> Task:
+                 status: TaskStatus = TaskStatus.TODO, progress: Optional[int] = None,
+                 task_id: Optional[str] = None) -> Task:
         """
         添加新任务
         
@@ -70,16 +334,19 @@ class TaskTree:
             description: 任务描述
             status: 任务状态
             progress: 完成进度
+            task_id: 新任务的 ID（如回放日志时），None 时随机生成
             
         Returns:
             Task: 新创建的任务
+            
+        Raises:
+            ValueError: 同名任务或相同 ID 的任务已存在，或 ID 格式无效
         """
         parent_task, _, _ = self.find_task_by_path(parent_path)
         
         # 检查名称是否已存在
-        for child in parent_task.children:
-            if child.name.lower() == name.lower():
-                raise ValueError(f"父任务下已存在名为 '{name}' 的任务")
+        if name_key(name) in self._children_by_key(parent_task):
+            raise ValueError(f"父任务下已存在名为 '{name}' 的任务")
         
         # 创建新任务
         new_task = Task(
@@ -87,10 +354,19 @@ class TaskTree:
             description=description,
             status=status,
             progress=progress,
-            children=[]
+            children=[],
+            id=task_id
         )
+        if task_id is not None and task_id in self._id_index():
+            raise ValueError(f"ID 为 '{task_id}' 的任务已存在")
         
-        parent_task.children.append(new_task)
+        self._touch(parent_path)
+        self._attach(parent_task, new_task)
+        self.journal.append({
+            "op": "add", "parent_path": parent_path, "name": name,
+            "description": description, "status": TaskStatus(status).value,
+            "progress": progress, "id": new_task.id,
+        })
         return new_task
     
     def edit_task(self, task_path: str, name: Optional[str] = None, 
@@ -111,26 +387,168 @@ class TaskTree:
         """
         task, parent, path_parts = self.find_task_by_path(task_path)
         
+        # 检查名称冲突（如果父任务不为None）
+        if name is not None and parent is not None:
+            sibling = self._children_by_key(parent).get(name_key(name))
+            if sibling is not None and sibling is not task:
+                raise ValueError(f"同层级已存在名为 '{name}' 的任务")
+        self._touch(task_path)
+        
         # 更新属性
         if name is not None:
-            # 检查名称冲突（如果父任务不为None）
-            if parent is not None:
-                for sibling in parent.children:
-                    if sibling.name.lower() == name.lower() and sibling != task:
-                        raise ValueError(f"同层级已存在名为 '{name}' 的任务")
-            task.name = name
+            self._rename(task, parent, name)
         
         if description is not None:
             task.description = description
         
+        is_leaf = None
+        if (status is not None or progress is not None) and self._rollups is not None:
+            # 先判断是否为叶子：未加载的分片在这里加载，补齐汇总时用的还是修改前的状态
+            is_leaf = not task.children
+        old_status, old_progress = task.status, task.progress
         if status is not None:
             task.status = status
         
         if progress is not None:
             task.progress = progress
         
+        if status is not None or progress is not None:
+            self._rollup_changed(task, old_status, old_progress, is_leaf)
+        
+        record = {"op": "edit", "task_path": task_path}
+        for key, value in (("name", name), ("description", description),
+                           ("status", status), ("progress", progress)):
+            if value is not None:
+                record[key] = TaskStatus(value).value if key == "status" else value
+        self.journal.append(record)
+        return task
+    
+    def move_task(self, task_path: str, new_parent_path: str,
+                  name: Optional[str] = None) -> Task:
+        """
+        把任务连同整个子树移动到另一个父任务下（追加到末尾）
+        
+        子树按引用整体摘下再挂上，其中的节点不会被复制或重新校验，
+        子树汇总和 ID 索引也原样保留，只更新新旧祖先链。
+        
+        Args:
+            task_path: 要移动的任务路径
+            new_parent_path: 新的父任务路径
+            name: 移动后的新名称，None 时保持原名
+            
+        Returns:
+            Task: 移动的任务
+            
+        Raises:
+            ValueError: 尝试移动根任务，新的父任务在被移动的子树中，或其下已存在同名任务
+        """
+        task, parent, _ = self.find_task_by_path(task_path)
+        if parent is None:
+            raise ValueError("不能移动根任务")
+        lineage = self._lineage(new_parent_path)
+        if any(node is task for node in lineage):
+            raise ValueError("不能把任务移动到它自己的子树中")
+        new_parent = lineage[-1]
+        self._check_free_name(new_parent, name or task.name, task)
+        
+        if self.fragments is not None:
+            # 改名时任务自身的片段也已过时
+            old_lineage = self._lineage(task_path)
+            self.fragments.touch(old_lineage if name is not None else old_lineage[:-1])
+            self.fragments.touch(lineage)
+        self._move(task, parent, new_parent, name)
+        record = {"op": "move", "task_path": task_path, "new_parent_path": new_parent_path}
+        if name is not None:
+            record["name"] = name
+        self.journal.append(record)
         return task
     
+    def copy_task(self, task_path: str, new_parent_path: str, name: Optional[str] = None,
+                  task_id: Optional[str] = None) -> Task:
+        """
+        把任务连同整个子树复制到另一个父任务下（追加到末尾）
+        
+        副本直接由已加载的节点构建，不重新校验。副本的根任务使用新的 ID，
+        其余节点的 ID 由副本中的父任务 ID、位置和名称派生。
+        
+        Args:
+            task_path: 要复制的任务路径
+            new_parent_path: 新的父任务路径（可以在被复制的子树中）
+            name: 副本的名称，None 时与原任务相同
+            task_id: 副本根任务的 ID（如回放日志时），None 时随机生成
+            
+        Returns:
+            Task: 副本的根任务
+            
+        Raises:
+            ValueError: 新的父任务下已存在同名任务，或 ID 无效、已存在
+        """
+        task, _, _ = self.find_task_by_path(task_path)
+        new_parent, _, _ = self.find_task_by_path(new_parent_path)
+        self._check_free_name(new_parent, name or task.name)
+        if task_id is not None:
+            if not isinstance(task_id, str) or not ID_PATTERN.fullmatch(task_id):
+                raise ValueError(f"无效的任务 ID: {task_id!r}")
+            if task_id in self._id_index():
+                raise ValueError(f"ID 为 '{task_id}' 的任务已存在")
+        
+        copy = task.copy(task_id)
+        if name is not None:
+            copy.name = name
+        self._touch(new_parent_path)
+        self._attach(new_parent, copy)
+        record = {"op": "copy", "task_path": task_path, "new_parent_path": new_parent_path,
+                  "id": copy.id}
+        if name is not None:
+            record["name"] = name
+        self.journal.append(record)
+        return copy
+    
+    def _touch(self, path: str, include_self: bool = True) -> None:
+        """即将修改路径所指的任务（或其子任务列表）：把它和各级祖先标记为已修改"""
+        if self.fragments is not None:
+            lineage = self._lineage(path)
+            self.fragments.touch(lineage if include_self else lineage[:-1])
+    
+    def _check_free_name(self, parent: Task, name: str, moving: Optional[Task] = None) -> None:
+        """检查父任务下是否已有同名任务（moving 是正在移动的任务本身）"""
+        existing = self._children_by_key(parent).get(name_key(name))
+        if existing is not None and existing is not moving:
+            raise ValueError(f"目标父任务下已存在名为 '{name}' 的任务")
+    
+    def _move(self, task: Task, parent: Task, new_parent: Task, name: Optional[str] = None,
+              index: Optional[int] = None) -> int:
+        """把子树从 parent 移到 new_parent 下（可同时改名），返回原位置"""
+        position = self._detach(parent, task, moving=True)
+        if name is not None:
+            task.name = name
+        self._attach(new_parent, task, index, moving=True)
+        return position
+    
+    def _lineage(self, path: str) -> List[Task]:
+        """从根任务到路径所指任务的各级任务"""
+        if path and path[0] == '#':
+            head, _, rest = path[1:].partition('.')
+            task, _, _ = self._find_by_id('#' + head)
+            ids = self._id_index()
+            lineage = [task]
+            while lineage[-1] is not self.root:
+                lineage.append(ids[lineage[-1].id][1])
+            lineage.reverse()
+            parts = rest.split('.') if rest else []
+        else:
+            # 路径错误时给出与 find_task_by_path 相同的异常
+            self.find_task_by_path(path)
+            lineage = [self.root]
+            parts = [part for part in path.split('.') if name_key(part) != 'root']
+        for part in parts:
+            child = self._children_by_key(lineage[-1]).get(name_key(part))
+            if child is None:
+                # 与 find_task_by_path 一致
+                self.find_task_by_path(path)
+            lineage.append(child)
+        return lineage
+    
     def delete_task(self, task_path: str) -> bool:
         """
         删除任务及其所有子任务
@@ -151,9 +569,217 @@ class TaskTree:
             raise RootDeletionError("不能删除根任务")
         
         # 从父任务的children中移除
-        parent.children.remove(task)
+        self._touch(task_path, include_self=False)
+        self._detach(parent, task)
+        self.journal.append({"op": "delete", "task_path": task_path})
         return True
+
+    def _attach(self, parent: Task, child: Task, index: Optional[int] = None,
+                moving: bool = False) -> None:
+        """
+        将子任务挂到父任务下（index 为 None 时追加到末尾）
+        
+        moving 为 True 时子树是用 _detach(moving=True) 摘下的，沿用其汇总和 ID 索引
+        """
+        if index is None:
+            parent.children.append(child)
+        else:
+            parent.children.insert(index, child)
+        
+        entry = self._child_index.get(id(parent))
+        if entry is not None:
+            entry[1].setdefault(name_key(child.name), child)
+        if self._ids is not None:
+            if moving:
+                self._ids[child.id] = (child, parent)
+            else:
+                self._index_ids(child, parent)
+        
+        if self._rollups is not None:
+            parent_rollup = self._rollups[id(parent)]
+            if moving:
+                child_rollup = self._rollups[id(child)]
+                child_rollup.up = parent_rollup
+            else:
+                subtree = compute_rollups(child, parent_rollup)
+                self._rollups.update(subtree)
+                child_rollup = subtree[id(child)]
+            delta = Rollup.zero()
+            delta.add(child_rollup)
+            if len(parent.children) == 1:
+                # 父任务原来是叶子
+                delta.leaves -= 1
+                delta.progress_sum -= leaf_progress(parent.status, parent.progress)
+            parent_rollup.propagate(delta)
+
+    def _detach(self, parent: Task, child: Task, moving: bool = False) -> int:
+        """
+        将子任务从父任务下摘除，返回其原位置
+        
+        moving 为 True 时保留子树的汇总和 ID 索引，随后由 _attach(moving=True) 挂到新位置
+        """
+        index = _child_position(parent, child)
+        del parent.children[index]
+        
+        # 可能存在同名的其他子任务，索引下次访问时重建
+        self._child_index.pop(id(parent), None)
+        self._invalidate_paths()
+        if self._ids is not None and not moving:
+            self._unindex_ids(child)
+        
+        if self._rollups is not None:
+            delta = Rollup.zero()
+            delta.add(self._rollups[id(child)], -1)
+            if not parent.children:
+                # 父任务变成叶子
+                delta.leaves += 1
+                delta.progress_sum += leaf_progress(parent.status, parent.progress)
+            if not moving:
+                discard_rollups(self._rollups, child)
+            self._rollups[id(parent)].propagate(delta)
+        return index
     
+    def _rollup_changed(self, task: Task, old_status: TaskStatus,
+                        old_progress: Optional[int], is_leaf: Optional[bool] = None) -> None:
+        """
+        任务的状态或进度改变后更新汇总
+
+        is_leaf 为 None 时在这里判断。任务的子任务可能是未加载的分片时，调用方须在
+        修改之前判断（加载分片会按任务当前的状态补齐汇总，见 _shard_loaded）。
+        """
+        if self._rollups is None:
+            return
+        if is_leaf is None:
+            is_leaf = not task.children
+        delta = Rollup.change(old_status, old_progress, task.status, task.progress,
+                              is_leaf=is_leaf)
+        self._rollups[id(task)].propagate(delta)
+
+    def _rename(self, task: Task, parent: Optional[Task], name: str) -> None:
+        """重命名任务并维护索引"""
+        task.name = name
+        if parent is not None:
+            self._child_index.pop(id(parent), None)
+        self._invalidate_paths()
+
+    def _invalidate_paths(self) -> None:
+        """清空路径缓存（已缓存的路径可能失效时调用）"""
+        if self._path_cache:
+            self._path_cache.clear()
+
+    def apply_ops(self, ops: Iterable[dict]) -> List[dict]:
+        """
+        批量应用操作（事务语义：任一操作失败则全部回滚）
+
+        Args:
+            ops: 操作列表，每个操作是一个字典，例如
+                {"op": "add", "parent_path": "root", "name": "子任务"}
+                （可带 "id" 指定新任务的 ID，日志中的 add 记录总是带有 ID）
+                {"op": "edit", "task_path": "root.子任务", "status": "done"}
+                {"op": "delete", "task_path": "root.子任务"}
+                {"op": "move", "task_path": "root.子任务", "new_parent_path": "root.其他"}
+                {"op": "copy", "task_path": "root.子任务", "new_parent_path": "root", "name": "副本"}
+                （move/copy 可带 "name" 指定新名称，copy 可带 "id" 指定副本的 ID）
+
+        Returns:
+            List[dict]: 每个操作的执行结果
+
+        Raises:
+            BatchOperationError: 某个操作失败，此时已应用的操作全部回滚
+        """
+        results = []
+        undo_stack: List[Callable[[], None]] = []
+        journal_mark = len(self.journal)
+
+        for index, op in enumerate(ops, start=1):
+            try:
+                result, undo = self._apply_op(op)
+            except Exception as e:
+                # 逆序撤销已应用的操作
+                for undo_fn in reversed(undo_stack):
+                    undo_fn()
+                del self.journal[journal_mark:]
+                raise BatchOperationError(index, op, e, results)
+
+            undo_stack.append(undo)
+            result["index"] = index
+            results.append(result)
+
+        return results
+
+    def _apply_op(self, op: dict) -> Tuple[dict, Callable[[], None]]:
+        """应用单个操作，返回 (结果, 撤销函数)"""
+        kind, status, progress = _parse_op(op)
+
+        if kind == "add":
+            parent_path = _require(op, "parent_path")
+            parent, _, _ = self.find_task_by_path(parent_path)
+            new_task = self.add_task(
+                parent_path, _require(op, "name"), op.get("description") or "",
+                status or TaskStatus.TODO, progress, op.get("id")
+            )
+
+            def undo():
+                self._detach(parent, new_task)
+
+            result = {"op": kind, "path": f"{parent_path}.{new_task.name}"}
+            return result, undo
+
+        if kind == "edit":
+            task_path = _require(op, "task_path")
+            task, parent, _ = self.find_task_by_path(task_path)
+            old_name = task.name
+            # 外置的描述不必为了撤销而读取
+            old = (task._description, task.status, task.progress)
+            self.edit_task(task_path, op.get("name"), op.get("description"),
+                           status, progress)
+
+            def undo():
+                if task.name != old_name:
+                    self._rename(task, parent, old_name)
+                is_leaf = not task.children if self._rollups is not None else None
+                changed_status, changed_progress = task.status, task.progress
+                task.description, task.status, task.progress = old
+                self._rollup_changed(task, changed_status, changed_progress, is_leaf)
+
+            return {"op": kind, "path": task_path}, undo
+
+        if kind == "delete":
+            task_path = _require(op, "task_path")
+            task, parent, _ = self.find_task_by_path(task_path)
+            if parent is None:
+                raise RootDeletionError("不能删除根任务")
+            position = _child_position(parent, task)
+            self.delete_task(task_path)
+
+            def undo():
+                self._attach(parent, task, position)
+
+            return {"op": kind, "path": task_path}, undo
+
+        if kind in ("move", "copy"):
+            task_path = _require(op, "task_path")
+            new_parent_path = _require(op, "new_parent_path")
+            task, parent, _ = self.find_task_by_path(task_path)
+            new_parent, _, _ = self.find_task_by_path(new_parent_path)
+            if kind == "move":
+                old_name = task.name
+                position = _child_position(parent, task) if parent is not None else None
+                self.move_task(task_path, new_parent_path, op.get("name"))
+
+                def undo():
+                    self._move(task, new_parent, parent, old_name, position)
+            else:
+                copy = self.copy_task(task_path, new_parent_path, op.get("name"), op.get("id"))
+
+                def undo():
+                    self._detach(new_parent, copy)
+                task = copy
+
+            return {"op": kind, "path": f"{new_parent_path}.{task.name}"}, undo
+
+        raise ValueError(f"未知的操作类型: {kind!r}")
+
     def get_task_info(self, task_path: str) -> dict:
         """
         获取任务详细信息
@@ -167,61 +793,182 @@ class TaskTree:
         task, _, _ = self.find_task_by_path(task_path)
         
         return {
-            "path": task_path,
+            # 按 ID 定位时给出完整路径
+            "path": self.path_of(task) if task_path.startswith('#') else task_path,
+            "id": task.id,
             "name": task.name,
             "description": task.description,
             "status": task.status.value,
             "progress": task.progress,
-            "children_count": len(task.children)
+            "children_count": len(task.children),
+            "rollup": self.rollups()[id(task)].to_dict()
         }
     
-    def get_tree_structure(self, show_detail: bool = False) -> List[str]:
+    def iter_tree_rows(self, show_detail: bool = False, max_depth: Optional[int] = None,
+                       subtree: Optional[str] = None) -> Iterator[Tuple[str, str]]:
         """
-        获取任务树的结构化表示
+        按先序逐行生成任务树的结构化表示
         
         Args:
             show_detail: 是否显示详细信息
+            max_depth: 最大显示深度（起始节点为 0，None 表示不限制）
+            subtree: 起始节点路径（None 表示根节点）
             
         Returns:
-            List[str]: 格式化的树形结构行列表
-        """
-        lines = []
-        
-        def _build_tree(task: Task, prefix: str = "", is_last: bool = True, is_root: bool = False):
-            # 构建当前节点的显示
-            if is_root:
-                # 根节点没有连接符
-                if show_detail:
-                    status_str = f"[{task.status.value}]"
-                    progress_str = f"({task.progress}%)" if task.progress is not None else ""
-                    line = f"{task.name} {status_str} {progress_str}"
-                    if task.description and task.description != "根任务":
-                        line += f" - {task.description}"
-                else:
-                    line = f"{task.name} [{task.status.value}]"
+            Iterator[Tuple[str, str]]: (节点状态, 格式化的行) 的迭代器
+            
+        Raises:
+            TaskNotFoundError: subtree 指定的任务不存在
+            InvalidPathError: subtree 路径格式错误
+        """
+        # 在返回迭代器之前解析起始节点，路径错误立即抛出
+        start = self.root if subtree is None else self.find_task_by_path(subtree)[0]
+        return self._iter_rows(start, show_detail, max_depth)
+    
+    def _iter_rows(self, start: Task, show_detail: bool,
+                   max_depth: Optional[int]) -> Iterator[Tuple[str, str]]:
+        # child_indents[d] 是第 d 层节点的子节点所用的缩进
+        child_indents: List[str] = []
+        rollups = self.rollups() if show_detail else None
+        
+        for task, _, depth, _, is_last in iter_preorder(start, max_depth=max_depth):
+            # 起始节点没有连接符，其子节点缩进一级
+            if depth == 0:
+                prefix = ""
+                indent = "    "
             else:
-                # 子节点有连接符
-                if show_detail:
-                    status_str = f"[{task.status.value}]"
-                    progress_str = f"({task.progress}%)" if task.progress is not None else ""
-                    line = f"{prefix}{task.name} {status_str} {progress_str}"
-                    if task.description and task.description != "根任务":
-                        line += f" - {task.description}"
-                else:
-                    line = f"{prefix}{task.name} [{task.status.value}]"
-            
-            lines.append(line)
-            
-            # 处理子节点
-            child_count = len(task.children)
-            for i, child in enumerate(task.children):
-                is_child_last = (i == child_count - 1)
-                child_prefix = prefix + ("    " if is_last else "│   ")
-                connector = "└── " if is_child_last else "├── "
-                
-                _build_tree(child, child_prefix + connector, is_child_last, False)
-        
-        # 处理根节点
-        _build_tree(self.root, "", True, True)
-        
-        return lines
\ No newline at end of file
+                parent_indent = child_indents[depth - 1]
+                prefix = parent_indent + ("└── " if is_last else "├── ")
+                indent = parent_indent + ("    " if is_last else "│   ")
+            del child_indents[depth:]
+            child_indents.append(indent)
+            
+            status = task.status.value
+            rollup = rollups[id(task)] if rollups is not None and task.children else None
+            yield status, format_tree_line(prefix, task.name, status, task.progress,
+                                           task.description if show_detail else "",
+                                           show_detail, rollup)
+    
+    def iter_nodes(self, max_depth: Optional[int] = None,
+                   subtree: Optional[str] = None) -> Iterator[dict]:
+        """
+        按先序逐个生成节点记录
+        
+        Args:
+            max_depth: 最大深度（起始节点为 0，None 表示不限制）
+            subtree: 起始节点路径（None 表示根节点）
+            
+        Returns:
+            Iterator[dict]: 节点记录，包含 path、id、name、depth、status、progress、description
+            
+        Raises:
+            TaskNotFoundError: subtree 指定的任务不存在
+            InvalidPathError: subtree 路径格式错误
+        """
+        if subtree is None:
+            return self._iter_nodes(self.root, "root", max_depth)
+        return self._iter_nodes(self.find_task_by_path(subtree)[0], subtree, max_depth)
+    
+    def _iter_nodes(self, start: Task, start_path: str, max_depth: Optional[int]) -> Iterator[dict]:
+        # paths[d] 是第 d 层当前节点的路径
+        paths: List[str] = []
+        
+        for task, _, depth, _, _ in iter_preorder(start, max_depth=max_depth):
+            path = start_path if depth == 0 else f"{paths[depth - 1]}.{task.name}"
+            del paths[depth:]
+            paths.append(path)
+            yield _node_record(path, depth, task)
+    
+    def query(self, query: Query, subtree: Optional[str] = None) -> Iterator[dict]:
+        """
+        按先序逐个生成满足查询条件的节点记录
+        
+        按状态过滤且子树汇总已存在（已被使用过、从快照恢复或由守护进程预先计算）
+        时，借助汇总中的各状态节点数跳过不含该状态节点的子树；汇总随修改增量维护，
+        因此重复的状态查询不需要遍历整棵树。汇总不存在时直接遍历（一次遍历比先计算
+        汇总更快）。
+        
+        Args:
+            query: 查询条件
+            subtree: 起始节点路径（None 表示根节点）
+            
+        Returns:
+            Iterator[dict]: 节点记录（格式同 iter_nodes）
+            
+        Raises:
+            TaskNotFoundError: subtree 指定的任务不存在
+            InvalidPathError: subtree 路径格式错误
+        """
+        if subtree is None:
+            return self._query(query, self.root, "root")
+        return self._query(query, self.find_task_by_path(subtree)[0], subtree)
+    
+    def _query(self, query: Query, start: Task, start_path: str) -> Iterator[dict]:
+        children = _task_children
+        rollups = self._rollups
+        if query.statuses is not None and rollups is not None:
+            statuses = query.statuses
+            
+            def children(task: Task) -> List[Task]:
+                # 只进入含有目标状态节点的子树
+                return [child for child in task.children
+                        if any(rollups[id(child)].count(status) for status in statuses)]
+        
+        matches = query.matches
+        uses_description = query.uses_description
+        # names[d] 是当前节点第 d 层祖先的名称，只为匹配的节点拼接路径
+        names: List[str] = [start_path]
+        
+        for task, _, depth, _, _ in iter_preorder(start, children, max_depth=query.max_depth):
+            if depth:
+                del names[depth:]
+                names.append(task.name)
+            description = task.description if uses_description else ""
+            if matches(task.name, description, task.status.value, task.progress, depth):
+                yield _node_record(".".join(names), depth, task)
+    
+    def get_tree_structure(self, show_detail: bool = False, max_depth: Optional[int] = None,
+                           subtree: Optional[str] = None) -> Iterator[str]:
+        """
+        按先序逐行生成任务树的结构化表示
+        
+        参数同 iter_tree_rows。
+            
+        Returns:
+            Iterator[str]: 格式化的树形结构行
+        """
+        rows = self.iter_tree_rows(show_detail, max_depth, subtree)
+        return (line for _, line in rows)
+
+
+def _task_children(task: Task) -> List[Task]:
+    return task.children
+
+
+def _node_record(path: str, depth: int, task: Task) -> dict:
+    """节点记录（iter_nodes 和 query 的输出格式）"""
+    return {
+        "path": path,
+        "id": task.id,
+        "name": task.name,
+        "depth": depth,
+        "status": task.status.value,
+        "progress": task.progress,
+        "description": task.description,
+    }
+
+
+def format_tree_line(prefix: str, name: str, status: str, progress: Optional[int],
+                     description: str, show_detail: bool, rollup: Optional[Rollup] = None) -> str:
+    """格式化树形结构中的一行（status 为状态值字符串，rollup 为有子任务时的子树汇总）"""
+    if show_detail:
+        status_str = f"[{status}]"
+        progress_str = f"({progress}%)" if progress is not None else ""
+        line = f"{prefix}{name} {status_str} {progress_str}"
+        if rollup is not None:
+            line += f" <完成 {rollup.done}/{rollup.nodes}, 汇总 {rollup.progress}%>"
+        if description and description != "根任务":
+            line += f" - {description}"
+    else:
+        line = f"{prefix}{name} [{status}]"
+    return line
@@ -54,4 +54,9 @@ def to_snake_case(name: str) -> str:
 
 def get_task_filename(task_name: str) -> str:
     """获取任务文件名（包含 .json 扩展名）"""
-    return f"{to_snake_case(task_name)}.json"
\ No newline at end of file
+    return f"{to_snake_case(task_name)}.json"
+
+
+def name_key(name: str) -> str:
+    """任务名称的比较键（不区分大小写）"""
+    return name.casefold()
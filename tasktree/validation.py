@@ -0,0 +1,63 @@
+"""任务数据校验
+
+用 pydantic 校验来自外部的任务数据（被外部修改过的数据文件、导入的文件）。
+导入 pydantic 的开销较大，只在需要校验时由 Task.from_dict 加载本模块。
+"""
+
+from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+
+from .models import TaskStatus, ID_PATTERN
+
+
+class TaskFields(BaseModel):
+    """任务节点的字段（不含子任务）"""
+    id: Optional[str] = Field(None, description="任务 ID（缺少时由加载方派生）")
+    name: str = Field(..., description="任务名称")
+    description: str = Field("", description="任务描述")
+    status: TaskStatus = Field(TaskStatus.TODO, description="任务状态")
+    progress: Optional[int] = Field(None, description="完成进度 (0-100)")
+    
+    @field_validator('progress')
+    @classmethod
+    def validate_progress(cls, v):
+        if v is not None:
+            if not 0 <= v <= 100:
+                raise ValueError('进度必须在 0-100 之间')
+        return v
+    
+    @field_validator('id')
+    @classmethod
+    def validate_id(cls, v):
+        if v is not None and not ID_PATTERN.fullmatch(v):
+            raise ValueError(f'无效的任务 ID: {v!r}')
+        return v
+
+
+def validate_node(node: dict) -> dict:
+    """
+    校验一个节点的字段
+    
+    Args:
+        node: 原始节点字典（children 字段被忽略）
+        
+    Returns:
+        dict: 校验并转换后的字段，status 为状态值字符串
+        
+    Raises:
+        pydantic.ValidationError: 字段无效（ValueError 的子类）
+    """
+    fields = TaskFields(
+        id=node.get("id"),
+        name=node["name"],
+        description=node.get("description", ""),
+        status=node.get("status", "todo"),
+        progress=node.get("progress"),
+    )
+    return {
+        "id": fields.id,
+        "name": fields.name,
+        "description": fields.description,
+        "status": fields.status.value,
+        "progress": fields.progress,
+    }
@@ -0,0 +1,20 @@
+"""测试公共设置"""
+
+import os
+
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: 启动多个 CLI 进程等耗时较长的测试")
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """使用临时数据目录，清除可能影响存储方式的环境变量"""
+    for name in list(os.environ):
+        if name.startswith("TASKTREE_"):
+            monkeypatch.delenv(name)
+    monkeypatch.setenv("TASKTREE_DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("TASKTREE_NO_DAEMON", "1")
+    return tmp_path
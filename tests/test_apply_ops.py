@@ -0,0 +1,72 @@
+"""批量操作（apply_ops）失败时回滚全部操作"""
+
+import pytest
+
+from tasktree.exceptions import BatchOperationError
+from tasktree.models import Task
+from tasktree.rollup import compute_rollups
+from tasktree.sqlite_storage import SQLiteStorage
+from tasktree.tree import TaskTree
+
+
+OPS = [
+    {"op": "add", "parent_path": "root", "name": "x", "id": "xxxxxxxxxx"},
+    {"op": "edit", "task_path": "root.a", "name": "renamed", "status": "done", "progress": 40},
+    {"op": "move", "task_path": "root.b", "new_parent_path": "root.renamed"},
+    {"op": "copy", "task_path": "root.renamed", "new_parent_path": "root.x"},
+    {"op": "delete", "task_path": "root.c"},
+    {"op": "add", "parent_path": "root.missing", "name": "y"},
+]
+
+
+def make_root() -> Task:
+    root = Task(name="root", id="rootrootro")
+    for name in ("a", "b", "c"):
+        child = Task(name=name, id=f"{name * 10}")
+        child.children.append(Task(name=f"{name}1", id=f"{name}1{name * 8}", progress=30))
+        root.children.append(child)
+    return root
+
+
+def assert_failed_at_last_op(info):
+    error = info.value
+    assert error.index == len(OPS)
+    assert error.op == OPS[-1]
+    assert [result["op"] for result in error.results] == [op["op"] for op in OPS[:-1]]
+
+
+def test_failing_op_rolls_back_tree():
+    tree = TaskTree(make_root())
+    tree.build_indexes()
+    before = tree.root.to_dict()
+    rollup = tree.get_rollup("root").to_dict()
+
+    with pytest.raises(BatchOperationError) as info:
+        tree.apply_ops(OPS)
+    assert_failed_at_last_op(info)
+    assert tree.root.to_dict() == before
+    assert not tree.dirty
+    # 增量维护的汇总、ID 索引和路径缓存也回到批量操作之前
+    assert tree.get_rollup("root").to_dict() == rollup
+    assert compute_rollups(tree.root)[id(tree.root)].to_dict() == rollup
+    assert tree.find_task_by_path("#aaaaaaaaaa")[0].name == "a"
+    with pytest.raises(Exception):
+        tree.find_task_by_path("#xxxxxxxxxx")
+    assert tree.find_task_by_path("root.b.b1")[0].progress == 30
+
+    # 回滚后任务树仍可正常修改
+    tree.apply_ops(OPS[:-1])
+    assert [child.name for child in tree.root.children] == ["renamed", "x"]
+
+
+def test_failing_op_rolls_back_sqlite(data_dir):
+    storage = SQLiteStorage("t")
+    storage.save(make_root())
+    tree = storage.load_tree()
+    before = storage.load().to_dict()
+
+    with pytest.raises(BatchOperationError) as info:
+        tree.apply_ops(OPS)
+    assert_failed_at_last_op(info)
+    assert not tree.dirty
+    assert storage.load().to_dict() == before
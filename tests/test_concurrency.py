@@ -0,0 +1,71 @@
+"""多个 CLI 进程并发修改同一个任务时不丢失更新
+
+与 benchmarks/stress_concurrency.py 相同的场景，规模较小：几个线程各自
+反复启动 `tasktree add` 进程，向同一个任务添加互不相同的任务（一半挂在
+根节点下，一半挂在共享的 shared 节点下），结束后每个返回成功的 add
+都应在任务树中。
+"""
+
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from tasktree.service import load_task_tree
+from tasktree.storage import open_storage
+
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+TASK = "stress"
+WORKERS = 4
+OPS = 6
+
+
+def run_cli(*args, env):
+    return subprocess.run([sys.executable, MAIN, *args], env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("backend, journal", [
+    ("json", "0"),
+    ("json", "1"),
+    ("sqlite", "0"),
+])
+def test_concurrent_adds_are_not_lost(data_dir, monkeypatch, backend, journal):
+    monkeypatch.setenv("TASKTREE_BACKEND", backend)
+    monkeypatch.setenv("TASKTREE_JOURNAL", journal)
+    # 日志较快达到阈值，运行中也会并发地压缩为新的快照
+    monkeypatch.setenv("TASKTREE_JOURNAL_MAX_RECORDS", "5")
+    env = dict(os.environ)
+    for setup in (["init", TASK], ["add", TASK, "root", "shared"]):
+        assert run_cli(*setup, env=env).returncode == 0
+
+    results = []
+
+    def worker(index):
+        for op in range(OPS):
+            parent = "root.shared" if op % 2 else "root"
+            name = f"w{index}-{op}"
+            proc = run_cli("add", TASK, parent, name, "-F", "json", env=env)
+            results.append((f"{parent}.{name}", proc.returncode, proc.stderr.decode("utf-8", "replace")))
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    failed = [(path, err) for path, code, err in results if code != 0]
+    assert not failed
+    tree = load_task_tree(open_storage(TASK))
+    missing = []
+    for path, _, _ in results:
+        try:
+            tree.find_task_by_path(path)
+        except Exception:
+            missing.append(path)
+    assert not missing
+    assert len(results) == WORKERS * OPS
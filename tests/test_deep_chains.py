@@ -0,0 +1,131 @@
+"""深链上的遍历与序列化（不依赖 Python 递归）
+
+带缩进的 JSON 和树形渲染的输出大小与深度成平方关系：十万层的链导出为
+带缩进的 JSON 有几十 GB，因此 export 和完整渲染在较浅的链上检查（仍远超
+递归实现的极限），十万层的链用紧凑格式和子树渲染检查。
+"""
+
+import json
+
+import pytest
+from typer.testing import CliRunner
+
+from tasktree.cli import app
+from tasktree.models import Task
+from tasktree.serialization import iter_compact_json, iter_task_json, loads_deep
+from tasktree.storage import Storage
+from tasktree.tree import TaskTree
+
+
+CHAIN_DEPTH = 100_000
+# 带缩进的输出在这个深度约 40 MB；标准库 json 几百层就超出递归深度
+EXPORT_DEPTH = 1500
+RENDER_DEPTH = 10_000
+
+
+def make_chain(depth: int, name: str = "root") -> Task:
+    root = Task(name=name)
+    current = root
+    for index in range(depth):
+        child = Task(name=f"n{index}", progress=index % 101)
+        current.children.append(child)
+        current = child
+    return root
+
+
+def task_fields(root: Task) -> list:
+    """沿链收集各节点的字段（链上每个节点最多一个子节点）"""
+    fields = []
+    current = root
+    while current is not None:
+        assert len(current.children) <= 1
+        fields.append((current.id, current.name, current.status, current.progress))
+        current = current.children[0] if current.children else None
+    return fields
+
+
+def dict_fields(data: dict) -> list:
+    fields = []
+    current = data
+    while current is not None:
+        fields.append((current["id"], current["name"], current["status"], current["progress"]))
+        current = current["children"][0] if current["children"] else None
+    return fields
+
+
+@pytest.fixture(scope="module")
+def chain():
+    return make_chain(CHAIN_DEPTH)
+
+
+def test_to_dict_from_dict_round_trip(chain):
+    data = chain.to_dict()
+    expected = task_fields(chain)
+    assert [(i, n, s.value, p) for i, n, s, p in expected] == dict_fields(data)
+    assert task_fields(Task.from_dict(data, validate=False)) == expected
+    assert task_fields(Task.from_dict(data)) == expected
+
+
+def test_compact_json_round_trip(chain):
+    text = "".join(iter_compact_json(chain))
+    assert task_fields(Task.from_dict(loads_deep(text))) == task_fields(chain)
+
+
+def test_task_json_round_trip(chain):
+    # 不缩进时输出与深度成线性关系，编码路径与带缩进时相同
+    text = "".join(iter_task_json(chain, indent=0))
+    assert task_fields(Task.from_dict(loads_deep(text))) == task_fields(chain)
+
+
+def test_loads_deep_matches_json():
+    text = "".join(iter_task_json(make_chain(50)))
+    assert loads_deep(text) == json.loads(text)
+    with pytest.raises(json.JSONDecodeError):
+        loads_deep(text[:-1])
+
+
+def test_get_tree_structure_on_deep_chain(chain):
+    tree = TaskTree(chain)
+    # 按十万段的路径定位最后 3 层，渲染其下的子树
+    path = "root." + ".".join(f"n{index}" for index in range(CHAIN_DEPTH - 2))
+    lines = list(tree.get_tree_structure(subtree=path))
+    assert lines == [f"n{CHAIN_DEPTH - 3} [todo]", f"    └── n{CHAIN_DEPTH - 2} [todo]",
+                     f"        └── n{CHAIN_DEPTH - 1} [todo]"]
+    assert len(list(tree.get_tree_structure(max_depth=3))) == 4
+
+
+def test_get_tree_structure_full_render():
+    lines = list(TaskTree(make_chain(RENDER_DEPTH)).get_tree_structure())
+    assert len(lines) == RENDER_DEPTH + 1
+    assert lines[-1] == " " * (4 * RENDER_DEPTH) + f"└── n{RENDER_DEPTH - 1} [todo]"
+
+
+def test_export_import_round_trip(data_dir):
+    root = make_chain(EXPORT_DEPTH, name="deep")
+    Storage("deep", journal=False).save(root)
+    runner = CliRunner()
+    exported = data_dir / "deep-export.json"
+    result = runner.invoke(app, ["export", "deep", "-o", str(exported)])
+    assert result.exit_code == 0, result.output
+    assert "错误" not in result.output
+
+    result = runner.invoke(app, ["import", "copy", str(exported)])
+    assert result.exit_code == 0, result.output
+    assert "错误" not in result.output
+    assert task_fields(Storage("copy").load()) == task_fields(root)
+
+    again = data_dir / "copy-export.json"
+    runner.invoke(app, ["export", "copy", "-o", str(again)])
+    assert again.read_bytes() == exported.read_bytes()
+
+
+def test_import_and_save_100k_chain(data_dir, monkeypatch, chain):
+    # 紧凑格式的快照与深度成线性关系
+    monkeypatch.setenv("TASKTREE_FORMAT", "compact")
+    source = data_dir / "input" / "chain.json"
+    source.parent.mkdir()
+    source.write_text("".join(iter_compact_json(chain)), encoding="utf-8")
+    result = CliRunner().invoke(app, ["import", "chain", str(source)])
+    assert result.exit_code == 0, result.output
+    assert "错误" not in result.output
+    assert task_fields(Storage("chain").load()) == task_fields(chain)
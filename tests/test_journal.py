@@ -0,0 +1,91 @@
+"""日志模式：修改追加到 .journal 文件，加载时回放，超过阈值或 compact 时合并进快照"""
+
+import json
+
+import pytest
+
+from tasktree.models import TaskStatus
+from tasktree.storage import Storage
+
+
+def paths(tree) -> list:
+    return [node["path"] for node in tree.iter_nodes()]
+
+
+def edit_and_save(storage: Storage, *ops) -> None:
+    tree = storage.load_tree()
+    tree.apply_ops(list(ops))
+    storage.save_tree(tree)
+
+
+def journal_lines(storage: Storage) -> list:
+    return storage.journal_file.read_text(encoding="utf-8").splitlines()
+
+
+@pytest.fixture
+def storage(data_dir):
+    storage = Storage("t", journal=True)
+    storage.initialize()
+    return storage
+
+
+def test_edits_are_appended_and_replayed(storage):
+    snapshot = storage.data_file.read_bytes()
+    edit_and_save(storage, {"op": "add", "parent_path": "root", "name": "a"},
+                  {"op": "add", "parent_path": "root.a", "name": "b", "progress": 20})
+    edit_and_save(storage, {"op": "edit", "task_path": "root.a.b", "status": "done"},
+                  {"op": "move", "task_path": "root.a.b", "new_parent_path": "root"})
+
+    # 快照不变，修改只追加到日志
+    assert storage.data_file.read_bytes() == snapshot
+    assert [json.loads(line)["op"] for line in journal_lines(storage)] == ["add", "add", "edit", "move"]
+
+    tree = Storage("t", journal=True).load_tree()
+    assert paths(tree) == ["root", "root.a", "root.b"]
+    task, _, _ = tree.find_task_by_path("root.b")
+    assert (task.status, task.progress) == (TaskStatus.DONE, 20)
+    assert not tree.dirty
+    [entry] = storage.list_tasks()
+    assert entry["nodes"] == 3
+
+
+def test_truncated_last_line_is_ignored_and_replaced(storage):
+    edit_and_save(storage, {"op": "add", "parent_path": "root", "name": "a"})
+    # 写入中途崩溃：最后一条记录只写了一部分
+    with open(storage.journal_file, "ab") as f:
+        f.write(b'{"op":"add","parent_path":"root","na')
+
+    assert paths(Storage("t", journal=True).load_tree()) == ["root", "root.a"]
+
+    edit_and_save(Storage("t", journal=True), {"op": "add", "parent_path": "root", "name": "b"})
+    lines = journal_lines(storage)
+    assert [json.loads(line)["name"] for line in lines] == ["a", "b"]
+    assert paths(Storage("t", journal=True).load_tree()) == ["root", "root.a", "root.b"]
+
+
+def test_compact_folds_journal_into_snapshot(storage):
+    for name in ("a", "b", "c"):
+        edit_and_save(storage, {"op": "add", "parent_path": "root", "name": name})
+    before = Storage("t", journal=True).load().to_dict()
+
+    assert Storage("t", journal=True).compact() == 3
+    assert not storage.journal_file.exists()
+    assert Storage("t", journal=False).load().to_dict() == before
+    assert Storage("t", journal=True).compact() == 0
+
+
+def test_threshold_triggers_compaction(data_dir, monkeypatch):
+    monkeypatch.setenv("TASKTREE_JOURNAL_MAX_RECORDS", "3")
+    storage = Storage("t", journal=True)
+    storage.initialize()
+    edit_and_save(storage, {"op": "add", "parent_path": "root", "name": "a"},
+                  {"op": "add", "parent_path": "root", "name": "b"})
+    assert len(journal_lines(storage)) == 2
+
+    edit_and_save(storage, {"op": "add", "parent_path": "root", "name": "c"})
+    assert not storage.journal_file.exists()
+    assert paths(Storage("t", journal=False).load_tree()) == ["root", "root.a", "root.b", "root.c"]
+
+    edit_and_save(storage, {"op": "delete", "task_path": "root.a"})
+    assert len(journal_lines(storage)) == 1
+    assert paths(Storage("t", journal=True).load_tree()) == ["root", "root.b", "root.c"]
@@ -0,0 +1,65 @@
+"""常驻内存的任务树保存时合并其他进程的修改（service.save_merged）"""
+
+import pytest
+
+from tasktree.exceptions import MergeConflictError
+from tasktree.service import load_task_tree, save_merged
+from tasktree.shell import Session
+from tasktree.storage import Storage
+
+
+@pytest.fixture
+def storage(data_dir):
+    storage = Storage("t")
+    storage.initialize()
+    tree = storage.load_tree()
+    tree.add_task("root", "a")
+    storage.save_tree(tree)
+    return storage
+
+
+def modify_elsewhere(*ops):
+    """模拟另一个进程修改同一个任务"""
+    other = Storage("t")
+    tree = other.load_tree()
+    tree.apply_ops(list(ops))
+    other.save_tree(tree)
+
+
+def paths(tree) -> list:
+    return [node["path"] for node in tree.iter_nodes()]
+
+
+def test_replays_edits_on_reloaded_tree(storage):
+    tree = load_task_tree(storage)
+    tree.add_task("root.a", "mine")
+    modify_elsewhere({"op": "add", "parent_path": "root", "name": "theirs"})
+
+    merged = save_merged(storage, tree)
+    assert merged is not tree
+    assert paths(load_task_tree(Storage("t"))) == ["root", "root.a", "root.a.mine", "root.theirs"]
+
+
+def test_conflict_raises_with_reloaded_tree(storage):
+    tree = load_task_tree(storage)
+    tree.edit_task("root.a", description="mine")
+    modify_elsewhere({"op": "delete", "task_path": "root.a"})
+
+    with pytest.raises(MergeConflictError) as info:
+        save_merged(storage, tree)
+    assert info.value.dropped == 1
+    assert paths(info.value.tree) == ["root"]
+    assert paths(load_task_tree(Storage("t"))) == ["root"]
+
+
+def test_shell_session_drops_conflicting_edits(storage):
+    session = Session("t", delay=60)
+    session.execute("delete", task_path="root.a")
+    modify_elsewhere({"op": "delete", "task_path": "root.a"},
+                     {"op": "add", "parent_path": "root", "name": "b"})
+
+    with pytest.raises(MergeConflictError):
+        session.save()
+    assert not session.dirty
+    assert paths(session.tree) == ["root", "root.b"]
+    assert session.save() is False
@@ -0,0 +1,54 @@
+"""分片存储与持久化的子树汇总"""
+
+import pytest
+
+from tasktree.models import TaskStatus
+from tasktree.rollup import compute_rollups
+from tasktree.storage import Storage
+
+
+@pytest.fixture
+def sharded(data_dir, monkeypatch):
+    """按分片布局保存、把汇总写入快照的任务（root.g 下的子树单独存放）"""
+    monkeypatch.setenv("TASKTREE_SHARD_NODES", "2")
+    monkeypatch.setenv("TASKTREE_ROLLUPS", "1")
+    storage = Storage("sharded", journal=False)
+    storage.initialize()
+    tree = storage.load_tree()
+    tree.add_task("root", "g")
+    tree.add_task("root.g", "x")
+    tree.add_task("root.g", "y")
+    storage.save_tree(tree)
+    assert storage.shard_dir.is_dir()
+    return storage
+
+
+def expected_rollup(storage: Storage) -> dict:
+    """从完整加载的任务树重新计算的根节点汇总"""
+    root = storage.load()
+    return compute_rollups(root)[id(root)].to_dict()
+
+
+def test_edit_unloaded_shard_node_counts_status_once(sharded):
+    for status in (TaskStatus.FAILED, TaskStatus.TODO):
+        tree = sharded.load_tree()
+        tree.edit_task("root.g", status=status)
+        sharded.save_tree(tree)
+
+    tree = sharded.load_tree()
+    rollup = tree.get_rollup("root").to_dict()
+    assert rollup == expected_rollup(sharded)
+    assert rollup["status_counts"] == {"todo": 4, "in-progress": 0, "done": 0, "failed": 0}
+    [entry] = sharded.list_tasks()
+    assert entry["status_counts"] == rollup["status_counts"]
+
+
+def test_failed_batch_restores_rollups_of_unloaded_shard_node(sharded):
+    tree = sharded.load_tree()
+    tree.rollups()
+    with pytest.raises(Exception):
+        tree.apply_ops([
+            {"op": "edit", "task_path": "root.g", "status": "done", "progress": 40},
+            {"op": "add", "parent_path": "root.missing", "name": "z"},
+        ])
+    assert tree.get_rollup("root").to_dict() == expected_rollup(sharded)
@@ -0,0 +1,103 @@
+"""SQLite 后端：与 JSON 后端的行为一致，并发初始化"""
+
+import threading
+import time
+
+import pytest
+from typer.testing import CliRunner
+
+from tasktree.cli import app
+from tasktree.shell import Session
+from tasktree import sqlite_storage
+from tasktree.sqlite_storage import SQLiteStorage, SQLiteTaskTree
+from tasktree.tree import TaskTree, TaskTreeProtocol
+
+
+def build(backend: str, monkeypatch) -> CliRunner:
+    monkeypatch.setenv("TASKTREE_BACKEND", backend)
+    runner = CliRunner()
+    for args in (["init", "t"], ["add", "t", "root", "a", "-s", "done"],
+                 ["add", "t", "root.a", "b", "-p", "30"], ["add", "t", "root.a", "c", "-s", "done"],
+                 ["add", "t", "root.a.b", "d"], ["add", "t", "root", "e"]):
+        result = runner.invoke(app, args)
+        assert result.exit_code == 0, result.output
+    return runner
+
+
+@pytest.mark.parametrize("options", [
+    ["--detail"],
+    ["--detail", "--depth", "1"],
+    ["--detail", "--subtree", "root.a"],
+    [],
+])
+def test_list_matches_json_backend(data_dir, monkeypatch, options):
+    outputs = []
+    for backend in ("json", "sqlite"):
+        monkeypatch.setenv("TASKTREE_DATA_DIR", str(data_dir / backend))
+        runner = build(backend, monkeypatch)
+        result = runner.invoke(app, ["list", "t", *options])
+        assert result.exit_code == 0, result.output
+        outputs.append(result.output)
+    assert outputs[0] == outputs[1]
+    if "--detail" in options:
+        assert "<完成 2/4, 汇总 50%>" in outputs[1]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_shell_completes_child_paths(data_dir, monkeypatch, backend):
+    build(backend, monkeypatch)
+    session = Session("t")
+    assert session.complete_path("ro") == ["root."]
+    assert session.complete_path("root.") == ["root.a", "root.e"]
+    assert session.complete_path("root.a.") == ["root.a.b", "root.a.c"]
+    assert session.complete_path("root.a.C") == ["root.a.c"]
+    assert session.complete_path("root.missing.") == []
+
+
+@pytest.mark.parametrize("cls", [TaskTree, SQLiteTaskTree])
+def test_backends_implement_protocol(cls):
+    members = [name for name in vars(TaskTreeProtocol)
+               if not name.startswith("_") and name != "journal"]
+    assert "apply_ops" in members
+    missing = [name for name in members if not hasattr(cls, name)]
+    assert not missing
+
+
+def test_concurrent_initialize_creates_one_tree(data_dir, monkeypatch):
+    connect = sqlite_storage._connect
+
+    def slow_connect(path):
+        # 拉长检查与写入之间的窗口，让所有线程都在第一个写入之前完成检查
+        time.sleep(0.05)
+        return connect(path)
+
+    monkeypatch.setattr(sqlite_storage, "_connect", slow_connect)
+    barrier = threading.Barrier(8)
+    outcomes = []
+
+    def init():
+        storage = SQLiteStorage("t")
+        barrier.wait()
+        try:
+            storage.initialize()
+            outcomes.append("ok")
+        except FileExistsError:
+            outcomes.append("exists")
+
+    threads = [threading.Thread(target=init) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(outcomes) == ["exists"] * 7 + ["ok"]
+    assert SQLiteStorage("t").load().children == []
+
+
+def test_initialize_over_empty_database(data_dir):
+    # 初始化中途退出时留下的只有表结构的数据库
+    storage = SQLiteStorage("t")
+    sqlite_storage._connect(storage.data_file).close()
+    storage.initialize("desc")
+    assert storage.load().description == "desc"
+    with pytest.raises(FileExistsError):
+        storage.initialize()